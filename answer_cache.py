@@ -0,0 +1,109 @@
+"""
+Cache jawaban semantik untuk pertanyaan yang mirip/berulang.
+
+Query baru di-embed dengan model yang sama dengan retrieval, lalu dibandingkan
+(cosine similarity) dengan pertanyaan-pertanyaan sebelumnya. Kalau ada yang
+cukup mirip (>= threshold) dan belum kedaluwarsa, jawaban + daftar sumbernya
+langsung dipakai ulang tanpa similarity search ke database dan tanpa panggilan LLM.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+DEFAULT_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+DEFAULT_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Cache in-memory (satu per proses server) berisi pasangan
+    (vektor pertanyaan, jawaban, sumber).
+
+    Setiap ada dokumen baru masuk, panggil `invalidate()`: semua entry dibuang
+    dan `generation` naik, sehingga jawaban yang sedang dibuat dari korpus lama
+    tidak ikut tersimpan.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None  # matriks (n, dim) vektor pertanyaan yang sudah dinormalisasi
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop_expired(self, now):
+        keep = [i for i, entry in enumerate(self._entries) if now - entry["created_at"] < self.ttl_seconds]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep else None
+
+    def lookup(self, query_vector, scope=""):
+        """
+        Return entry {"query", "answer", "sources", "score", ...} yang paling mirip, atau None.
+        `scope` (mis. `metadata_filter.filter_key(filter)`) harus sama dengan saat `store`:
+        jawaban dari cakupan dokumen lain tidak dipakai.
+        """
+        query = _normalize(query_vector)
+        with self._lock:
+            self._drop_expired(time.time())
+            if self._vectors is None:
+                self.misses += 1
+                metrics.increment("rag_answer_cache_total", result="miss")
+                return None
+            scores = self._vectors @ query
+            scores[[i for i, entry in enumerate(self._entries) if entry["scope"] != scope]] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                metrics.increment("rag_answer_cache_total", result="miss")
+                return None
+            self.hits += 1
+            metrics.increment("rag_answer_cache_total", result="hit")
+            return {**self._entries[best], "score": float(scores[best])}
+
+    def store(self, query, query_vector, answer, sources, generation, scope=""):
+        """
+        Simpan jawaban baru. `generation` diambil sebelum jawaban dibuat; kalau
+        sementara itu cache di-invalidate, jawaban ini dibuang.
+        """
+        vector = _normalize(query_vector)[None, :]
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries.append({
+                "query": query,
+                "answer": answer,
+                "sources": list(sources),
+                "scope": scope,
+                "created_at": time.time(),
+            })
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            if len(self._entries) > self.max_entries:
+                # Buang entry paling lama
+                self._entries = self._entries[1:]
+                self._vectors = self._vectors[1:]
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+            self.generation += 1
@@ -1,20 +1,26 @@
-import time
 import streamlit as st
 import os
-import tempfile
 from dotenv import load_dotenv
 
 # Library untuk RAG
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_classic.chains.retrieval import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+
+from batch_embedder import BatchEmbedder, get_rate_limiter
+from chat_memory import ChatMemory
+from chroma_store import ChromaCorpus
+from chunker import build_text_splitter
+from embedding_cache import CachedEmbeddings
+from hybrid_retriever import HYBRID_SEARCH
+from ingest_ledger import chunk_row_id, sha256_text
+from ingest_pipeline import iter_chunk_batches, run_pipeline
+from ingest_worker import IngestionQueue
+from metrics import METRICS_PANEL, REGISTRY as METRICS, QueryMetrics, start_metrics_server
+from pdf_parser import iter_pdf_pages
+from rag_chain import STREAM_ANSWER, get_llm, get_retrieval_chain
+from rag_flow import ChatTurn
 
 # 1. Load API Key
 load_dotenv()
+start_metrics_server()  # endpoint Prometheus /metrics kalau METRICS_PORT di-set
 # Pastikan GOOGLE_API_KEY terbaca
 if "GOOGLE_API_KEY" not in os.environ:
     st.error("API Key tidak ditemukan. Pastikan file .env sudah dibuat!")
@@ -25,85 +31,178 @@ st.title("🤖 Chatbot RAG: Tanya Jawab dengan PDF")
 
 # 3. Setup Session State (Agar chat history tidak hilang saat reload)
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatMemory()  # pesan terakhir + ringkasan pesan lama (lihat chat_memory.py)
 if "vector_db" not in st.session_state:
     st.session_state.vector_db = None
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {}  # job_id -> sudah dipasang ke session atau belum
+
+# Prompt RAG (Instruksi khusus)
+PROMPT_TEMPLATE = """
+Jawablah pertanyaan berikut HANYA berdasarkan konteks yang diberikan.
+Jika jawabannya tidak ada di dalam konteks, katakan "Maaf, informasi tersebut tidak ditemukan dalam dokumen."
+Jangan mengarang jawaban.
+
+<context>
+{context}
+</context>
+
+Pertanyaan: {input}
+"""
+
+# --- VECTOR STORE (PERSISTENT, DIPAKAI BERSAMA SEMUA SESSION) ---
+EMBEDDING_MODEL = "models/embedding-001"
+
+@st.cache_resource
+def get_embeddings():
+    """
+    Embedding Google: batch paralel dibatasi token bucket RPM/TPM (limiter dipakai bareng
+    satu proses), dibungkus cache disk agar chunk yang sudah pernah di-embed tidak makan kuota lagi.
+    Satu instance per proses, dipakai bersama koleksi & semua job ingest (statistik cache tidak terpecah)
+    """
+    # Import ditunda supaya halaman tampil lebih cepat saat cold start
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    batch_embedder = BatchEmbedder(
+        GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL),
+        limiter=get_rate_limiter(EMBEDDING_MODEL)
+    )
+    return CachedEmbeddings(batch_embedder, model_name=EMBEDDING_MODEL)
+
+@st.cache_resource
+def get_corpus():
+    """
+    Koleksi Chroma di disk: di-load sekali saat server start (tanpa embed ulang)
+    """
+    return ChromaCorpus("app1_documents", get_embeddings())
 
 # --- FUNGSI PROSES DOKUMEN ---
-def process_pdf(uploaded_file):
+@st.cache_resource
+def get_ingest_queue():
     """
-    Fungsi untuk mengubah PDF menjadi Vector Database
+    Antrian ingest background, satu per proses server
     """
-    try:
-        # a. Simpan file sementara (karena Loader butuh path file)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            tmp_path = tmp_file.name
-
-        # b. Baca PDF
-        loader = PyPDFLoader(tmp_path)
-        docs = loader.load()
-        os.remove(tmp_path) # Hapus file temporary
-
-        # c. Pecah teks menjadi potongan kecil (Chunks)
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=10,    # Ukuran per potongan
-            chunk_overlap=2   # Overlap agar konteks tidak putus
-        )
-        splits = text_splitter.split_documents(docs)
-
-        st.write(f"Jumlah potongan teks (chunks): {len(splits)}")
-
-        # d. Buat Embedding & Simpan ke Vector Store (Chroma)
-        # Menggunakan model embedding khusus Google
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        
-        vectorstore = Chroma.from_documents(
-            documents=splits, 
-            embedding=embeddings,
-            # persist_directory="./chroma_db" # Opsional: jika ingin disimpan ke disk
-        )
-
-        batch_size = 1
-        total_batches = len(splits) // batch_size + 1
-        
-        progress_bar = st.progress(0)
-        for i in range(0, len(splits), batch_size):
-            # Ambil potongan data (slicing)
-            batch = splits[i:i + batch_size]
-            
-            # Masukkan ke Chroma
-            if batch: # Pastikan batch tidak kosong
-                vectorstore.add_documents(batch)
-            
-            # Update progress bar
-            current_progress = min((i + batch_size) / len(splits), 1.0)
-            progress_bar.progress(current_progress)
-            
-            # Tunda 2 detik agar tidak kena limit RPM (PENTING!)
-            time.sleep(2)
-
-        return vectorstore
-
-    except Exception as e:
-        st.error(f"Gagal memproses PDF: {e}")
-        return None
+    return IngestionQueue()
+
+def process_pdf(job, files, corpus, embeddings):
+    """
+    Fungsi untuk mengubah PDF menjadi Vector Database.
+    Jalan di background worker, progress dilaporkan lewat `job` (jangan panggil st.* di sini).
+    Pipeline streaming: halaman -> chunk -> embedding -> insert per batch, tiap tahap di thread
+    sendiri dengan antrian terbatas (memori tetap kecil walau PDF ribuan halaman).
+    """
+    # a. Baca semua PDF langsung dari bytes upload (tanpa file temporary),
+    #    halaman di-extract paralel di process pool dan dialirkan per halaman
+    job.report("parse")
+    pages = iter_pdf_pages(files, progress=lambda done, total: job.report("parse", done, total))
+
+    # b. Pecah teks menjadi potongan kecil (Chunks)
+    # Dipotong per token di batas heading/paragraf/kalimat, dengan page + offset di metadata
+    text_splitter = build_text_splitter()
+    counts = {"chunks": 0, "new": 0, "embedded": 0}
+    seen = set()
+
+    # c. Chunk yang sudah ada di koleksi (ID = nama file + hash isi chunk) tidak diproses lagi;
+    #    isi yang sama di file yang di-rename mendapat ID baru dan disimpan sebagai baris baru
+    def select_new(chunks):
+        counts["chunks"] += len(chunks)
+        batch = {}
+        for doc in chunks:
+            row_id = chunk_row_id(doc.metadata["source"], sha256_text(doc.page_content))
+            if row_id not in seen:
+                seen.add(row_id)
+                batch[row_id] = doc
+        existing = corpus.existing_ids(list(batch))
+        new_ids = [row_id for row_id in batch if row_id not in existing]
+        counts["new"] += len(new_ids)
+        job.report("split", counts["chunks"], counts["chunks"])
+        return (new_ids, [batch[row_id] for row_id in new_ids]) if new_ids else None
+
+    # d. Buat Embedding (Google)
+    # Chunk dikirim per batch secara paralel, dibatasi token bucket RPM/TPM
+    # (hanya menunggu kalau kuota memang habis, mundur otomatis kalau kena 429)
+    def embed(batch):
+        new_ids, new_splits = batch
+        texts = [doc.page_content for doc in new_splits]
+        vectors = embeddings.embed_documents(texts)
+        counts["embedded"] += len(texts)
+        job.report("embed", counts["embedded"], counts["new"])
+        return new_ids, texts, vectors, [doc.metadata for doc in new_splits]
+
+    # e. Simpan ke koleksi Chroma persistent (setiap chunk hanya di-embed satu kali)
+    inserted = 0
+    for new_ids, texts, vectors, metadatas in run_pipeline(
+        iter_chunk_batches(pages, text_splitter), select_new, embed
+    ):
+        corpus.add(new_ids, texts, vectors, metadatas)
+        inserted += len(new_ids)
+        job.report("insert", inserted, counts["new"])
+    job.report(
+        "insert", inserted, inserted,
+        message=f"{inserted} chunk baru dari {counts['chunks']}, embedding cache: {embeddings.hits} hit, {embeddings.misses} miss"
+    )
+    return inserted
+
+def apply_finished_jobs():
+    """
+    Pasang hasil job yang sudah selesai ke session ini (dipanggil dari thread script)
+    """
+    for job in get_ingest_queue().jobs(list(st.session_state.ingest_jobs)):
+        if job.status == "done" and not st.session_state.ingest_jobs[job.id]:
+            # Simpan vector db ke session state
+            st.session_state.vector_db = get_corpus().vector_store
+        st.session_state.ingest_jobs[job.id] = job.finished
+
+apply_finished_jobs()
+
+# Warm start: kalau koleksi di disk sudah berisi dokumen, langsung bisa dipakai chat
+if st.session_state.vector_db is None and get_corpus().count() > 0:
+    st.session_state.vector_db = get_corpus().vector_store
 
 # --- SIDEBAR: UPLOAD FILE ---
 with st.sidebar:
     st.header("📂 Upload Dokumen")
-    uploaded_file = st.file_uploader("Upload file PDF kamu", type="pdf")
+    uploaded_files = st.file_uploader("Upload file PDF kamu", type="pdf", accept_multiple_files=True)
     
-    if uploaded_file is not None:
+    if uploaded_files:
         if st.button("Proses Dokumen"):
-            with st.spinner("Sedang membaca & menyusun data..."):
-                # Simpan vector db ke session state
-                st.session_state.vector_db = process_pdf(uploaded_file)
-                st.success("Dokumen berhasil diproses! Silakan bertanya.")
+            # Diproses di background: chat tetap bisa dipakai selama dokumen diproses
+            files = [(f.name, f.getvalue()) for f in uploaded_files]
+            label = files[0][0] if len(files) == 1 else f"{len(files)} file PDF"
+            job = get_ingest_queue().submit(label, process_pdf, files, get_corpus(), get_embeddings())
+            st.session_state.ingest_jobs[job.id] = False
+
+    # --- STATUS PROSES DOKUMEN ---
+    session_jobs = get_ingest_queue().jobs(list(st.session_state.ingest_jobs))
+
+    @st.fragment(run_every=1 if any(not job.finished for job in session_jobs) else None)
+    def ingest_status_panel():
+        jobs = get_ingest_queue().jobs(list(st.session_state.ingest_jobs))
+        for job in reversed(jobs):
+            if job.status == "failed":
+                st.error(f"Gagal memproses {job.filename}: {job.error}")
+            elif job.status == "done":
+                st.success(f"✅ {job.filename}: {job.message}")
+            else:
+                st.progress(job.progress, text=f"⏳ {job.filename}: {job.describe()}")
+        # Ada job yang baru selesai -> rerun seluruh app supaya hasilnya terpasang
+        if any(job.finished and not st.session_state.ingest_jobs[job.id] for job in jobs):
+            st.rerun()
+
+    ingest_status_panel()
+
+# --- PANEL ADMIN: METRIK (opsional, METRICS_PANEL=true) ---
+if METRICS_PANEL:
+    with st.sidebar.expander("📈 Metrics (admin)"):
+        st.caption("Latency dalam detik, p50/p95 dari 1024 sampel terakhir per metrik")
+        st.dataframe(METRICS.summary(), hide_index=True)
 
 # --- AREA CHAT UTAMA ---
 
 # Tampilkan chat history
+if st.session_state.chat_history.summary:
+    with st.expander(f"🗂️ {st.session_state.chat_history.summarized_count} pesan sebelumnya (diringkas)"):
+        st.write(st.session_state.chat_history.summary)
 for role, message in st.session_state.chat_history:
     with st.chat_message(role):
         st.write(message)
@@ -125,34 +224,39 @@ if user_query:
         # 3. Proses Jawaban dengan RAG
         with st.chat_message("assistant"):
             with st.spinner("Menganalisis dokumen..."):
-                # Setup Model Gemini
-                llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.3)
-
-                # Setup Prompt RAG (Instruksi khusus)
-                prompt = ChatPromptTemplate.from_template("""
-                Jawablah pertanyaan berikut HANYA berdasarkan konteks yang diberikan.
-                Jika jawabannya tidak ada di dalam konteks, katakan "Maaf, informasi tersebut tidak ditemukan dalam dokumen."
-                Jangan mengarang jawaban.
-
-                <context>
-                {context}
-                </context>
-
-                Pertanyaan: {input}
-                """)
-
-                # Setup Retriever (Pencari data di vector db)
-                retriever = st.session_state.vector_db.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-
-                # Gabungkan Dokumen -> Prompt -> LLM
-                document_chain = create_stuff_documents_chain(llm, prompt)
-                retrieval_chain = create_retrieval_chain(retriever, document_chain)
-
-                # Eksekusi
-                response = retrieval_chain.invoke({"input": user_query})
-                answer = response['answer']
-                
-                st.write(answer)
-                
-                # Simpan jawaban ke history
-                st.session_state.chat_history.append(("assistant", answer))
\ No newline at end of file
+                # Timing retrieve / prompt / generate + jumlah token & dokumen untuk metrics
+                query_metrics = QueryMetrics()
+                try:
+                    # Pertanyaan lanjutan ("cara mencegahnya?") ditulis ulang jadi pertanyaan mandiri dari riwayat chat
+                    turn = ChatTurn(
+                        st.session_state.chat_history, user_query, None, get_llm("gemini-2.0-flash", 0.0),
+                        tracker=query_metrics
+                    )
+                    turn.prepare()
+                    if turn.search_query != user_query:
+                        st.caption(f"🔎 Dicari sebagai: {turn.search_query}")
+
+                    # LLM, prompt & chain dibuat sekali per proses lalu dipakai ulang (tidak dibangun ulang tiap pesan)
+                    retrieval_chain = get_retrieval_chain(
+                        st.session_state.vector_db,
+                        PROMPT_TEMPLATE,
+                        model="gemini-2.0-flash",
+                        temperature=0.3,
+                        search_kwargs={"k": 5},
+                        # Hybrid: BM25 menangkap istilah persis (CVE, nama malware, port) yang sering lolos dari vector search
+                        bm25_index=get_corpus().bm25_index() if HYBRID_SEARCH else None
+                    )
+
+                    # Eksekusi: streaming token supaya jawaban langsung muncul, 'context' tetap tersedia
+                    if STREAM_ANSWER:
+                        answer = st.write_stream(turn.stream(retrieval_chain))
+                    else:
+                        answer = turn.invoke(retrieval_chain)
+                        st.write(answer)
+
+                    # Simpan jawaban ke history (pesan lama yang tergeser diringkas) + catat metrics
+                    turn.finish(answer)
+                except Exception as e:
+                    # Query gagal tetap tercatat (status error) sebelum error ditampilkan Streamlit
+                    query_metrics.finish(error=e)
+                    raise
\ No newline at end of file
@@ -1,23 +1,27 @@
 import streamlit as st
 import os
-import tempfile
 from dotenv import load_dotenv
+from datetime import datetime
 
 # --- Import Library ---
-from langchain_google_genai import ChatGoogleGenerativeAI
-# [MODIFIKASI 1] Ganti Embedding Google jadi HuggingFace (Lokal)
-from langchain_community.embeddings import HuggingFaceEmbeddings 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-
-# Menggunakan import dari langchain_classic (LangChain 1.0+)
-from langchain_classic.chains.retrieval import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+# [MODIFIKASI 1] Ganti Embedding Google jadi HuggingFace (Lokal), di-load lewat model_registry
+
+from chat_memory import ChatMemory
+from chroma_store import ChromaCorpus
+from chunker import build_text_splitter
+from hybrid_retriever import HYBRID_SEARCH
+from ingest_ledger import chunk_row_id, sha256_text
+from ingest_pipeline import iter_chunk_batches, run_pipeline
+from ingest_worker import IngestionQueue
+from model_registry import LOCAL_EMBEDDING_MODEL, get_local_embeddings
+from metrics import METRICS_PANEL, REGISTRY as METRICS, QueryMetrics, start_metrics_server
+from pdf_parser import iter_pdf_pages
+from rag_chain import STREAM_ANSWER, get_llm, get_retrieval_chain
+from rag_flow import ChatTurn
 
 # 1. Load API Key
 load_dotenv()
+start_metrics_server()  # endpoint Prometheus /metrics kalau METRICS_PORT di-set
 if "GOOGLE_API_KEY" not in os.environ:
     st.error("API Key tidak ditemukan. Pastikan file .env sudah dibuat!")
 
@@ -27,72 +31,161 @@ st.title("🤖 Chatbot RAG: Embedding Lokal (Anti-Limit)")
 
 # 3. Setup Session State
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatMemory()  # pesan terakhir + ringkasan pesan lama (lihat chat_memory.py)
 if "vector_db" not in st.session_state:
     st.session_state.vector_db = None
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {}  # job_id -> sudah dipasang ke session atau belum
 if "upload_history" not in st.session_state:
     st.session_state.upload_history = []
 
+# Prompt RAG
+PROMPT_TEMPLATE = """
+Jawab pertanyaan berdasarkan konteks berikut:
+<context>
+{context}
+</context>
+Pertanyaan: {input}
+"""
+
+# --- VECTOR STORE (PERSISTENT, DIPAKAI BERSAMA SEMUA SESSION) ---
+def get_embeddings():
+    """
+    Model embedding lokal dari registry: di-load sekali per proses (mulai di background
+    saat app start), dipakai bersama semua session dan job ingest
+    """
+    # Model ini akan didownload otomatis sekali saja (sekitar 80MB)
+    # Dibungkus cache disk: chunk yang sudah pernah di-embed tidak dihitung ulang
+    return get_local_embeddings(LOCAL_EMBEDDING_MODEL)
+
+@st.cache_resource
+def get_corpus():
+    """
+    Koleksi Chroma di disk: di-load sekali saat server start (tanpa embed ulang)
+    """
+    return ChromaCorpus("app3_documents", get_embeddings())
+
 # --- FUNGSI PROSES DOKUMEN ---
-def process_pdf(uploaded_file):
-    try:
-        # a. Simpan file sementara
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            tmp_path = tmp_file.name
-
-        # b. Baca PDF
-        loader = PyPDFLoader(tmp_path)
-        docs = loader.load()
-        os.remove(tmp_path)
-
-        # c. Pecah teks (Chunks)
-        # [MODIFIKASI 2] Kembalikan ukuran chunk ke normal (1000)
-        # Kalau 10 terlalu kecil, AI tidak akan mengerti konteks kalimat.
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        splits = text_splitter.split_documents(docs)
-        st.write(f"Memproses {len(splits)} potongan data secara lokal...")
-
-        # d. Buat Embedding (LOKAL)
-        # Model ini akan didownload otomatis sekali saja (sekitar 80MB)
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        
-        # [MODIFIKASI 3] Langsung proses sekaligus (Tanpa Batching/Sleep)
-        # Karena lokal, tidak ada limit 429. Bisa langsung hajar semua.
-        vectorstore = Chroma.from_documents(
-            documents=splits,
-            embedding=embeddings
-        )
-        
-        # e. Simpan ke upload history
-        from datetime import datetime
-        upload_info = {
-            "filename": uploaded_file.name,
-            "size": f"{uploaded_file.size / 1024:.2f} KB",
-            "chunks": len(splits),
+@st.cache_resource
+def get_ingest_queue():
+    """
+    Antrian ingest background, satu per proses server
+    """
+    return IngestionQueue()
+
+def process_pdf(job, files, corpus, embeddings):
+    # Jalan di background worker: progress lewat `job`, jangan panggil st.* di sini
+    # Pipeline streaming: halaman -> chunk -> embedding -> insert per batch, tiap tahap di thread
+    # sendiri dengan antrian terbatas (memori tetap kecil walau PDF ribuan halaman)
+    # a. Baca semua PDF langsung dari bytes upload (tanpa file temporary),
+    #    halaman di-extract paralel di process pool dan dialirkan per halaman
+    job.report("parse")
+    pages = iter_pdf_pages(files, progress=lambda done, total: job.report("parse", done, total))
+
+    # b. Pecah teks (Chunks)
+    # [MODIFIKASI 2] Kembalikan ukuran chunk ke normal (CHUNK_TOKENS, default 160 token ~ 1000 karakter)
+    # Kalau 10 terlalu kecil, AI tidak akan mengerti konteks kalimat.
+    # Dipotong per token di batas heading/paragraf/kalimat, dengan page + offset di metadata
+    text_splitter = build_text_splitter()
+    counts = {"chunks": 0, "new": 0, "embedded": 0}
+    chunks_per_file = {file_name: 0 for file_name, _ in files}
+    seen = set()
+
+    # c. Chunk yang sudah ada di koleksi (ID = nama file + hash isi chunk) tidak diproses lagi;
+    #    isi yang sama di file yang di-rename mendapat ID baru dan disimpan sebagai baris baru
+    def select_new(chunks):
+        counts["chunks"] += len(chunks)
+        batch = {}
+        for doc in chunks:
+            chunks_per_file[doc.metadata["source"]] += 1
+            row_id = chunk_row_id(doc.metadata["source"], sha256_text(doc.page_content))
+            if row_id not in seen:
+                seen.add(row_id)
+                batch[row_id] = doc
+        existing = corpus.existing_ids(list(batch))
+        new_ids = [row_id for row_id in batch if row_id not in existing]
+        counts["new"] += len(new_ids)
+        job.report("split", counts["chunks"], counts["chunks"])
+        return (new_ids, [batch[row_id] for row_id in new_ids]) if new_ids else None
+
+    # d. Buat Embedding (LOKAL)
+    # [MODIFIKASI 3] Tanpa sleep: karena lokal, tidak ada limit 429
+    def embed(batch):
+        new_ids, new_splits = batch
+        texts = [doc.page_content for doc in new_splits]
+        vectors = embeddings.embed_documents(texts)
+        counts["embedded"] += len(texts)
+        job.report("embed", counts["embedded"], counts["new"])
+        return new_ids, texts, vectors, [doc.metadata for doc in new_splits]
+
+    # e. Tambahkan ke koleksi persistent (incremental), batch demi batch
+    inserted = 0
+    for new_ids, texts, vectors, metadatas in run_pipeline(
+        iter_chunk_batches(pages, text_splitter), select_new, embed
+    ):
+        corpus.add(new_ids, texts, vectors, metadatas)
+        inserted += len(new_ids)
+        job.report("insert", inserted, counts["new"])
+    job.report("insert", inserted, inserted, message=f"{inserted} chunk baru dari {counts['chunks']} chunk tersimpan")
+
+    # f. Info untuk upload history per file (dipasang ke session setelah job selesai)
+    upload_infos = []
+    for file_name, file_bytes in files:
+        upload_infos.append({
+            "filename": file_name,
+            "size": f"{len(file_bytes) / 1024:.2f} KB",
+            "chunks": chunks_per_file[file_name],
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        st.session_state.upload_history.append(upload_info)
-        
-        return vectorstore
+        })
+    return upload_infos
+
+def apply_finished_jobs():
+    """
+    Pasang hasil job yang sudah selesai ke session ini (dipanggil dari thread script)
+    """
+    for job in get_ingest_queue().jobs(list(st.session_state.ingest_jobs)):
+        if job.status == "done" and not st.session_state.ingest_jobs[job.id]:
+            st.session_state.upload_history.extend(job.result)
+            st.session_state.vector_db = get_corpus().vector_store
+        st.session_state.ingest_jobs[job.id] = job.finished
+
+apply_finished_jobs()
 
-    except Exception as e:
-        st.error(f"Gagal memproses PDF: {e}")
-        return None
+# Warm start: kalau koleksi di disk sudah berisi dokumen, langsung bisa dipakai chat
+if st.session_state.vector_db is None and get_corpus().count() > 0:
+    st.session_state.vector_db = get_corpus().vector_store
 
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("📂 Upload Dokumen")
-    uploaded_file = st.file_uploader("Upload file PDF kamu", type="pdf")
+    uploaded_files = st.file_uploader("Upload file PDF kamu", type="pdf", accept_multiple_files=True)
     
-    if uploaded_file is not None:
+    if uploaded_files:
         if st.button("Proses Dokumen"):
-            with st.spinner("Sedang download model & embedding (pertama kali agak lama)..."):
-                st.session_state.vector_db = process_pdf(uploaded_file)
-                st.success("Selesai! Vector Database tersimpan di memory lokal.")
+            # Diproses di background: chat tetap bisa dipakai selama dokumen diproses
+            files = [(f.name, f.getvalue()) for f in uploaded_files]
+            label = files[0][0] if len(files) == 1 else f"{len(files)} file PDF"
+            job = get_ingest_queue().submit(label, process_pdf, files, get_corpus(), get_embeddings())
+            st.session_state.ingest_jobs[job.id] = False
+
+    # --- STATUS PROSES DOKUMEN ---
+    session_jobs = get_ingest_queue().jobs(list(st.session_state.ingest_jobs))
+
+    @st.fragment(run_every=1 if any(not job.finished for job in session_jobs) else None)
+    def ingest_status_panel():
+        jobs = get_ingest_queue().jobs(list(st.session_state.ingest_jobs))
+        for job in reversed(jobs):
+            if job.status == "failed":
+                st.error(f"Gagal memproses {job.filename}: {job.error}")
+            elif job.status == "done":
+                st.success(f"✅ {job.filename}: {job.message}")
+            else:
+                st.progress(job.progress, text=f"⏳ {job.filename}: {job.describe()}")
+        # Ada job yang baru selesai -> rerun seluruh app supaya hasilnya terpasang
+        if any(job.finished and not st.session_state.ingest_jobs[job.id] for job in jobs):
+            st.rerun()
+
+    ingest_status_panel()
     
     # --- UPLOAD HISTORY ---
     st.divider()
@@ -114,7 +207,16 @@ with st.sidebar:
             st.session_state.upload_history = []
             st.rerun()
 
+# --- PANEL ADMIN: METRIK (opsional, METRICS_PANEL=true) ---
+if METRICS_PANEL:
+    with st.sidebar.expander("📈 Metrics (admin)"):
+        st.caption("Latency dalam detik, p50/p95 dari 1024 sampel terakhir per metrik")
+        st.dataframe(METRICS.summary(), hide_index=True)
+
 # --- AREA CHAT ---
+if st.session_state.chat_history.summary:
+    with st.expander(f"🗂️ {st.session_state.chat_history.summarized_count} pesan sebelumnya (diringkas)"):
+        st.write(st.session_state.chat_history.summary)
 for role, message in st.session_state.chat_history:
     with st.chat_message(role):
         st.write(message)
@@ -132,23 +234,38 @@ if user_query:
     else:
         with st.chat_message("assistant"):
             with st.spinner("Mencari jawaban..."):
-                # LLM TETAP PAKAI GEMINI (Agar jawabannya pintar)
-                llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.3)
-
-                prompt = ChatPromptTemplate.from_template("""
-                Jawab pertanyaan berdasarkan konteks berikut:
-                <context>
-                {context}
-                </context>
-                Pertanyaan: {input}
-                """)
-
-                retriever = st.session_state.vector_db.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-                document_chain = create_stuff_documents_chain(llm, prompt)
-                retrieval_chain = create_retrieval_chain(retriever, document_chain)
-
-                response = retrieval_chain.invoke({"input": user_query})
-                answer = response['answer']
-                
-                st.write(answer)
-                st.session_state.chat_history.append(("assistant", answer))
\ No newline at end of file
+                # Timing retrieve / prompt / generate + jumlah token & dokumen untuk metrics
+                query_metrics = QueryMetrics()
+                try:
+                    # Pertanyaan lanjutan ("cara mencegahnya?") ditulis ulang jadi pertanyaan mandiri dari riwayat chat
+                    turn = ChatTurn(
+                        st.session_state.chat_history, user_query, None, get_llm("gemini-2.0-flash", 0.0),
+                        tracker=query_metrics
+                    )
+                    turn.prepare()
+                    if turn.search_query != user_query:
+                        st.caption(f"🔎 Dicari sebagai: {turn.search_query}")
+
+                    # LLM, prompt & chain dibuat sekali per proses lalu dipakai ulang (tidak dibangun ulang tiap pesan)
+                    retrieval_chain = get_retrieval_chain(
+                        st.session_state.vector_db,
+                        PROMPT_TEMPLATE,
+                        model="gemini-2.0-flash",
+                        temperature=0.3,
+                        search_kwargs={"k": 5},
+                        # Hybrid: BM25 menangkap istilah persis (CVE, nama malware, port) yang sering lolos dari vector search
+                        bm25_index=get_corpus().bm25_index() if HYBRID_SEARCH else None
+                    )
+
+                    if STREAM_ANSWER:
+                        answer = st.write_stream(turn.stream(retrieval_chain))
+                    else:
+                        answer = turn.invoke(retrieval_chain)
+                        st.write(answer)
+
+                    # Simpan jawaban ke history (pesan lama yang tergeser diringkas) + catat metrics
+                    turn.finish(answer)
+                except Exception as e:
+                    # Query gagal tetap tercatat (status error) sebelum error ditampilkan Streamlit
+                    query_metrics.finish(error=e)
+                    raise
\ No newline at end of file
@@ -1,21 +1,24 @@
 import streamlit as st
 import os
-import tempfile
 from dotenv import load_dotenv
-from datetime import datetime
 
 # --- Import Library ---
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import TiDBVectorStore
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_classic.chains.retrieval import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+
+from answer_cache import SemanticAnswerCache
+from chat_memory import ChatMemory
+from hybrid_retriever import HYBRID_SEARCH, build_bm25_index
+from ingest_ledger import IngestLedger
+from ingest_worker import IngestionQueue
+from model_registry import LOCAL_EMBEDDING_MODEL, get_local_embeddings
+from metrics import METRICS_PANEL, REGISTRY as METRICS, QueryMetrics, start_metrics_server
+from rag_chain import STREAM_ANSWER, get_llm, get_retrieval_chain
+from rag_flow import ChatTurn, process_pdf
+from tenancy import TENANT_DEFAULT, TENANT_MODE, TenantStore, normalize_tenant, tenant_from_email, usage_by_tenant
+from tidb_store import VECTOR_INDEX, BulkWriter, TiDBVectorSearch
 
 # 1. Load API Key & Database Config
 load_dotenv()
+start_metrics_server()  # endpoint Prometheus /metrics kalau METRICS_PORT di-set
 if "GOOGLE_API_KEY" not in os.environ:
     if "GOOGLE_API_KEY" in st.secrets:
         # LangChain mencari key di os.environ
@@ -45,7 +48,7 @@ st.markdown("""
 
 # 3. Setup Session State
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatMemory()  # pesan terakhir + ringkasan pesan lama (lihat chat_memory.py)
 if "vector_store" not in st.session_state:
     st.session_state.vector_store = None
 if "upload_history" not in st.session_state:
@@ -56,6 +59,50 @@ if "connection_error" not in st.session_state:
     st.session_state.connection_error = None
 if "embeddings" not in st.session_state:
     st.session_state.embeddings = None
+if "bulk_writer" not in st.session_state:
+    st.session_state.bulk_writer = None
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {}  # job_id -> sudah dipasang ke session atau belum
+if "workspace" not in st.session_state:
+    # Workspace bisa dibuka langsung lewat URL: ?workspace=tim-soc
+    st.session_state.workspace = st.query_params.get("workspace", TENANT_DEFAULT)
+if "active_tenant" not in st.session_state:
+    st.session_state.active_tenant = None
+
+# Prompt persona CyberSec Buddy
+PROMPT_TEMPLATE = """
+Kamu adalah Senior Cybersecurity Expert yang berpengalaman puluhan tahun di bidang keamanan siber.
+Kamu punya gaya komunikasi yang santai, friendly, dan mudah dipahami, tapi tetap profesional dan informatif.
+
+PERSONALITY & STYLE:
+- Gunakan bahasa Indonesia yang santai tapi tetap sopan (seperti ngobrol sama teman)
+- Sesekali pakai kata "aku/kamu" untuk kesan lebih personal
+- Tambahkan emoji yang relevan untuk membuat penjelasan lebih menarik
+- Berikan analogi atau contoh real-world yang mudah dipahami
+- Selalu tekankan pentingnya security awareness
+- Jika ada ancaman/risiko, jelaskan dengan cara yang tidak menakut-nakuti tapi tetap serius
+
+RESPONSE STRUCTURE:
+1. Mulai dengan greeting singkat atau acknowledgment pertanyaan
+2. Berikan jawaban utama yang jelas dan to-the-point
+3. Tambahkan tips praktis atau best practices jika relevan
+4. Akhiri dengan motivasi atau reminder tentang pentingnya security awareness
+
+IMPORTANT RULES:
+- HANYA jawab berdasarkan konteks dokumen yang diberikan
+- Jika info tidak ada di dokumen, bilang dengan jujur: "Nah, untuk yang ini aku belum punya info lengkap di dokumen yang kamu upload. Tapi secara umum..."
+- Jangan mengarang atau membuat informasi palsu
+- Selalu prioritaskan keakuratan informasi
+
+CONTEXT dari dokumen:
+<context>
+{context}
+</context>
+
+PERTANYAAN USER: {input}
+
+Jawab dengan gaya kamu yang khas sebagai Senior Cybersecurity Expert yang friendly tapi tetap expert!
+"""
 
 # --- FUNGSI KONEKSI TIDB ---
 @st.cache_resource
@@ -74,85 +121,165 @@ def init_tidb_connection():
         
         # Validasi kredensial
         if not all([tidb_host, tidb_user, tidb_password]):
-            return None, None, "Database Kredensial tidak lengkap di file .env atau secrets"
+            return None, None, None, "Database Kredensial tidak lengkap di file .env atau secrets"
         
         # Buat connection string
         connection_string = f"mysql+pymysql://{tidb_user}:{tidb_password}@{tidb_host}:{tidb_port}/{tidb_database}?ssl_ca=/etc/ssl/cert.pem&ssl_verify_cert=true&ssl_verify_identity=true"
         
-        # Inisialisasi embeddings
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # Embeddings dari registry model (di-load sekali per proses di background, dibungkus cache disk,
+        # dipakai bareng untuk chunk & query)
+        embeddings = get_local_embeddings(LOCAL_EMBEDDING_MODEL)
         
-        # Inisialisasi vector store
-        vector_store = TiDBVectorStore(
-            connection_string=connection_string,
-            embedding_function=embeddings,
-            table_name=tidb_table,
-            distance_strategy="cosine"
-        )
+        # Writer untuk ingest: multi-row INSERT per batch + retry (pool koneksi di-tuning: pre-ping, recycle, ukuran pool)
+        bulk_writer = BulkWriter(connection_string, tidb_table, tenant_column=TENANT_MODE == "column")
+
+        # Vector index HNSW di kolom embedding (sekali, idempotent): query tidak lagi scan seluruh tabel
+        if VECTOR_INDEX:
+            bulk_writer.ensure_vector_index()
+
+        # Tabel bersama: kolom `tenant` ber-index, baris lama jadi milik tenant default (sekali, idempotent)
+        if TENANT_MODE == "column":
+            bulk_writer.ensure_tenant_column(default_tenant=TENANT_DEFAULT)
+
+        # Vector search lewat SQL di pool koneksi yang sama, filter metadata (cakupan dokumen) di-push ke query
+        vector_store = TiDBVectorSearch(bulk_writer.engine, tidb_table, embeddings, writer=bulk_writer)
         
-        return vector_store, embeddings, None
+        return vector_store, embeddings, bulk_writer, None
         
     except Exception as e:
-        return None, None, str(e)
+        return None, None, None, str(e)
+
+@st.cache_resource
+def get_tenant_store(tenant, _bulk_writer, _embeddings):
+    """
+    Writer + vector search yang dibatasi ke satu tenant (satu per tenant per proses server)
+    """
+    return TenantStore(_bulk_writer, _embeddings, tenant)
+
+@st.cache_resource
+def get_ingest_ledger(namespace):
+    """
+    Ledger hash file & chunk yang sudah masuk ke tabel TiDB (satu per proses server per tenant)
+    """
+    return IngestLedger(namespace=namespace)
+
+@st.cache_resource
+def get_answer_cache(tenant):
+    """
+    Cache jawaban semantik, dipakai bareng semua user di tenant yang sama
+    """
+    return SemanticAnswerCache()
+
+@st.cache_resource
+def get_bm25_index(tenant, _tenant_store):
+    """
+    Index BM25 (kata kunci) isi dokumen tenant: dibaca sekali per proses server,
+    setelah itu di-update incremental oleh job ingest
+    """
+    return build_bm25_index(_tenant_store.documents())
+
+@st.cache_data(ttl=300)
+def get_source_files(tenant, _tenant_store):
+    """
+    Daftar file tenant untuk pilihan cakupan dokumen (di-refresh setelah job ingest selesai)
+    """
+    return _tenant_store.sources()
+
+@st.cache_data(ttl=60)
+def get_tenant_usage(tenant, _tenant_store):
+    """
+    Jumlah chunk, file & karakter milik tenant (query agregat ke TiDB, di-cache 1 menit)
+    """
+    return _tenant_store.usage()
+
+@st.cache_data(ttl=60)
+def get_usage_by_tenant(table_name, _bulk_writer):
+    """
+    Pemakaian semua tenant untuk panel admin
+    """
+    return usage_by_tenant(_bulk_writer)
+
+def login_email():
+    """
+    Email user kalau app memakai login Streamlit (`st.login`), selain itu None
+    """
+    user = getattr(st, "user", None)
+    if user is not None and user.get("is_logged_in"):
+        return user.get("email")
+    return None
+
+def current_tenant():
+    """
+    Tenant (workspace) session ini: dari email login kalau ada, selain itu dari isian workspace di sidebar
+    """
+    email = login_email()
+    if email:
+        return tenant_from_email(email)
+    try:
+        return normalize_tenant(st.session_state.workspace)
+    except ValueError:
+        return TENANT_DEFAULT
+
+def current_search_filter():
+    """
+    Filter metadata dari pilihan cakupan dokumen di sidebar (None = semua dokumen)
+    """
+    search_filter = {}
+    if st.session_state.get("scope_files"):
+        search_filter["source_file"] = {"$in": list(st.session_state.scope_files)}
+    if st.session_state.get("scope_use_date") and st.session_state.get("scope_after"):
+        search_filter["upload_time"] = {"$gte": st.session_state.scope_after.isoformat()}
+    return search_filter or None
 
 # Auto-connect saat aplikasi dimulai
 if not st.session_state.tidb_connected and st.session_state.vector_store is None:
     with st.spinner("🔄 Menghubungkan ke Database Vector Store..."):
-        vector_store, embeddings, error = init_tidb_connection()
+        vector_store, embeddings, bulk_writer, error = init_tidb_connection()
         
         if vector_store and embeddings:
             st.session_state.vector_store = vector_store
             st.session_state.embeddings = embeddings
+            st.session_state.bulk_writer = bulk_writer
             st.session_state.tidb_connected = True
             st.session_state.connection_error = None
         else:
             st.session_state.tidb_connected = False
             st.session_state.connection_error = error
 
-# --- FUNGSI PROSES DOKUMEN ---
-def process_pdf(uploaded_file, vector_store, embeddings):
-    try:
-        # a. Simpan file sementara
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            tmp_path = tmp_file.name
-
-        # b. Baca PDF
-        loader = PyPDFLoader(tmp_path)
-        docs = loader.load()
-        os.remove(tmp_path) 
-
-        # c. Pecah teks (Chunks)
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,    
-            chunk_overlap=200   
-        )
-        splits = text_splitter.split_documents(docs)
-        st.write(f"Memproses {len(splits)} potongan data...")
+# Semua akses dokumen (search, BM25, daftar file, ledger, cache jawaban) dibatasi ke tenant session ini
+tenant = current_tenant()
+if st.session_state.active_tenant != tenant:
+    if st.session_state.active_tenant is not None:
+        # Pindah workspace: riwayat chat & cakupan dokumen workspace lama tidak ikut dibawa
+        st.session_state.chat_history = ChatMemory()
+        st.session_state.upload_history = []
+        st.session_state.pop("scope_files", None)
+    st.session_state.active_tenant = tenant
+tenant_store = None
+if st.session_state.tidb_connected:
+    tenant_store = get_tenant_store(tenant, st.session_state.bulk_writer, st.session_state.embeddings)
 
-        # d. Tambahkan metadata untuk tracking
-        for i, doc in enumerate(splits):
-            doc.metadata["source_file"] = uploaded_file.name
-            doc.metadata["chunk_id"] = i
-            doc.metadata["upload_time"] = datetime.now().isoformat()
+# --- FUNGSI PROSES DOKUMEN ---
+@st.cache_resource
+def get_ingest_queue():
+    """
+    Antrian ingest background, satu per proses server
+    """
+    return IngestionQueue()
 
-        # e. Simpan ke TiDB Vector Store
-        vector_store.add_documents(splits)
-        
-        # f. Simpan ke upload history
-        upload_info = {
-            "filename": uploaded_file.name,
-            "size": f"{uploaded_file.size / 1024:.2f} KB",
-            "chunks": len(splits),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        st.session_state.upload_history.append(upload_info)
-        
-        return True
+def apply_finished_jobs():
+    """
+    Pasang hasil job yang sudah selesai ke session ini (dipanggil dari thread script)
+    """
+    for job in get_ingest_queue().jobs(list(st.session_state.ingest_jobs)):
+        if job.status == "done" and not st.session_state.ingest_jobs[job.id] and job.result:
+            if job.result["tenant"] == st.session_state.active_tenant:
+                st.session_state.upload_history.append(job.result)
+            get_source_files.clear()
+            get_tenant_usage.clear()
+        st.session_state.ingest_jobs[job.id] = job.finished
 
-    except Exception as e:
-        st.error(f"Gagal memproses PDF: {e}")
-        return False
+apply_finished_jobs()
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -167,7 +294,17 @@ with st.sidebar:
             st.write(f"**Host:** {os.getenv('TIDB_HOST', 'N/A') or st.secrets['TIDB_HOST']}")
             st.write(f"**Port:** {os.getenv('TIDB_PORT', '4000') or st.secrets['TIDB_PORT']}")
             st.write(f"**Database:** {os.getenv('TIDB_DATABASE', 'test') or st.secrets['TIDB_DATABASE']}")
-            st.write(f"**Table:** {os.getenv('TIDB_TABLE', 'rag_documents') or st.secrets['TIDB_TABLE']}")
+            st.write(f"**Table:** {tenant_store.table_name} (tenant mode: {TENANT_MODE})")
+            cache_stats = st.session_state.embeddings.stats()
+            st.write(f"**Embedding cache:** {cache_stats['hits']} hit / {cache_stats['misses']} miss ({cache_stats['hit_rate']:.0%})")
+            answer_cache = get_answer_cache(tenant)
+            st.write(f"**Answer cache:** {len(answer_cache)} jawaban, {answer_cache.hits} hit / {answer_cache.misses} miss")
+            if tenant_store.writer.vector_index_ready:
+                st.write("**Vector index:** HNSW (cosine) aktif")
+            elif tenant_store.writer.vector_index_error:
+                st.write(f"**Vector index:** tidak aktif ({tenant_store.writer.vector_index_error})")
+            else:
+                st.write("**Vector index:** belum dibuat (dipasang saat upload pertama)" if VECTOR_INDEX else "**Vector index:** dimatikan")
             # st.write(f"**User:** {os.getenv('TIDB_USER', 'N/A')}")
     else:
         st.error("🔴 **Not Connected to Database Vector Store**")
@@ -182,27 +319,85 @@ with st.sidebar:
             st.rerun()
     
     st.divider()
-    
+
+    # --- WORKSPACE (tenant): dokumen, pencarian & cache jawaban dipisah per workspace ---
+    if st.session_state.tidb_connected:
+        st.header("🏢 Workspace")
+        if login_email():
+            st.write(f"**{tenant}** (dari akun {login_email()})")
+        else:
+            st.text_input("Nama workspace / tim", key="workspace", help="Dokumen hanya bisa dicari dari workspace yang sama")
+        usage = get_tenant_usage(tenant, tenant_store)
+        col_chunks, col_files = st.columns(2)
+        col_chunks.metric("Chunks", f"{usage['chunks']:,}")
+        col_files.metric("File", f"{usage['files']:,}")
+        queries = METRICS.counter_value("rag_queries_total", tenant=tenant)
+        llm_tokens = METRICS.counter_value("rag_llm_tokens_total", tenant=tenant)
+        st.caption(
+            f"{usage['characters'] / 1e6:.2f} juta karakter teks · {queries:.0f} pertanyaan · "
+            f"{llm_tokens:,.0f} token LLM (sejak server start)"
+        )
+        st.divider()
+
     # --- UPLOAD DOKUMEN ---
     st.header("📂 Upload Dokumen")
     
     if not st.session_state.tidb_connected:
         st.warning("Hubungkan ke Database Vector Store terlebih dahulu!")
     else:
-        uploaded_file = st.file_uploader("Upload file PDF kamu", type="pdf")
+        uploaded_files = st.file_uploader("Upload file PDF kamu", type="pdf", accept_multiple_files=True)
         
-        if uploaded_file is not None:
+        if uploaded_files:
             if st.button("Proses Dokumen"):
-                with st.spinner("Memproses dan upload..."):
-                    success = process_pdf(
-                        uploaded_file, 
-                        st.session_state.vector_store,
-                        st.session_state.embeddings
+                # Diproses di background (satu job per file, paralel):
+                # chat tetap jalan pakai dokumen yang sudah ada di database
+                for uploaded_file in uploaded_files:
+                    job = get_ingest_queue().submit(
+                        uploaded_file.name,
+                        process_pdf,
+                        uploaded_file.name,
+                        uploaded_file.getvalue(),
+                        tenant_store,
+                        st.session_state.embeddings,
+                        get_ingest_ledger(tenant_store.namespace),
+                        get_answer_cache(tenant),
+                        get_bm25_index(tenant, tenant_store) if HYBRID_SEARCH else None
                     )
-                    if success:
-                        st.success("✅ Dokumen berhasil disimpan!")
+                    st.session_state.ingest_jobs[job.id] = False
+
+        # --- STATUS PROSES DOKUMEN ---
+        session_jobs = get_ingest_queue().jobs(list(st.session_state.ingest_jobs))
+
+        @st.fragment(run_every=1 if any(not job.finished for job in session_jobs) else None)
+        def ingest_status_panel():
+            jobs = get_ingest_queue().jobs(list(st.session_state.ingest_jobs))
+            for job in reversed(jobs):
+                if job.status == "failed":
+                    st.error(f"Gagal memproses {job.filename}: {job.error}")
+                elif job.status == "done":
+                    st.success(f"✅ {job.filename}: {job.message}")
+                else:
+                    st.progress(job.progress, text=f"⏳ {job.filename}: {job.describe()}")
+            # Ada job yang baru selesai -> rerun seluruh app supaya hasilnya terpasang
+            if any(job.finished and not st.session_state.ingest_jobs[job.id] for job in jobs):
+                st.rerun()
+
+        ingest_status_panel()
     
     st.divider()
+
+    # --- CAKUPAN DOKUMEN (filter metadata, dijalankan di query TiDB) ---
+    if st.session_state.tidb_connected:
+        st.header("🎯 Cakupan Dokumen")
+        st.multiselect(
+            "Cari hanya di dokumen ini:",
+            get_source_files(tenant, tenant_store),
+            key="scope_files",
+            placeholder="Semua dokumen"
+        )
+        if st.checkbox("Hanya dokumen yang diupload setelah tanggal tertentu", key="scope_use_date"):
+            st.date_input("Diupload sejak", key="scope_after")
+        st.divider()
     
     # --- UPLOAD HISTORY ---
     st.header("📜 History Upload")
@@ -216,6 +411,8 @@ with st.sidebar:
             with st.expander(f"📄 {file_info['filename']}", expanded=(idx==1)):
                 st.write(f"**Ukuran:** {file_info['size']}")
                 st.write(f"**Chunks:** {file_info['chunks']}")
+                if "new_chunks" in file_info:
+                    st.write(f"**Chunks baru di-embed:** {file_info['new_chunks']}")
                 st.write(f"**Waktu:** {file_info['timestamp']}")
         
         # Tombol clear history
@@ -223,7 +420,19 @@ with st.sidebar:
             st.session_state.upload_history = []
             st.rerun()
 
+# --- PANEL ADMIN: METRIK (opsional, METRICS_PANEL=true) ---
+if METRICS_PANEL:
+    with st.sidebar.expander("📈 Metrics (admin)"):
+        st.caption("Latency dalam detik, p50/p95 dari 1024 sampel terakhir per metrik")
+        st.dataframe(METRICS.summary(), hide_index=True)
+        if st.session_state.tidb_connected:
+            st.caption(f"Pemakaian per tenant (mode {TENANT_MODE})")
+            st.dataframe(get_usage_by_tenant(tenant_store.base_table, st.session_state.bulk_writer), hide_index=True)
+
 # --- AREA CHAT ---
+if st.session_state.chat_history.summary:
+    with st.expander(f"🗂️ {st.session_state.chat_history.summarized_count} pesan sebelumnya (diringkas)"):
+        st.write(st.session_state.chat_history.summary)
 for role, message in st.session_state.chat_history:
     with st.chat_message(role):
         st.write(message)
@@ -241,69 +450,52 @@ if user_query:
     else:
         with st.chat_message("assistant"):
             with st.spinner("🔍 Lagi nyari info terbaik buat kamu..."):
+                # Timing retrieve / prompt / generate + jumlah token & dokumen untuk metrics
+                query_metrics = QueryMetrics(tenant=tenant)
                 try:
-                    # LLM menggunakan Gemini dengan temperature lebih tinggi untuk gaya santai
-                    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7)
+                    # Cakupan dokumen dari sidebar: jadi WHERE di query TiDB & bagian dari kunci cache jawaban
+                    search_filter = current_search_filter()
+                    turn = ChatTurn(
+                        st.session_state.chat_history, user_query, st.session_state.embeddings,
+                        get_llm("gemini-2.0-flash", 0.0), get_answer_cache(tenant), search_filter, query_metrics
+                    )
+                    # Rewrite pertanyaan lanjutan, lalu cek dulu cache jawaban: pertanyaan yang mirip banget pernah dijawab?
+                    cached = turn.prepare()
+                    if turn.search_query != user_query:
+                        st.caption(f"🔎 Dicari sebagai: {turn.search_query}")
 
-                    prompt = ChatPromptTemplate.from_template("""
-                    Kamu adalah Senior Cybersecurity Expert yang berpengalaman puluhan tahun di bidang keamanan siber.
-                    Kamu punya gaya komunikasi yang santai, friendly, dan mudah dipahami, tapi tetap profesional dan informatif.
-                    
-                    PERSONALITY & STYLE:
-                    - Gunakan bahasa Indonesia yang santai tapi tetap sopan (seperti ngobrol sama teman)
-                    - Sesekali pakai kata "aku/kamu" untuk kesan lebih personal
-                    - Tambahkan emoji yang relevan untuk membuat penjelasan lebih menarik
-                    - Berikan analogi atau contoh real-world yang mudah dipahami
-                    - Selalu tekankan pentingnya security awareness
-                    - Jika ada ancaman/risiko, jelaskan dengan cara yang tidak menakut-nakuti tapi tetap serius
-                    
-                    RESPONSE STRUCTURE:
-                    1. Mulai dengan greeting singkat atau acknowledgment pertanyaan
-                    2. Berikan jawaban utama yang jelas dan to-the-point
-                    3. Tambahkan tips praktis atau best practices jika relevan
-                    4. Akhiri dengan motivasi atau reminder tentang pentingnya security awareness
-                    
-                    IMPORTANT RULES:
-                    - HANYA jawab berdasarkan konteks dokumen yang diberikan
-                    - Jika info tidak ada di dokumen, bilang dengan jujur: "Nah, untuk yang ini aku belum punya info lengkap di dokumen yang kamu upload. Tapi secara umum..."
-                    - Jangan mengarang atau membuat informasi palsu
-                    - Selalu prioritaskan keakuratan informasi
-                    
-                    CONTEXT dari dokumen:
-                    <context>
-                    {context}
-                    </context>
-                    
-                    PERTANYAAN USER: {input}
-                    
-                    Jawab dengan gaya kamu yang khas sebagai Senior Cybersecurity Expert yang friendly tapi tetap expert!
-                    """)
+                    if cached is not None:
+                        answer = cached["answer"]
+                        st.write(answer)
+                        st.caption(f"⚡ Dijawab dari cache (mirip {cached['score']:.0%} dengan: \"{cached['query']}\")")
+                    else:
+                        # LLM, prompt & chain dibuat sekali per proses lalu dipakai ulang (tidak dibangun ulang tiap pesan)
+                        retrieval_chain = get_retrieval_chain(
+                            tenant_store.vector_store,
+                            PROMPT_TEMPLATE,
+                            model="gemini-2.0-flash",
+                            temperature=0.7,  # Lebih tinggi untuk gaya santai
+                            search_kwargs={"k": 5, "filter": search_filter} if search_filter else {"k": 5},
+                            # Hybrid: BM25 menangkap istilah persis (CVE, nama malware, port) yang sering lolos dari vector search
+                            bm25_index=get_bm25_index(tenant, tenant_store) if HYBRID_SEARCH else None
+                        )
 
-                    # Retriever dari TiDB
-                    retriever = st.session_state.vector_store.as_retriever(
-                        search_type="similarity", 
-                        search_kwargs={"k": 5}
-                    )
-                    
-                    document_chain = create_stuff_documents_chain(llm, prompt)
-                    retrieval_chain = create_retrieval_chain(retriever, document_chain)
+                        if STREAM_ANSWER:
+                            answer = st.write_stream(turn.stream(retrieval_chain))
+                        else:
+                            answer = turn.invoke(retrieval_chain)
+                            st.write(answer)
 
-                    response = retrieval_chain.invoke({"input": user_query})
-                    answer = response['answer']
-                    
-                    st.write(answer)
-                    st.session_state.chat_history.append(("assistant", answer))
+                    # Simpan ke cache jawaban & riwayat chat (pesan lama yang tergeser diringkas)
+                    turn.finish(answer)
                     
                     # Tampilkan sumber dokumen dengan style yang lebih menarik
                     with st.expander("📚 Referensi Dokumen (Dari mana aku dapet info ini)"):
                         st.markdown("*Info di atas aku ambil dari dokumen-dokumen ini:*")
-                        sources = set()
-                        for doc in response.get('context', []):
-                            source_file = doc.metadata.get('source_file', 'Unknown')
-                            if source_file not in sources:
-                                st.write(f"✅ **{source_file}**")
-                                sources.add(source_file)
+                        for source_file in turn.sources:
+                            st.write(f"✅ **{source_file}**")
                             
                 except Exception as e:
+                    query_metrics.finish(error=e)
                     st.error(f"❌ Oops, ada error nih: {e}")
                     st.write("Kayaknya belum ada dokumen yang kamu upload deh. Coba upload dokumen cybersecurity dulu ya di sidebar! 📄")
\ No newline at end of file
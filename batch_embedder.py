@@ -0,0 +1,191 @@
+"""
+Embedder batch + paralel yang sadar rate limit (untuk embedding via API, mis. Gemini).
+
+Chunk dikemas jadi batch seukuran request API, lalu dikirim oleh beberapa worker
+sekaligus. Setiap request harus "membayar" ke token bucket RPM (request per menit)
+dan TPM (token per menit), jadi kita hanya menunggu kalau kuota benar-benar habis,
+bukan `time.sleep(2)` di setiap chunk. Kalau tetap kena 429, semua worker mundur
+bareng (exponential backoff) dan laju request diturunkan sementara.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_RPM = int(os.getenv("EMBED_RPM", "60"))
+DEFAULT_TPM = int(os.getenv("EMBED_TPM", "100000"))
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # batas batchEmbedContents Gemini
+DEFAULT_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+
+
+def estimate_tokens(text):
+    # Perkiraan kasar ~4 karakter per token, cukup untuk budget TPM
+    return len(text) // 4 + 1
+
+
+def is_rate_limit_error(exc):
+    message = str(exc).lower()
+    return (
+        "429" in message
+        or "resource has been exhausted" in message
+        or "rate limit" in message
+        or "quota" in message
+        or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+    )
+
+
+class TokenBucket:
+    """Token bucket sederhana: kapasitas = jatah per menit, diisi ulang terus-menerus."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60.0 * scale)
+        self.updated = now
+
+    def wait_time(self, amount, scale):
+        # Request yang lebih besar dari kapasitas tetap boleh jalan begitu bucket penuh
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.capacity / 60.0 * scale)
+
+
+class RateLimiter:
+    """
+    Gabungan bucket RPM + TPM dengan backoff adaptif (AIMD).
+
+    Setiap 429 memotong laju isi ulang jadi setengah dan menahan semua worker
+    sampai `pause_until`; setiap request sukses memulihkan laju sedikit demi sedikit.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.scale = 1.0
+        self.pause_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.requests.refill(now, self.scale)
+                self.tokens.refill(now, self.scale)
+                wait = max(
+                    self.pause_until - now,
+                    self.requests.wait_time(1, self.scale),
+                    self.tokens.wait_time(tokens, self.scale),
+                )
+                if wait <= 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                    return
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.scale = min(1.0, self.scale + 0.05)
+
+    def on_rate_limited(self, attempt):
+        with self._lock:
+            self.scale = max(0.1, self.scale / 2)
+            delay = min(60.0, 2.0 * (2 ** attempt)) * random.uniform(0.8, 1.2)
+            self.pause_until = max(self.pause_until, time.monotonic() + delay)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+    """Satu limiter per model per proses, supaya semua session berbagi kuota yang sama."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(rpm=rpm, tpm=tpm)
+        return _limiters[name]
+
+
+class BatchEmbedder(Embeddings):
+    """
+    Wrapper `Embeddings` yang membagi teks jadi batch dan mengirimnya paralel.
+
+    `progress_callback(selesai, total)` dipanggil dari thread pemanggil
+    (bukan dari worker), jadi aman dipakai untuk update `st.progress`.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        limiter,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_batch_tokens=None,
+        max_concurrency=DEFAULT_CONCURRENCY,
+        max_retries=6,
+        progress_callback=None,
+    ):
+        self.embeddings = embeddings
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens or int(limiter.tokens.capacity)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.progress_callback = progress_callback
+
+    def _pack(self, texts):
+        """Kelompokkan index teks jadi batch yang muat di batas jumlah & token per request."""
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def _call(self, fn, tokens):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.limiter.on_rate_limited(attempt)
+                continue
+            self.limiter.on_success()
+            return result
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        vectors = [None] * len(texts)
+        done = 0
+
+        def run(indexes, tokens):
+            batch = [texts[i] for i in indexes]
+            return indexes, self._call(lambda: self.embeddings.embed_documents(batch), tokens)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = [pool.submit(run, indexes, tokens) for indexes, tokens in self._pack(texts)]
+            for future in as_completed(futures):
+                indexes, result = future.result()
+                for i, vector in zip(indexes, result):
+                    vectors[i] = vector
+                done += len(indexes)
+                if self.progress_callback:
+                    self.progress_callback(done, len(texts))
+        return vectors
+
+    def embed_query(self, text):
+        return self._call(lambda: self.embeddings.embed_query(text), estimate_tokens(text))
@@ -0,0 +1,7 @@
+"""
+Benchmark offline untuk pipeline RAG (tanpa Gemini, tanpa TiDB, tanpa koneksi internet).
+
+Jalankan dari root repo:
+
+    python -m bench.rag_bench --output bench_results.json
+"""
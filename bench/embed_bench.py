@@ -0,0 +1,130 @@
+"""
+Throughput embedding lokal (chunk/detik) per backend, batch size, dan batching per panjang.
+
+Chunk diambil dari korpus fixture (`bench.fixtures`, di-split 1000/200 seperti app2 - app4)
+atau dari folder PDF sendiri. Untuk setiap backend dilaporkan juga kemiripan cosine vector
+terhadap backend pertama (biasanya `torch` float32), supaya penurunan kualitas backend
+int8 terlihat. Output JSON:
+
+    python -m bench.embed_bench --backends torch,torch-int8,onnx --batch-sizes 16,64
+    python -m bench.embed_bench --pdf-dir ./docs --threads 4 --output embed_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bench.fixtures import corpus_files
+from bench.rag_bench import peak_rss_mb
+from chunker import build_text_splitter
+from local_embedder import DEFAULT_THREADS, LocalEmbedder
+from model_registry import LOCAL_EMBEDDING_MODEL
+from pdf_parser import parse_pdfs
+
+
+def load_chunks(args):
+    if args.pdf_dir:
+        files = []
+        for name in sorted(os.listdir(args.pdf_dir)):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(args.pdf_dir, name), "rb") as f:
+                    files.append((name, f.read()))
+    else:
+        files = corpus_files(filler_pages=args.filler_pages)
+    splitter = build_text_splitter()  # sama seperti app
+    texts = [doc.page_content for doc in splitter.split_documents(parse_pdfs(files))]
+    return texts[:args.limit] if args.limit else texts
+
+
+def mean_cosine(vectors, reference):
+    a = np.asarray(vectors, dtype=np.float32)
+    b = np.asarray(reference, dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return round(float((a * b).sum(axis=1).mean()), 5)
+
+
+def run_backend(backend, texts, args, reference):
+    started = time.perf_counter()
+    embedder = LocalEmbedder(args.model, backend=backend, threads=args.threads)
+    load_seconds = time.perf_counter() - started
+    embedder.embed_documents(texts[:8])  # warm-up
+
+    results = []
+    for batch_size in args.batch_sizes:
+        for bucketing in args.bucketing:
+            embedder.batch_size = batch_size
+            embedder.bucketing = bucketing
+            started = time.perf_counter()
+            vectors = embedder.embed_documents(texts)
+            seconds = time.perf_counter() - started
+            if reference is None:
+                reference = vectors
+            results.append({
+                "backend": backend,
+                "batch_size": batch_size,
+                "bucketing": bucketing,
+                "seconds": round(seconds, 3),
+                "chunks_per_second": round(len(texts) / seconds, 1),
+                "load_seconds": round(load_seconds, 3),
+                "cosine_vs_reference": mean_cosine(vectors, reference),
+            })
+            print(f"{backend} batch={batch_size} bucketing={bucketing}: "
+                  f"{results[-1]['chunks_per_second']} chunk/s", file=sys.stderr)
+    return results, reference
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput embedding lokal per backend (output JSON).")
+    parser.add_argument("--model", default=LOCAL_EMBEDDING_MODEL)
+    parser.add_argument("--backends", default="torch,torch-int8",
+                        help="Backend dipisah koma; yang pertama jadi referensi kemiripan vector")
+    parser.add_argument("--batch-sizes", default="16,64",
+                        type=lambda value: [int(v) for v in value.split(",")])
+    parser.add_argument("--bucketing", default="on,off",
+                        type=lambda value: [v == "on" for v in value.split(",")],
+                        help="on,off = bandingkan dengan dan tanpa batching per panjang")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--filler-pages", type=int, default=60, help="Halaman filler korpus fixture")
+    parser.add_argument("--pdf-dir", help="Folder PDF sendiri (menggantikan korpus fixture)")
+    parser.add_argument("--limit", type=int, default=0, help="Batasi jumlah chunk (0 = semua)")
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    texts = load_chunks(args)
+    results, reference = [], None
+    for backend in args.backends.split(","):
+        backend_results, reference = run_backend(backend, texts, args, reference)
+        results.extend(backend_results)
+
+    output = json.dumps({
+        "benchmark": "embed_bench",
+        "schema_version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "cpu_count": os.cpu_count(), "threads": args.threads},
+        "data": {
+            "source": args.pdf_dir or "fixtures",
+            "model": args.model,
+            "chunks": len(texts),
+            "mean_chunk_chars": round(sum(map(len, texts)) / len(texts), 1) if texts else 0,
+        },
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Korpus PDF tetap + daftar query berlabel untuk benchmark.
+
+PDF dibuat deterministik dari teks di bawah (writer PDF minimal, font Helvetica),
+jadi benchmark tidak butuh file di repo dan hasilnya bisa dibandingkan antar commit.
+Setiap query punya label halaman yang relevan (untuk recall@k) dan frasa jawaban
+yang harus ikut masuk ke konteks prompt.
+"""
+import random
+import textwrap
+
+FACT_PAGES = {
+    "phishing_awareness.pdf": [
+        "Phishing adalah upaya penipuan lewat email, pesan singkat, atau situs palsu untuk mencuri kredensial. "
+        "Tanda umum email phishing: domain pengirim yang mirip tapi berbeda dengan domain resmi, nada mendesak, "
+        "lampiran tidak terduga, dan tautan yang mengarah ke halaman login palsu. "
+        "Laporkan email phishing ke tim keamanan melalui alamat lapor@contoh.id dalam waktu 15 menit setelah diterima. "
+        "Jangan membalas email tersebut dan jangan meneruskannya ke rekan kerja.",
+        "Spear phishing dan Business Email Compromise (BEC) menargetkan karyawan tertentu, biasanya bagian keuangan. "
+        "Penyerang menyamar sebagai direktur atau vendor dan meminta transfer dana yang mendesak. "
+        "Setiap permintaan transfer dana lewat email wajib diverifikasi dengan menelepon nomor telepon yang sudah "
+        "tercatat sebelumnya, bukan nomor yang tertulis di email. Perubahan rekening vendor juga harus diverifikasi.",
+    ],
+    "incident_response.pdf": [
+        "Log4Shell (CVE-2021-44228) adalah celah remote code execution pada pustaka Apache Log4j versi 2.0 sampai 2.14.1. "
+        "Penyerang cukup mengirim string JNDI lookup ke input yang ditulis ke log. "
+        "Perbaikan penuh: upgrade ke Log4j 2.17.1 atau lebih baru, lalu pindai ulang semua aplikasi Java di jaringan.",
+        "Saat ransomware terdeteksi, langkah pertama adalah isolasi host yang terinfeksi dari jaringan "
+        "(cabut kabel atau matikan Wi-Fi) tanpa mematikan komputernya, supaya bukti di memori tidak hilang. "
+        "Pemulihan mengandalkan aturan backup 3-2-1: tiga salinan data, di dua media berbeda, satu salinan offline "
+        "atau di lokasi lain. Jangan membayar tebusan sebelum berkonsultasi dengan tim hukum.",
+        "Log keamanan dari firewall, server, dan endpoint harus dikirim ke SIEM terpusat. "
+        "Log disimpan minimal 90 hari dalam penyimpanan aktif dan satu tahun di arsip, "
+        "supaya investigasi insiden bisa menelusuri serangan yang baru ketahuan berminggu-minggu kemudian.",
+    ],
+    "network_hardening.pdf": [
+        "Remote Desktop Protocol (RDP) adalah pintu masuk favorit ransomware. "
+        "Tutup port 3389 dari internet dan wajibkan akses jarak jauh lewat VPN dengan MFA. "
+        "Aktifkan Network Level Authentication dan batasi akun yang boleh login jarak jauh.",
+        "SMBv1 harus dinonaktifkan di semua server dan workstation. Protokol lama ini dieksploitasi oleh worm WannaCry "
+        "melalui exploit EternalBlue (MS17-010) untuk menyebar otomatis antar komputer di jaringan yang sama. "
+        "Gunakan SMBv3 dengan signing dan enkripsi.",
+        "Kebijakan password: panjang minimal 12 karakter, tidak dipakai ulang di layanan lain, "
+        "dan disimpan di password manager. Passphrase yang panjang lebih kuat daripada password pendek yang rumit. "
+        "Aktifkan MFA untuk email, VPN, dan semua akun admin.",
+    ],
+}
+
+QUERIES = [
+    {"query": "Ke mana email phishing harus dilaporkan?",
+     "source": "phishing_awareness.pdf", "page": 0, "expect": "lapor@contoh.id"},
+    {"query": "Apa tanda-tanda umum email phishing?",
+     "source": "phishing_awareness.pdf", "page": 0, "expect": "domain pengirim"},
+    {"query": "Bagaimana memverifikasi permintaan transfer dana dari direktur lewat email?",
+     "source": "phishing_awareness.pdf", "page": 1, "expect": "nomor telepon"},
+    {"query": "Versi Log4j berapa yang memperbaiki CVE-2021-44228?",
+     "source": "incident_response.pdf", "page": 0, "expect": "2.17.1"},
+    {"query": "Apa langkah pertama saat ransomware terdeteksi?",
+     "source": "incident_response.pdf", "page": 1, "expect": "isolasi host"},
+    {"query": "Apa itu aturan backup 3-2-1?",
+     "source": "incident_response.pdf", "page": 1, "expect": "tiga salinan data"},
+    {"query": "Berapa lama log keamanan harus disimpan?",
+     "source": "incident_response.pdf", "page": 2, "expect": "90 hari"},
+    {"query": "Port RDP berapa yang harus ditutup dari internet?",
+     "source": "network_hardening.pdf", "page": 0, "expect": "3389"},
+    {"query": "Kenapa SMBv1 harus dimatikan?",
+     "source": "network_hardening.pdf", "page": 1, "expect": "EternalBlue"},
+    {"query": "Berapa panjang minimal password?",
+     "source": "network_hardening.pdf", "page": 2, "expect": "12 karakter"},
+]
+
+_FILLER_WORDS = (
+    "keamanan jaringan server pengguna akses data sistem aplikasi kebijakan audit kontrol risiko "
+    "insiden perangkat akun layanan konfigurasi pembaruan pemantauan enkripsi identitas otorisasi "
+    "cadangan pelatihan vendor proses dokumen prosedur evaluasi laporan tim manajemen infrastruktur"
+).split()
+
+
+def filler_page(rng, sentences=24):
+    """Halaman berisi kalimat generik (noise) supaya index punya ukuran yang realistis."""
+    out = []
+    for _ in range(sentences):
+        words = [rng.choice(_FILLER_WORDS) for _ in range(rng.randint(8, 16))]
+        out.append(" ".join(words).capitalize() + ".")
+    return " ".join(out)
+
+
+def corpus_pages(filler_pages=20, seed=13):
+    """Return dict nama_file -> list teks halaman: halaman fakta dulu, lalu halaman filler."""
+    rng = random.Random(seed)
+    return {
+        name: pages + [filler_page(rng) for _ in range(filler_pages)]
+        for name, pages in FACT_PAGES.items()
+    }
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages, width=95, lines_per_page=55):
+    """PDF minimal (satu halaman PDF per teks halaman, teks di-wrap per baris)."""
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page_text in pages:
+        lines = textwrap.wrap(page_text, width)[:lines_per_page]
+        stream = "BT /F1 10 Tf 13 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def corpus_files(filler_pages=20, seed=13):
+    """Korpus siap pakai untuk `pdf_parser.parse_pdfs`: list (nama_file, bytes PDF)."""
+    return [(name, make_pdf(pages)) for name, pages in corpus_pages(filler_pages, seed).items()]
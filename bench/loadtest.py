@@ -0,0 +1,336 @@
+"""
+Load test: N session chat (dan upload) bersamaan di SATU proses, seperti satu proses Streamlit app4.
+
+Streamlit menjalankan script setiap session di thread sendiri dalam satu proses, dan objek
+`st.cache_resource` (vector store, index BM25, cache jawaban, antrian ingest, chain) dipakai
+bersama. Di sini setiap session simulasi = satu thread yang menjalankan alur chat app4 per pesan
+(`rag_flow.ChatTurn`, kode yang sama dengan app4): rewrite pertanyaan lanjutan -> embed query ->
+cache jawaban -> retrieval (hybrid) -> generate (streaming) -> simpan riwayat, dengan jeda "berpikir"
+antar pesan. Selama setiap level, job upload PDF (`rag_flow.process_pdf`) berjalan di `IngestionQueue`
+yang sama (parse -> chunk -> ledger -> embed -> insert).
+
+Pengganti lokal: Gemini = `StubChatModel` (latency dasar + per token prompt + per token jawaban),
+TiDB = vector store in-process, atau TiDB lokal (`tiup playground`) lewat `--tidb-url`.
+Yang TIDAK ikut terukur: websocket & render UI Streamlit, dan rate limit / variasi latency Gemini asli.
+
+Konkurensi dinaikkan bertahap (`--concurrency 1,2,4,...`); per level dilaporkan latency per pesan
+(p50/p95/p99), latency per tahap, throughput (pesan/detik), hit rate cache jawaban, durasi upload,
+dan RSS proses (puncak & per session). Ramp berhenti setelah level pertama yang p95-nya melewati
+`--slo-p95-ms` (kecuali `--keep-going`). Output JSON:
+
+    python -m bench.loadtest --concurrency 1,4,16,32 --duration 20 --output loadtest.json
+    python -m bench.loadtest --llm-latency-ms 1200 --think-ms 5000 --uploads-per-level 2
+    python -m bench.loadtest --embeddings minilm --tidb-url mysql+pymysql://root@127.0.0.1:4000/test
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+from answer_cache import SemanticAnswerCache
+from bench.fixtures import QUERIES, corpus_pages, make_pdf
+from bench.rag_bench import PROMPT_TEMPLATE, _git_commit, build_embeddings, latency_summary
+from bench.stubs import MemoryTenantStore, StubChatModel
+from chat_memory import ChatMemory
+from hybrid_retriever import BM25Index
+from ingest_ledger import IngestLedger
+from ingest_worker import IngestionQueue
+from metrics import MetricsRegistry, QueryMetrics
+from rag_chain import get_retrieval_chain
+from rag_flow import ChatTurn, process_pdf
+
+FOLLOW_UPS = (
+    "Bisa dijelaskan lebih detail?",
+    "Bagaimana cara mencegahnya?",
+    "Apa risikonya kalau itu diabaikan?",
+)
+RSS_SAMPLE_SECONDS = 0.2
+
+
+def current_rss_mb():
+    """RSS proses saat ini (Linux /proc), None kalau tidak tersedia."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """RSS puncak selama satu level (dibaca berkala di thread terpisah)."""
+
+    def __init__(self):
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            rss = current_rss_mb()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class SharedState:
+    """Objek yang di app4 dibuat dengan `st.cache_resource`: satu per proses, dipakai semua session."""
+
+    def __init__(self, args):
+        self.embeddings = build_embeddings(args.embeddings)
+        self.llm = StubChatModel(
+            base_latency_ms=args.llm_latency_ms,
+            ms_per_1k_prompt_tokens=args.llm_ms_per_1k_tokens,
+            ms_per_answer_token=args.llm_ms_per_answer_token,
+        )
+        self.answer_cache = SemanticAnswerCache() if args.answer_cache else None
+        self.bm25_index = BM25Index() if args.hybrid else None
+        self.ingest_queue = IngestionQueue()
+        self.metrics = MetricsRegistry(log_path="")
+        if args.tidb_url:
+            from tenancy import TENANT_DEFAULT, TENANT_MODE, TenantStore
+            from tidb_store import BulkWriter
+
+            # Tabel & filter tenant sama seperti app4 (tenant default)
+            writer = BulkWriter(args.tidb_url, args.tidb_table, tenant_column=TENANT_MODE == "column")
+            if TENANT_MODE == "column":
+                writer.ensure_tenant_column(default_tenant=TENANT_DEFAULT)
+            self.store = TenantStore(writer, self.embeddings, TENANT_DEFAULT)
+        else:
+            self.store = MemoryTenantStore(self.embeddings)
+        # Ledger ingest per run (sqlite in-memory), tidak bercampur dengan ledger app
+        self.ledger = IngestLedger(":memory:", namespace=self.store.namespace)
+
+
+def ingest_pdf(job, state, file_name, file_bytes):
+    """Job upload app4 (`rag_flow.process_pdf`) di store, ledger & index bersama."""
+    # Setiap upload berisi PDF baru, jadi cache parsing tidak dipakai (tidak menumpuk entry di RAG_CACHE_DIR)
+    return process_pdf(
+        job, file_name, file_bytes, state.store, state.embeddings, state.ledger, state.answer_cache,
+        state.bm25_index, use_cache=False, metrics=state.metrics,
+    )
+
+
+def ask(state, memory, question):
+    """Satu pesan chat lewat `rag_flow.ChatTurn`, seperti app4. Return dict hasil pengukuran."""
+    tracker = QueryMetrics(state.metrics)
+    memory.append(("user", question))
+    turn = ChatTurn(memory, question, state.embeddings, state.llm, state.answer_cache, tracker=tracker)
+    try:
+        cached = turn.prepare()
+        if cached is not None:
+            answer = cached["answer"]
+        else:
+            retrieval_chain = get_retrieval_chain(
+                state.store.vector_store, PROMPT_TEMPLATE, search_kwargs={"k": 5},
+                bm25_index=state.bm25_index, llm=state.llm,
+            )
+            answer = "".join(turn.stream(retrieval_chain))
+        turn.finish(answer)
+        error = None
+    except Exception as e:
+        tracker.finish(error=e)
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "seconds": time.perf_counter() - tracker.started,
+        "stages": tracker.stages(),
+        "cache_hit": turn.cached is not None,
+        "error": error,
+    }
+
+
+def run_session(state, args, rng, deadline, results):
+    memory = ChatMemory()  # st.session_state.chat_history
+    # Session tidak mulai serentak: jeda awal acak sampai satu kali waktu berpikir
+    time.sleep(rng.uniform(0, args.think_ms / 1000))
+    while time.perf_counter() < deadline:
+        if len(memory) and rng.random() < args.follow_up_ratio:
+            question = rng.choice(FOLLOW_UPS)
+        else:
+            question = rng.choice(QUERIES)["query"]
+        results.append(ask(state, memory, question))
+        time.sleep(args.think_ms / 1000 * rng.uniform(0.5, 1.5))
+
+
+def upload_file(level, index, pages):
+    """PDF baru per upload (isi filler beda per seed), supaya setiap upload benar-benar menambah chunk."""
+    name = sorted(corpus_pages(0))[index % 3]
+    texts = corpus_pages(filler_pages=pages, seed=1000 * (level + 1) + index)[name]
+    return f"upload_l{level}_{index}_{name}", make_pdf(texts)
+
+
+def summarize(results, elapsed):
+    ok = [result for result in results if result["error"] is None]
+    stage_samples = {}
+    for result in ok:
+        for stage, seconds in result["stages"].items():
+            stage_samples.setdefault(stage, []).append(seconds)
+    errors = [result["error"] for result in results if result["error"] is not None]
+    return {
+        "messages": len(results),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "throughput_messages_per_second": round(len(ok) / elapsed, 3) if elapsed > 0 else None,
+        "latency": latency_summary([result["seconds"] for result in ok]),
+        "stages": {stage: latency_summary(samples) for stage, samples in sorted(stage_samples.items())},
+        "answer_cache_hit_rate": round(sum(result["cache_hit"] for result in ok) / len(ok), 4) if ok else None,
+    }
+
+
+def run_level(state, args, level, concurrency):
+    results = []
+    baseline_rss = current_rss_mb()
+    with RssSampler() as sampler:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        jobs = [
+            state.ingest_queue.submit(name, ingest_pdf, state, name, data)
+            for name, data in (upload_file(level, i, args.upload_pages) for i in range(args.uploads_per_level))
+        ]
+        threads = [
+            threading.Thread(
+                target=run_session, args=(state, args, random.Random(args.seed + 7919 * level + i), deadline, results),
+                name=f"session-{i}", daemon=True,
+            )
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # Upload yang belum selesai ditunggu (di luar hitungan throughput chat) supaya level berikutnya bersih
+        while any(not job.finished for job in jobs):
+            time.sleep(0.1)
+
+    summary = summarize(results, elapsed)
+    peak = sampler.peak
+    summary = {
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 2),
+        **summary,
+        "uploads": {
+            "jobs": len(jobs),
+            "failed": sum(job.status == "failed" for job in jobs),
+            "chunks": sum((job.result or {}).get("new_chunks", 0) for job in jobs),
+            "latency": latency_summary([job.finished_at - job.created_at for job in jobs]),
+        },
+        "memory": {
+            "rss_mb_start": baseline_rss,
+            "rss_mb_peak": peak,
+            "rss_mb_per_session": (
+                round((peak - baseline_rss) / concurrency, 2) if peak is not None and baseline_rss is not None else None
+            ),
+        },
+    }
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test session chat bersamaan dalam satu proses (output JSON).")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32",
+                        help="Jumlah session bersamaan per level, dipisah koma (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Durasi per level (detik)")
+    parser.add_argument("--think-ms", type=float, default=1000.0,
+                        help="Rata-rata jeda antar pesan per session (acak 0.5x - 1.5x)")
+    parser.add_argument("--follow-up-ratio", type=float, default=0.3,
+                        help="Peluang pesan berikutnya berupa pertanyaan lanjutan")
+    parser.add_argument("--llm-latency-ms", type=float, default=700.0, help="Latency dasar LLM stub per panggilan")
+    parser.add_argument("--llm-ms-per-1k-tokens", type=float, default=150.0,
+                        help="Tambahan latency LLM stub per 1000 token prompt")
+    parser.add_argument("--llm-ms-per-answer-token", type=float, default=8.0,
+                        help="Latency LLM stub per token jawaban (streaming)")
+    parser.add_argument("--embeddings", choices=("hashing", "minilm"), default="hashing",
+                        help="hashing = tanpa model, minilm = all-MiniLM-L6-v2 di CPU proses yang sama")
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false", help="Tanpa index BM25")
+    parser.add_argument("--no-answer-cache", dest="answer_cache", action="store_false",
+                        help="Matikan cache jawaban semantik (setiap pesan sampai ke LLM)")
+    parser.add_argument("--filler-pages", type=int, default=20, help="Halaman noise per PDF korpus awal")
+    parser.add_argument("--uploads-per-level", type=int, default=1, help="Job upload PDF yang jalan selama level")
+    parser.add_argument("--upload-pages", type=int, default=100, help="Jumlah halaman per PDF upload")
+    parser.add_argument("--slo-p95-ms", type=float, default=8000.0, help="Batas p95 latency per pesan")
+    parser.add_argument("--keep-going", action="store_true", help="Lanjutkan ramp walau SLO sudah terlewati")
+    parser.add_argument("--tidb-url", help="SQLAlchemy URL TiDB lokal, mis. mysql+pymysql://root@127.0.0.1:4000/test")
+    parser.add_argument("--tidb-table", default="loadtest_documents")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics.REGISTRY.log_path = ""  # job ingest simulasi tidak ditulis ke METRICS_LOG app
+    state = SharedState(args)
+
+    # Korpus awal + satu pesan pemanasan (chain & index dibuat), di luar pengukuran
+    for name, pages in corpus_pages(args.filler_pages, args.seed).items():
+        job = state.ingest_queue.submit(name, ingest_pdf, state, name, make_pdf(pages))
+        while not job.finished:
+            time.sleep(0.05)
+        if job.error:
+            raise RuntimeError(f"Ingest korpus awal gagal: {job.error}")
+    ask(state, ChatMemory(), QUERIES[0]["query"])
+
+    levels = []
+    for level, concurrency in enumerate(int(value) for value in args.concurrency.split(",")):
+        levels.append(run_level(state, args, level, concurrency))
+        result = levels[-1]
+        print(
+            f"{concurrency} session: p95={result['latency'].get('p95_ms')} ms, "
+            f"{result['throughput_messages_per_second']} pesan/detik, error={result['errors']}, "
+            f"RSS puncak={result['memory']['rss_mb_peak']} MB",
+            file=sys.stderr,
+        )
+        if result["latency"].get("p95_ms", 0) > args.slo_p95_ms and not args.keep_going:
+            break
+
+    within_slo = [
+        result["concurrency"] for result in levels
+        if result["errors"] == 0 and result["latency"].get("p95_ms", 0) <= args.slo_p95_ms
+    ]
+    peak = max(levels, key=lambda result: result["throughput_messages_per_second"] or 0)
+    output = json.dumps({
+        "benchmark": "loadtest",
+        "schema_version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        # URL TiDB tidak ditulis (bisa berisi password)
+        "config": {
+            **{name: value for name, value in vars(args).items() if name not in ("output", "tidb_url")},
+            "store": "tidb" if args.tidb_url else "memory",
+        },
+        "levels": levels,
+        "saturation": {
+            "slo_p95_ms": args.slo_p95_ms,
+            "max_concurrency_within_slo": max(within_slo) if within_slo else None,
+            "peak_throughput_concurrency": peak["concurrency"],
+            "peak_throughput_messages_per_second": peak["throughput_messages_per_second"],
+        },
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Laporan recall vs kecepatan untuk index ter-kuantisasi (`quantized_index`).
+
+Untuk setiap mode (float brute-force sebagai baseline, int8, binary) dan setiap
+rescore factor, diukur: recall@k terhadap hasil exact float, latency per query,
+dan byte RAM per vector. Output JSON, contoh:
+
+    python -m bench.quantization_bench --n 200000 --output quant_results.json
+    python -m bench.quantization_bench --vectors embeddings.npy --k 5
+
+Default-nya vector sintetis ber-cluster (384 dimensi, seperti all-MiniLM-L6-v2);
+`--vectors` memakai matriks embedding asli (.npy), query = vector korpus + noise.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bench.rag_bench import latency_summary
+from quantized_index import MODES, QuantizedIndex, normalize_rows
+
+
+def synthetic_vectors(n, dimension, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+    return normalize_rows(vectors)
+
+
+def make_queries(vectors, n_queries, seed, noise=0.3):
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.integers(0, len(vectors), size=n_queries)]
+    return normalize_rows(picks + noise * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(picks.shape[1]))
+
+
+def exact_top_k(vectors, queries, k):
+    return [set(np.argsort(-(vectors @ query))[:k].tolist()) for query in queries]
+
+
+def run_float(vectors, queries, k):
+    times = []
+    for query in queries:
+        started = time.perf_counter()
+        scores = vectors @ query
+        np.argpartition(-scores, k - 1)[:k]
+        times.append(time.perf_counter() - started)
+    return {
+        "mode": "float32",
+        "rescore_factor": None,
+        "recall_at_k": 1.0,
+        "latency": latency_summary(times),
+        "bytes_per_vector": vectors.shape[1] * 4,
+    }
+
+
+def run_quantized(index, queries, truth, k, rescore_factor):
+    times, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = index.search(query, k=k, rescore_factor=rescore_factor)
+        times.append(time.perf_counter() - started)
+        recalls.append(len({int(row_id) for row_id, _ in hits} & expected) / k)
+    return {
+        "mode": index.mode,
+        "rescore_factor": rescore_factor,
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "latency": latency_summary(times),
+        "bytes_per_vector": round(index.memory_bytes() / len(index), 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recall vs kecepatan index ter-kuantisasi (output JSON).")
+    parser.add_argument("--n", type=int, default=100000, help="Jumlah vector sintetis")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--vectors", help="File .npy berisi matriks embedding asli (menggantikan data sintetis)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factors", default="1,2,4,8,16")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.vectors:
+        vectors = normalize_rows(np.load(args.vectors))
+    else:
+        vectors = synthetic_vectors(args.n, args.dimension, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+    truth = exact_top_k(vectors, queries, args.k)
+    rescore_factors = [int(value) for value in args.rescore_factors.split(",")]
+
+    results = [run_float(vectors, queries, args.k)]
+    with tempfile.TemporaryDirectory(prefix="quant_bench_") as directory:
+        for mode in args.modes.split(","):
+            started = time.perf_counter()
+            index = QuantizedIndex(vectors.shape[1], mode=mode, float_dir=directory)
+            index.add(list(range(len(vectors))), vectors)
+            build_seconds = time.perf_counter() - started
+            for factor in rescore_factors:
+                result = run_quantized(index, queries, truth, args.k, factor)
+                result["build_seconds"] = round(build_seconds, 3)
+                results.append(result)
+                print(f"{mode} x{factor}: recall@{args.k}={result['recall_at_k']} "
+                      f"p50={result['latency']['p50_ms']} ms", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "quantization_bench",
+        "schema_version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "cpu_count": os.cpu_count()},
+        "data": {
+            "source": args.vectors or "synthetic",
+            "vectors": int(vectors.shape[0]),
+            "dimension": int(vectors.shape[1]),
+            "queries": args.queries,
+            "k": args.k,
+        },
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
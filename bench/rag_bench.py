@@ -0,0 +1,336 @@
+"""
+Benchmark pipeline RAG end-to-end: load -> split -> embed -> index -> retrieve -> generate.
+
+Korpus PDF tetap (lihat `bench.fixtures`) diproses dengan beberapa konfigurasi chunking
+(default: karakter `chunk_size=10` dan 1000/200 seperti app lama, vs `chunker.StructuredChunker`
+160/32 token seperti app sekarang), lalu daftar query berlabel diputar ulang. Gemini diganti `StubChatModel`, TiDB diganti vector store in-process
+(atau Chroma lokal), jadi benchmark jalan offline dan hasilnya bisa dibandingkan antar commit.
+
+Yang diukur per konfigurasi: latency per tahap, throughput ingest (chunk/detik) dan query
+(query/detik), peak RSS proses, recall@k (halaman relevan ikut ter-retrieve) dan context hit
+rate (frasa jawaban ada di konteks prompt). Output JSON:
+
+    python -m bench.rag_bench --output bench_results.json
+    python -m bench.rag_bench --chunking 500:100,1000:200 --k 3 --hybrid
+    python -m bench.rag_bench --chunking structured:160:32,structured:256:0
+    python -m bench.rag_bench --rerank --llm-ms-per-1k-tokens 400  # efek rerank ke latency generate
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from batch_embedder import estimate_tokens
+from bench.fixtures import QUERIES, corpus_files
+from bench.stubs import HashingEmbeddings, MemoryVectorStore, StubChatModel
+from chunker import build_text_splitter
+from context_packer import CONTEXT_TOKEN_BUDGET
+from hybrid_retriever import build_bm25_index
+from metrics import MetricsRegistry, QueryMetrics
+from ingest_ledger import chunk_row_id, sha256_text
+from pdf_parser import parse_pdfs
+from rag_chain import build_retriever, get_prompt
+from reranker import get_scorer
+
+PROMPT_TEMPLATE = """
+Jawab pertanyaan berdasarkan konteks berikut:
+<context>
+{context}
+</context>
+Pertanyaan: {input}
+"""
+
+DEFAULT_CHUNKING = "10:2,1000:200,structured:160:32"
+
+
+def peak_rss_mb():
+    """Peak RSS proses sejauh ini (monoton naik selama proses hidup), None kalau tidak tersedia."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS byte
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def latency_summary(samples):
+    """Ringkasan list durasi (detik) dalam milidetik."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "total_seconds": round(sum(ordered), 4),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def _normalize(text):
+    return " ".join(text.split()).lower()
+
+
+def build_embeddings(kind):
+    if kind == "hashing":
+        return HashingEmbeddings()
+    from local_embedder import LocalEmbedder
+    from model_registry import EMBEDDING_BACKEND, LOCAL_EMBEDDING_MODEL
+
+    return LocalEmbedder(LOCAL_EMBEDDING_MODEL, backend=EMBEDDING_BACKEND)
+
+
+def build_store(kind, name, embeddings, directory):
+    """Return (vector_store, fungsi add(ids, texts, vectors, metadatas))."""
+    if kind == "chroma":
+        from chroma_store import ChromaCorpus
+
+        corpus = ChromaCorpus(name, embeddings, persist_directory=directory)
+        return corpus.vector_store, corpus.add
+    store = MemoryVectorStore(embeddings)
+    return store, store.add_vectors
+
+
+def parse_chunking(spec):
+    """`size:overlap` (karakter, RecursiveCharacterTextSplitter) atau `structured:token:overlap` -> (kind, size, overlap)."""
+    parts = spec.split(":")
+    kind = parts.pop(0) if len(parts) == 3 else "recursive"
+    chunk_size, chunk_overlap = (int(value) for value in parts)
+    return kind, chunk_size, chunk_overlap
+
+
+def run_config(files, queries, chunking, args, embeddings, llm, directory):
+    kind, chunk_size, chunk_overlap = chunking
+    stages = {}
+
+    # Load: parse PDF dari bytes (process pool untuk korpus besar), selalu tanpa cache parsing
+    # supaya angkanya tidak bergantung urutan konfigurasi atau isi RAG_CACHE_DIR
+    started = time.perf_counter()
+    docs = parse_pdfs(files, use_cache=False)
+    stages["load"] = {"seconds": round(time.perf_counter() - started, 4), "pages": len(docs)}
+    if args.parsed_cache:
+        # Baca dari cache parsing (diisi sekali di `main`, di direktori sementara run ini)
+        started = time.perf_counter()
+        parse_pdfs(files, cache_dir=os.path.join(directory, "parsed"))
+        stages["load"]["cached_seconds"] = round(time.perf_counter() - started, 4)
+
+    # Split: sama seperti app, termasuk start_index untuk penggabungan konteks
+    started = time.perf_counter()
+    if kind == "recursive":
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+        )
+    else:
+        splitter = build_text_splitter(chunk_size, chunk_overlap, kind=kind)
+    splits = splitter.split_documents(docs)
+    unique = {}
+    for doc in splits:
+        unique.setdefault(chunk_row_id(doc.metadata["source"], sha256_text(doc.page_content)), doc)
+    ids = list(unique)
+    texts = [doc.page_content for doc in unique.values()]
+    metadatas = [doc.metadata for doc in unique.values()]
+    stages["split"] = {
+        "seconds": round(time.perf_counter() - started, 4),
+        "chunks": len(splits),
+        "unique_chunks": len(ids),
+    }
+
+    # Embed
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), args.embed_batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + args.embed_batch_size]))
+    seconds = time.perf_counter() - started
+    stages["embed"] = {"seconds": round(seconds, 4), "chunks_per_second": _rate(len(texts), seconds)}
+
+    # Index: vector store (+ BM25 kalau hybrid)
+    started = time.perf_counter()
+    vector_store, add = build_store(args.store, f"bench_{kind}_{chunk_size}_{chunk_overlap}", embeddings, directory)
+    add(ids, texts, vectors, metadatas)
+    bm25_index = build_bm25_index([(ids, texts, metadatas)]) if args.hybrid else None
+    seconds = time.perf_counter() - started
+    stages["index"] = {"seconds": round(seconds, 4), "chunks_per_second": _rate(len(ids), seconds)}
+
+    # Retrieve + generate per query
+    retriever = build_retriever(
+        vector_store, search_kwargs={"k": args.k}, bm25_index=bm25_index, context_tokens=args.context_tokens,
+        rerank=args.rerank,
+    )
+    if args.rerank:
+        get_scorer()  # tunggu model selesai di-load, supaya tidak ikut terhitung di latency query pertama
+    document_chain = create_stuff_documents_chain(llm, get_prompt(PROMPT_TEMPLATE))
+    retrieve_times, rerank_times, generate_times = [], [], []
+    page_hits = context_hits = 0
+    context_tokens, context_documents = [], []
+    for _ in range(args.repeat):
+        for query in queries:
+            tracker = QueryMetrics(MetricsRegistry(log_path=""))
+            started = time.perf_counter()
+            context = retriever.invoke(query["query"], config={"callbacks": [tracker]})
+            retrieved = time.perf_counter()
+            if "rerank" in tracker.stages():
+                rerank_times.append(tracker.stages()["rerank"])
+            document_chain.invoke({"input": query["query"], "context": context})
+            retrieve_times.append(retrieved - started)
+            generate_times.append(time.perf_counter() - retrieved)
+
+            page_hits += any(
+                doc.metadata.get("source") == query["source"] and doc.metadata.get("page") == query["page"]
+                for doc in context
+            )
+            context_text = "\n\n".join(doc.page_content for doc in context)
+            context_hits += _normalize(query["expect"]) in _normalize(context_text)
+            context_tokens.append(estimate_tokens(context_text))
+            context_documents.append(len(context))
+    stages["retrieve"] = latency_summary(retrieve_times)
+    if rerank_times:
+        stages["rerank"] = latency_summary(rerank_times)  # bagian dari retrieve
+    stages["generate"] = latency_summary(generate_times)
+
+    n_queries = len(retrieve_times)
+    ingest_seconds = sum(stages[name]["seconds"] for name in ("load", "split", "embed", "index"))
+    return {
+        "name": f"chunk{chunk_size}_overlap{chunk_overlap}" + ("" if kind == "recursive" else f"_{kind}"),
+        "config": {
+            "chunker": kind,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "k": args.k,
+            "hybrid": args.hybrid,
+            "rerank": args.rerank,
+            "context_tokens": args.context_tokens,
+            "embeddings": args.embeddings,
+            "store": args.store,
+        },
+        "stages": stages,
+        "throughput": {
+            "ingest_chunks_per_second": _rate(len(ids), ingest_seconds),
+            "queries_per_second": _rate(n_queries, sum(retrieve_times) + sum(generate_times)),
+        },
+        "quality": {
+            "recall_at_k": round(page_hits / n_queries, 4) if n_queries else None,
+            "context_hit_rate": round(context_hits / n_queries, 4) if n_queries else None,
+            "mean_context_tokens": round(sum(context_tokens) / n_queries, 1) if n_queries else None,
+            "mean_context_documents": round(sum(context_documents) / n_queries, 2) if n_queries else None,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def load_corpus(args):
+    if not args.pdf_dir:
+        return corpus_files(filler_pages=args.filler_pages), QUERIES
+    files = []
+    for name in sorted(os.listdir(args.pdf_dir)):
+        if name.lower().endswith(".pdf"):
+            with open(os.path.join(args.pdf_dir, name), "rb") as f:
+                files.append((name, f.read()))
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+    return files, queries
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline pipeline RAG (output JSON).")
+    parser.add_argument("--chunking", default=DEFAULT_CHUNKING,
+                        help="Daftar chunk_size:chunk_overlap (karakter) atau structured:token:overlap "
+                             "dipisah koma (default: %(default)s)")
+    parser.add_argument("--k", type=int, default=5, help="Jumlah chunk yang di-retrieve")
+    parser.add_argument("--parsed-cache", action="store_true",
+                        help="Ukur juga waktu load dari cache parsing (load.cached_seconds, cache di direktori sementara)")
+    parser.add_argument("--hybrid", action="store_true", help="Pakai retriever hybrid BM25 + vector")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Rerank kandidat dengan cross-encoder lokal (RERANK_MODEL, butuh download model)")
+    parser.add_argument("--context-tokens", type=int, default=CONTEXT_TOKEN_BUDGET,
+                        help="Budget token konteks (0 = tempel chunk apa adanya)")
+    parser.add_argument("--embeddings", choices=("hashing", "minilm"), default="hashing",
+                        help="hashing = deterministik tanpa download, minilm = all-MiniLM-L6-v2")
+    parser.add_argument("--store", choices=("memory", "chroma"), default="memory")
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3, help="Berapa kali daftar query diputar")
+    parser.add_argument("--filler-pages", type=int, default=20,
+                        help="Halaman noise per PDF di korpus bawaan")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Latency dasar simulasi LLM per panggilan")
+    parser.add_argument("--llm-ms-per-1k-tokens", type=float, default=0.0,
+                        help="Tambahan latency simulasi LLM per 1000 token prompt")
+    parser.add_argument("--pdf-dir", help="Folder PDF sendiri (wajib bersama --queries)")
+    parser.add_argument("--queries", help="File JSON list {query, source, page, expect}")
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    if bool(args.pdf_dir) != bool(args.queries):
+        parser.error("--pdf-dir dan --queries harus dipakai bersamaan")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files, queries = load_corpus(args)
+    embeddings = build_embeddings(args.embeddings)
+    llm = StubChatModel(base_latency_ms=args.llm_latency_ms, ms_per_1k_prompt_tokens=args.llm_ms_per_1k_tokens)
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as directory:
+        if args.parsed_cache:
+            parse_pdfs(files, cache_dir=os.path.join(directory, "parsed"))  # isi cache, di luar pengukuran
+        for spec in args.chunking.split(","):
+            runs.append(run_config(files, queries, parse_chunking(spec), args, embeddings, llm, directory))
+            print(f"{runs[-1]['name']}: recall@{args.k}={runs[-1]['quality']['recall_at_k']}", file=sys.stderr)
+
+    result = {
+        "benchmark": "rag_bench",
+        "schema_version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "corpus": {
+            "files": len(files),
+            "bytes": sum(len(data) for _, data in files),
+            "queries": len(queries),
+        },
+        "runs": runs,
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Pengganti lokal & deterministik untuk komponen yang butuh jaringan:
+
+- `HashingEmbeddings`: embedding bag-of-words ter-hash (tanpa download model),
+- `StubChatModel`: pengganti `ChatGoogleGenerativeAI`, jawaban diambil dari konteks prompt,
+  latency bisa disimulasikan sebanding jumlah token prompt (dan per token jawaban saat streaming),
+- `MemoryVectorStore`: vector store in-process (numpy) pengganti TiDB, aman dibaca sambil ditulis,
+- `MemoryTenantStore`: pengganti `tenancy.TenantStore` di atas `MemoryVectorStore` (untuk `rag_flow`).
+"""
+import re
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import VectorStore
+
+from batch_embedder import estimate_tokens
+from hybrid_retriever import tokenize
+from ingest_ledger import chunk_row_id
+
+
+class HashingEmbeddings(Embeddings):
+    """Embedding deterministik: setiap token di-hash (crc32) ke salah satu `dimension` dimensi."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in tokenize(text):
+            code = zlib.crc32(token.encode("utf-8"))
+            vector[code % self.dimension] += 1.0 if code & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_FOLLOW_UP_RE = re.compile(r"Pertanyaan lanjutan:\s*(.+)")
+_WORD_RE = re.compile(r"\S+\s*")
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Pengganti Gemini untuk benchmark: jawabannya kalimat pertama dari konteks prompt.
+
+    Latency simulasi = `base_latency_ms` + `ms_per_1k_prompt_tokens` x (token prompt / 1000),
+    supaya efek ukuran konteks ke latency generate tetap kelihatan, lalu `ms_per_answer_token`
+    per token jawaban (saat streaming, token dikirim satu per satu). Default 0 (hanya overhead chain).
+    Prompt rewrite pertanyaan lanjutan (`chat_memory.REWRITE_TEMPLATE`) dijawab dengan pertanyaannya sendiri.
+    """
+
+    base_latency_ms: float = 0.0
+    ms_per_1k_prompt_tokens: float = 0.0
+    ms_per_answer_token: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def _respond(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        prompt_tokens = estimate_tokens(prompt)
+        delay = self.base_latency_ms + self.ms_per_1k_prompt_tokens * prompt_tokens / 1000
+        if delay:
+            time.sleep(delay / 1000)
+
+        if "<context>" not in prompt and _FOLLOW_UP_RE.search(prompt):
+            return _FOLLOW_UP_RE.search(prompt).group(1).strip(), prompt_tokens
+        context = prompt.split("<context>", 1)[-1].split("</context>", 1)[0].strip()
+        answer = _SENTENCE_RE.split(context, 1)[0] if context else "Maaf, informasi tersebut tidak ditemukan dalam dokumen."
+        return answer, prompt_tokens
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        answer, prompt_tokens = self._respond(messages)
+        if self.ms_per_answer_token:
+            time.sleep(self.ms_per_answer_token * estimate_tokens(answer) / 1000)
+        message = AIMessage(content=answer, response_metadata={"prompt_tokens": prompt_tokens})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        answer, _ = self._respond(messages)
+        for word in _WORD_RE.findall(answer):
+            if self.ms_per_answer_token:
+                time.sleep(self.ms_per_answer_token * estimate_tokens(word) / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+
+class MemoryVectorStore(VectorStore):
+    """Vector store in-process: matriks numpy ter-normalisasi, similarity = cosine (dot product)."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def add_vectors(self, ids, texts, vectors, metadatas):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self._lock:
+            # List diisi dulu, matriks baru dipasang terakhir: search yang jalan bersamaan
+            # hanya melihat baris yang teks & metadata-nya sudah ada
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(dict(metadata or {}) for metadata in metadatas)
+            self._matrix = matrix if self._matrix is None else np.vstack([self._matrix, matrix])
+
+    def delete(self, ids=None, **kwargs):
+        drop = set(ids or ())
+        with self._lock:
+            keep = [i for i, row_id in enumerate(self._ids) if row_id not in drop]
+            self._ids = [self._ids[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._matrix = self._matrix[keep] if self._matrix is not None and keep else None
+        return True
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        self.add_vectors(ids, texts, self.embedding.embed_documents(texts), metadatas or [{}] * len(texts))
+        return ids
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        matrix = self._matrix
+        if matrix is None:
+            return []
+        scores = matrix @ np.asarray(embedding, dtype=np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Document(page_content=self._texts[i], metadata=self._metadatas[i]) for i in top]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k=k)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
+
+
+class MemoryTenantStore:
+    """Satu tenant tanpa database: `vector_store` = `MemoryVectorStore`, store ini sekaligus `writer`-nya."""
+
+    def __init__(self, embedding, tenant="default", namespace="memory"):
+        self.tenant = tenant
+        self.namespace = namespace
+        self.vector_store = MemoryVectorStore(embedding)
+        self.writer = self
+
+    def row_id(self, source_file, chunk_hash):
+        return chunk_row_id(source_file, chunk_hash)
+
+    def tag(self, metadata):
+        metadata["tenant"] = self.tenant
+        return metadata
+
+    def write(self, ids, texts, embeddings, metadatas):
+        """Sama seperti `BulkWriter.write`, tanpa timing batch insert."""
+        if ids:
+            self.vector_store.add_vectors(ids, texts, embeddings, metadatas)
+        return []
+
+    def delete(self, ids):
+        self.vector_store.delete(ids)
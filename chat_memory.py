@@ -0,0 +1,159 @@
+"""
+Riwayat chat per session yang ukurannya dibatasi + penulisan ulang pertanyaan lanjutan.
+
+- `ChatMemory` menyimpan paling banyak `HISTORY_MAX_MESSAGES` pesan terakhir apa adanya
+  (yang di-render ulang setiap rerun Streamlit). Pesan yang lebih lama diringkas LLM
+  menjadi satu ringkasan berjalan (maksimal `HISTORY_SUMMARY_TOKENS` token), jadi memori
+  per session dan waktu rerun tidak naik terus di session yang panjang.
+- `rewrite_query` mengubah pertanyaan lanjutan ("cara mencegahnya gimana?") menjadi
+  pertanyaan mandiri dari ringkasan + `HISTORY_TURNS` giliran terakhir, sebelum retrieval.
+  Pertanyaan pertama di session tidak memanggil LLM tambahan. Matikan dengan
+  `HISTORY_AWARE_RETRIEVAL=false`.
+"""
+import os
+from collections import deque
+
+from langchain_core.output_parsers import StrOutputParser
+
+from rag_chain import get_prompt
+
+HISTORY_AWARE_RETRIEVAL = os.getenv("HISTORY_AWARE_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "3"))  # giliran (tanya + jawab) terakhir untuk menulis ulang pertanyaan
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+SUMMARY_BATCH_MESSAGES = 6  # pesan lama diringkas per 6 sekaligus, bukan satu LLM call per pesan
+MESSAGE_PREVIEW_CHARS = 600  # potongan jawaban panjang yang ikut ke prompt rewrite
+
+REWRITE_TEMPLATE = """
+Diberikan riwayat percakapan dan pertanyaan lanjutan, tulis ulang pertanyaan lanjutan itu
+menjadi satu pertanyaan mandiri yang bisa dipahami tanpa riwayat (ganti kata ganti seperti
+"itu"/"nya"/"tersebut" dengan hal yang dimaksud). Pakai bahasa yang sama dengan pertanyaannya.
+Kalau pertanyaannya sudah mandiri, kembalikan apa adanya. Tulis pertanyaannya saja.
+
+<riwayat>
+{chat_history}
+</riwayat>
+
+Pertanyaan lanjutan: {input}
+Pertanyaan mandiri:"""
+
+SUMMARY_TEMPLATE = """
+Perbarui ringkasan percakapan berikut dengan pesan-pesan baru. Pertahankan topik, istilah
+penting, dan fakta yang sudah dijawab; buang basa-basi. Maksimal {max_words} kata.
+
+<ringkasan>
+{summary}
+</ringkasan>
+
+<pesan_baru>
+{messages}
+</pesan_baru>
+
+Ringkasan baru:"""
+
+
+def _format_messages(messages, preview_chars=MESSAGE_PREVIEW_CHARS):
+    lines = []
+    for role, message in messages:
+        text = " ".join(str(message).split())
+        if len(text) > preview_chars:
+            text = text[:preview_chars] + "..."
+        lines.append(f"{'User' if role == 'user' else 'Asisten'}: {text}")
+    return "\n".join(lines)
+
+
+def _truncate_tokens(text, max_tokens):
+    # Kebalikan `batch_embedder.estimate_tokens` (~4 karakter per token), dipotong dari depan: yang terbaru lebih penting
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else "..." + text[-max_chars:]
+
+
+class ChatMemory:
+    """
+    Pengganti list `chat_history`: iterasi & `append((role, pesan))` sama seperti list,
+    tapi hanya `max_messages` pesan terakhir yang disimpan utuh.
+
+    Pesan yang tergeser masuk antrian ringkasan; `compact(llm)` (dipanggil setelah jawaban
+    tampil) meringkasnya ke `summary`. Tanpa LLM atau kalau LLM gagal, ringkasan cukup
+    dipotong ke batas token, jadi memori tetap terbatas.
+    """
+
+    def __init__(self, max_messages=HISTORY_MAX_MESSAGES, summary_tokens=HISTORY_SUMMARY_TOKENS):
+        self.max_messages = max_messages
+        self.summary_tokens = summary_tokens
+        self.messages = deque()
+        self.summary = ""
+        self.summarized_count = 0
+        self._pending = []
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, item):
+        role, message = item
+        self.messages.append((role, message))
+        while len(self.messages) > self.max_messages:
+            self._pending.append(self.messages.popleft())
+
+    def history_text(self, turns=HISTORY_TURNS):
+        """Ringkasan + `turns` giliran terakhir, tanpa pertanyaan user terakhir yang belum dijawab."""
+        messages = list(self.messages)
+        if messages and messages[-1][0] == "user":
+            messages = messages[:-1]
+        parts = []
+        if self.summary:
+            parts.append(f"Ringkasan sebelumnya: {self.summary}")
+        if turns and messages:
+            parts.append(_format_messages(messages[-turns * 2:]))
+        return "\n".join(parts)
+
+    def compact(self, llm=None, force=False):
+        """Ringkas pesan yang sudah tergeser (kalau sudah cukup banyak, atau `force`)."""
+        if not self._pending or (len(self._pending) < SUMMARY_BATCH_MESSAGES and not force):
+            return
+        pending, self._pending = self._pending, []
+        summary = None
+        if llm is not None:
+            chain = get_prompt(SUMMARY_TEMPLATE) | llm | StrOutputParser()
+            try:
+                summary = chain.invoke(
+                    {
+                        "summary": self.summary or "(belum ada)",
+                        "messages": _format_messages(pending),
+                        "max_words": int(self.summary_tokens * 0.75),
+                    },
+                    config={"run_name": "summarize_history", "tags": ["stage:summarize"]},
+                ).strip()
+            except Exception:
+                summary = None  # ringkasan gagal tidak boleh mengganggu chat, pakai potongan teks saja
+        if not summary:
+            summary = " ".join(part for part in (self.summary, _format_messages(pending)) if part)
+        self.summary = _truncate_tokens(summary, self.summary_tokens)
+        self.summarized_count += len(pending)
+
+
+def rewrite_query(llm, memory, question, turns=HISTORY_TURNS, config=None):
+    """
+    Pertanyaan mandiri untuk retrieval. Tanpa riwayat (pertanyaan pertama) atau kalau mode
+    history-aware dimatikan, `question` dikembalikan apa adanya tanpa LLM call.
+    `config` (mis. callbacks `metrics.QueryMetrics`) diteruskan; LLM call-nya diberi tag
+    `stage:rewrite` supaya tercatat sebagai tahap tersendiri. Kalau LLM call gagal (kuota,
+    timeout), `question` dikembalikan apa adanya.
+    """
+    if not HISTORY_AWARE_RETRIEVAL:
+        return question
+    history = memory.history_text(turns)
+    if not history:
+        return question
+    config = dict(config or {})
+    config["tags"] = list(config.get("tags", [])) + ["stage:rewrite"]
+    config.setdefault("run_name", "rewrite_query")
+    chain = get_prompt(REWRITE_TEMPLATE) | llm | StrOutputParser()
+    try:
+        standalone = chain.invoke({"chat_history": history, "input": question}, config=config).strip()
+    except Exception:
+        return question  # rewrite hanya optimasi retrieval, gagal tidak boleh menggagalkan jawaban
+    return standalone.splitlines()[0].strip() if standalone else question
@@ -0,0 +1,143 @@
+"""
+Koleksi Chroma persistent yang dipakai bersama semua session (app1 - app3).
+
+Sebelumnya setiap session membuat `Chroma.from_documents(...)` in-memory sendiri:
+setiap refresh browser harus embed ulang semua dokumen, dan N session menyimpan
+N salinan index di RAM. Sekarang satu koleksi di disk dibuka sekali per proses
+server (warm start = load dari disk), dan dokumen baru ditambahkan secara
+incremental dengan ID deterministik, jadi chunk yang sudah ada tidak di-embed lagi.
+
+Dengan `QUANTIZED_INDEX=int8|binary`, retrieval memakai index ter-kuantisasi
+(lihat `quantized_index`) yang dibangun dari embedding di koleksi saat start.
+"""
+import os
+import threading
+
+from langchain_core.documents import Document
+
+from hybrid_retriever import build_bm25_index
+from quantized_index import QUANTIZED_DIR, QUANTIZED_INDEX, QuantizedIndex, QuantizedVectorStore
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".rag_cache")
+CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", os.path.join(CACHE_DIR, "chroma"))
+
+
+class ChromaCorpus:
+    """
+    Pembungkus satu koleksi Chroma persistent.
+
+    `vector_store` (LangChain `Chroma`, atau `QuantizedVectorStore` kalau kuantisasi
+    aktif) dipakai untuk retrieval, sedangkan ingest
+    langsung menulis embedding yang sudah dihitung ke koleksi chromadb
+    (tidak ada embedding dua kali).
+    """
+
+    def __init__(self, collection_name, embeddings, persist_directory=CHROMA_DIR, quantization=QUANTIZED_INDEX):
+        # Import chromadb ditunda sampai koleksi dibuka (mempercepat render pertama halaman)
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(collection_name)
+        self.vector_store = Chroma(
+            client=self.client,
+            collection_name=collection_name,
+            embedding_function=embeddings,
+        )
+        self._lock = threading.Lock()
+        self._bm25_index = None
+        self._embeddings = embeddings
+        self.quantization = quantization
+        self.quantized_index = None
+        if quantization != "none":
+            for ids, _, _, vectors in self.iter_documents(include=("embeddings",)):
+                self._add_quantized(ids, vectors)
+
+    def _add_quantized(self, ids, vectors):
+        # Index dibuat begitu dimensi embedding diketahui (koleksi pertama kali berisi)
+        if self.quantized_index is None:
+            self.quantized_index = QuantizedIndex(
+                len(vectors[0]), mode=self.quantization,
+                float_dir=QUANTIZED_DIR,
+            )
+            self.vector_store = QuantizedVectorStore(
+                self.quantized_index, self._embeddings, self.fetch_documents, self.add
+            )
+        self.quantized_index.add(ids, vectors)
+
+    def count(self):
+        return self.collection.count()
+
+    def existing_ids(self, ids):
+        """ID mana saja yang sudah tersimpan di koleksi."""
+        found = set()
+        for start in range(0, len(ids), 1000):
+            result = self.collection.get(ids=ids[start:start + 1000], include=[])
+            found.update(result["ids"])
+        return found
+
+    def iter_documents(self, batch_size=1000, include=("documents", "metadatas")):
+        """
+        Baca seluruh isi koleksi per batch: yield (ids, texts, metadatas), ditambah
+        embeddings kalau "embeddings" ada di `include`.
+        """
+        offset = 0
+        while True:
+            result = self.collection.get(include=list(include), limit=batch_size, offset=offset)
+            if not len(result["ids"]):
+                return
+            batch = (result["ids"], result.get("documents"), result.get("metadatas"))
+            yield batch + (result["embeddings"],) if "embeddings" in include else batch
+            offset += len(result["ids"])
+
+    def fetch_documents(self, ids):
+        """Ambil teks + metadata chunk berdasarkan ID: {id: Document}."""
+        if not ids:
+            return {}
+        result = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return {
+            row_id: Document(page_content=text, metadata=metadata or {})
+            for row_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+
+    def delete(self, ids):
+        """Hapus chunk berdasarkan ID (mis. chunk versi lama setelah index dibangun ulang)."""
+        if not ids:
+            return
+        max_batch = getattr(self.client, "get_max_batch_size", lambda: 5000)()
+        with self._lock:
+            for start in range(0, len(ids), max_batch):
+                self.collection.delete(ids=ids[start:start + max_batch])
+            if self._bm25_index is not None:
+                self._bm25_index.remove(ids)
+            if self.quantized_index is not None:
+                self.quantized_index.remove(ids)
+
+    def bm25_index(self):
+        """Index BM25 dari isi koleksi, dibangun sekali saat pertama dipakai lalu di-update oleh `add`."""
+        with self._lock:
+            if self._bm25_index is None:
+                self._bm25_index = build_bm25_index(self.iter_documents())
+            return self._bm25_index
+
+    def add(self, ids, texts, embeddings, metadatas, progress=None):
+        """Upsert chunk yang embedding-nya sudah dihitung, dicicil sesuai batas batch chromadb."""
+        if not ids:
+            return
+        max_batch = getattr(self.client, "get_max_batch_size", lambda: 5000)()
+        with self._lock:
+            for start in range(0, len(ids), max_batch):
+                stop = start + max_batch
+                self.collection.upsert(
+                    ids=ids[start:stop],
+                    embeddings=embeddings[start:stop],
+                    documents=texts[start:stop],
+                    metadatas=metadatas[start:stop],
+                )
+                if progress:
+                    progress(min(stop, len(ids)), len(ids))
+            if self._bm25_index is not None:
+                self._bm25_index.add(ids, texts, metadatas)
+            if self.quantization != "none":
+                self._add_quantized(ids, embeddings)
@@ -0,0 +1,208 @@
+"""
+Chunker berbasis token yang mengikuti struktur dokumen (heading, paragraf, kalimat).
+
+`RecursiveCharacterTextSplitter` memotong per jumlah karakter dan tidak tahu heading,
+jadi satu chunk bisa berisi akhir satu bab + awal bab berikutnya, dan ukuran chunk tidak
+sebanding dengan batas token model embedding. Di sini:
+
+- panjang chunk dihitung dalam token (`CHUNK_TOKENS`, overlap `CHUNK_OVERLAP_TOKENS`);
+  token = kata atau satu tanda baca, perkiraan dekat token model (MiniLM dipotong di 256
+  wordpiece, default 160 token masih aman untuk teks biasa),
+- chunk diakhiri di batas paling "kuat" yang masih muat: heading > paragraf > kalimat >
+  baris > kata; heading selalu membuka chunk baru dan judulnya disimpan di metadata `section`,
+- overlap hanya dipakai kalau chunk terpaksa dipotong di tengah paragraf, dan dimulai di awal kalimat,
+- setiap chunk menyimpan `page`, `start_index`, `end_index` (offset karakter di halaman,
+  `page_content == teks_halaman[start_index:end_index]`) dan `tokens`, jadi chunk
+  bersebelahan bisa digabung tanpa membandingkan teks (`context_packer`).
+
+Klasifikasi karakter dan posisi token dihitung vectorized dengan numpy per halaman
+(tanpa loop Python per karakter/token), cukup cepat untuk PDF ribuan halaman.
+`CHUNKER=recursive` kembali ke `RecursiveCharacterTextSplitter` (ukuran ~4 karakter per token).
+"""
+import os
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+CHUNKER = os.getenv("CHUNKER", "structured").lower()  # structured | recursive
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Prioritas batas sebelum sebuah token (makin tinggi makin disukai sebagai titik potong)
+GLUED, WORD, LINE, SENTENCE, PARAGRAPH, HEADING = -1, 0, 1, 2, 3, 4
+
+_SPACE, _WORD, _PUNCT = 0, 1, 2
+_TABLE_SIZE = 0x3000  # Latin, tanda baca umum, dll.; code point di atasnya dianggap huruf
+_CHAR_CLASS = np.array(
+    [_SPACE if chr(c).isspace() else _WORD if (chr(c).isalnum() or chr(c) == "_") else _PUNCT
+     for c in range(_TABLE_SIZE)],
+    dtype=np.int8,
+)
+_SENTENCE_END = np.zeros(128, dtype=bool)
+_SENTENCE_END[[ord(c) for c in ".!?"]] = True
+
+_HEADING_RE = re.compile(
+    r"^[ \t]*("
+    r"#{1,6}[ \t]+\S[^\n]{0,100}"  # Markdown
+    r"|(?:BAB|Bab|CHAPTER|Chapter|BAGIAN|Bagian|Section)[ \t]+[0-9IVXLC]+\b[^\n]{0,80}"
+    r"|\d{1,2}(?:\.\d{1,2})*\.?[ \t]+[A-Z][^\n.!?:;,]{1,80}"  # 2.1 Judul (tanpa titik di akhir)
+    r"|[A-Z][A-Z0-9 \t&/()\-]{3,80}"  # JUDUL HURUF BESAR
+    r")[ \t]*$",
+    re.MULTILINE,
+)
+
+
+def _char_classes(text):
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    classes = np.full(len(codes), _WORD, dtype=np.int8)
+    known = codes < _TABLE_SIZE
+    classes[known] = _CHAR_CLASS[codes[known]]
+    return codes, classes
+
+
+def token_spans(text):
+    """(starts, ends) offset karakter setiap token: kata (huruf/angka berurutan) atau satu tanda baca."""
+    codes, classes = _char_classes(text)
+    word = classes == _WORD
+    punct = classes == _PUNCT
+    previous_word = np.concatenate(([False], word[:-1]))
+    next_word = np.concatenate((word[1:], [False]))
+    starts = np.flatnonzero(punct | (word & ~previous_word))
+    ends = np.flatnonzero(punct | (word & ~next_word)) + 1
+    return codes, starts, ends
+
+
+def count_tokens(text):
+    """Jumlah token `text` dengan aturan yang sama seperti chunker."""
+    return len(token_spans(text)[1])
+
+
+class StructuredChunker:
+    """
+    Pengganti `RecursiveCharacterTextSplitter` (`split_documents` / `split_text`).
+
+    `min_tokens` (default seperempat `max_tokens`) mencegah chunk mini: heading atau
+    paragraf yang muncul sebelum chunk berisi `min_tokens` token tidak memotong chunk.
+    Judul heading terakhir dibawa ke halaman berikutnya dari file yang sama.
+    """
+
+    def __init__(self, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, min_tokens=None):
+        if max_tokens < 2:
+            raise ValueError("max_tokens minimal 2")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+        self.min_tokens = min(max_tokens // 4 if min_tokens is None else min_tokens, max_tokens - 1)
+        self._sections = {}  # source -> judul heading terakhir
+
+    def _boundaries(self, text, codes, starts, ends):
+        """Prioritas batas sebelum setiap token (indeks 0..n) + daftar heading (indeks token, judul)."""
+        n = len(starts)
+        priority = np.full(n + 1, GLUED, dtype=np.int8)
+        priority[n] = PARAGRAPH
+        if n == 0:
+            return priority, []
+        gap = starts[1:] > ends[:-1]
+        priority[1:n][gap] = WORD
+
+        # Baris & paragraf: jumlah newline di whitespace sebelum token
+        newlines = np.flatnonzero(codes == 10)
+        if len(newlines):
+            per_token = np.bincount(np.searchsorted(starts, newlines), minlength=n + 1)
+            priority[per_token == 1] = np.maximum(priority[per_token == 1], LINE)
+            priority[per_token >= 2] = PARAGRAPH
+
+        # Akhir kalimat: token sebelumnya . ! ? lalu whitespace
+        last_chars = codes[ends[:-1] - 1]
+        terminal = _SENTENCE_END[np.minimum(last_chars, 127)] & gap
+        sentence = np.flatnonzero(terminal) + 1
+        priority[sentence] = np.maximum(priority[sentence], SENTENCE)
+
+        headings = []
+        for match in _HEADING_RE.finditer(text):
+            index = int(np.searchsorted(starts, match.start(1)))
+            if index < n:
+                priority[index] = HEADING
+                headings.append((index, " ".join(match.group(1).lstrip("#").split())))
+        return priority, headings
+
+    def _cut_points(self, priority):
+        """[(awal, akhir)] indeks token setiap chunk."""
+        n = len(priority) - 1
+        spans = []
+        start = 0
+        while start < n:
+            limit = min(start + self.max_tokens, n)
+            lower = start + self.min_tokens + 1
+            # Heading di jendela ini selalu membuka chunk baru
+            headings = np.flatnonzero(priority[lower:limit + 1] == HEADING)
+            if len(headings) and lower + headings[0] < n:
+                end = lower + int(headings[0])
+            elif limit == n:
+                end = n
+            else:
+                # Batas terkuat; kalau seri, yang paling akhir (chunk sepanjang mungkin)
+                window = priority[lower:limit + 1][::-1]
+                end = limit - int(np.argmax(window))
+            spans.append((start, end))
+            if end == n or priority[end] >= PARAGRAPH or not self.overlap_tokens:
+                start = end
+                continue
+            # Overlap: mundur maksimal `overlap_tokens`, mulai di awal kalimat kalau ada
+            lower = max(end - self.overlap_tokens, start + 1)
+            sentences = np.flatnonzero(priority[lower:end] >= SENTENCE)
+            start = lower + int(sentences[0]) if len(sentences) else lower
+        return spans
+
+    def _split_page(self, text, metadata):
+        codes, starts, ends = token_spans(text)
+        if not len(starts):
+            return []
+        priority, headings = self._boundaries(text, codes, starts, ends)
+        source = metadata.get("source")
+        section = self._sections.get(source)
+        next_heading = 0
+        chunks = []
+        for start, end in self._cut_points(priority):
+            while next_heading < len(headings) and headings[next_heading][0] <= start:
+                section = headings[next_heading][1]
+                next_heading += 1
+            chunk_metadata = dict(metadata)
+            chunk_metadata["start_index"] = int(starts[start])
+            chunk_metadata["end_index"] = int(ends[end - 1])
+            chunk_metadata["tokens"] = end - start
+            if section:
+                chunk_metadata["section"] = section  # Chroma menolak metadata None, jadi hanya diisi kalau ada
+            chunks.append(Document(
+                page_content=text[chunk_metadata["start_index"]:chunk_metadata["end_index"]],
+                metadata=chunk_metadata,
+            ))
+        if headings:
+            section = headings[-1][1]
+        if section:
+            self._sections[source] = section
+        return chunks
+
+    def split_documents(self, documents):
+        chunks = []
+        for doc in documents:
+            chunks.extend(self._split_page(doc.page_content, doc.metadata))
+        return chunks
+
+    def split_text(self, text):
+        return [doc.page_content for doc in self._split_page(text, {})]
+
+
+def build_text_splitter(max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, kind=CHUNKER):
+    """Splitter untuk ingest: `StructuredChunker`, atau `RecursiveCharacterTextSplitter` kalau `kind="recursive"`."""
+    if kind == "recursive":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        return RecursiveCharacterTextSplitter(
+            chunk_size=max_tokens * 4,  # ~4 karakter per token (`batch_embedder.estimate_tokens`)
+            chunk_overlap=overlap_tokens * 4,
+            add_start_index=True,
+        )
+    if kind != "structured":
+        raise ValueError(f"CHUNKER tidak dikenal: {kind} (pilih structured | recursive)")
+    return StructuredChunker(max_tokens, overlap_tokens)
@@ -0,0 +1,175 @@
+"""
+Penyusunan konteks prompt dengan budget token.
+
+`create_stuff_documents_chain` menempelkan semua chunk hasil retrieval apa adanya:
+overlap antar chunk (`chunk_overlap`) dan passage kembar dari upload ulang ikut
+terkirim ke Gemini. Di sini chunk hasil retrieval dibersihkan dulu:
+
+1. passage yang kembar / hampir kembar dibuang (yang ranking-nya lebih tinggi dipertahankan),
+2. chunk yang bersebelahan dari file yang sama digabung tanpa mengulang bagian overlap,
+3. passage terbaik dimasukkan sampai budget token habis.
+
+Token input menentukan latency dan biaya Gemini, jadi setiap token harus berisi info baru.
+"""
+import os
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from batch_embedder import estimate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+MIN_TEXT_OVERLAP = 20  # overlap teks lebih pendek dari ini dianggap kebetulan
+MAX_TEXT_OVERLAP = 1000
+MAX_OFFSET_GAP = 4  # jarak offset antar chunk yang masih dianggap bersebelahan (whitespace yang di-strip)
+NEAR_DUPLICATE_JACCARD = 0.9
+SHINGLE_SIZE = 5
+
+
+def _source(doc):
+    return doc.metadata.get("source_file") or doc.metadata.get("source") or ""
+
+
+def _position(doc):
+    metadata = doc.metadata
+    return (
+        metadata.get("page", 0) or 0,
+        metadata.get("chunk_id", -1),
+        metadata.get("start_index", -1),
+    )
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+def _shingles(normalized):
+    words = normalized.split()
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def dedupe_documents(docs):
+    """
+    Buang passage kosong, kembar, atau hampir kembar (Jaccard shingle kata).
+    Kalau satu passage termuat di passage lain, yang lebih panjang disimpan di posisi ranking yang lebih tinggi.
+    """
+    kept = []  # [doc, normalized, shingles]
+    for doc in docs:
+        normalized = _normalize(doc.page_content)
+        if not normalized:
+            continue
+        shingles = _shingles(normalized)
+        duplicate = False
+        for entry in kept:
+            if normalized in entry[1]:
+                duplicate = True
+            elif entry[1] in normalized:
+                entry[:] = [doc, normalized, shingles]
+                duplicate = True
+            else:
+                union = len(shingles | entry[2])
+                duplicate = union > 0 and len(shingles & entry[2]) / union >= NEAR_DUPLICATE_JACCARD
+            if duplicate:
+                break
+        if not duplicate:
+            kept.append([doc, normalized, shingles])
+    return [entry[0] for entry in kept]
+
+
+def text_overlap(left, right):
+    """Panjang overlap terpanjang: akhir `left` == awal `right` (0 kalau di bawah MIN_TEXT_OVERLAP)."""
+    for size in range(min(len(left), len(right), MAX_TEXT_OVERLAP), MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_text(first, second):
+    """Gabungkan dua chunk berurutan dari file yang sama, atau None kalau tidak bersebelahan."""
+    a, b = first.metadata, second.metadata
+    if a.get("page") == b.get("page") and "start_index" in a and "start_index" in b:
+        end = a.get("end_index", a["start_index"] + len(first.page_content))
+        if b["start_index"] <= end:
+            overlap = end - b["start_index"]
+            return first.page_content + second.page_content[overlap:]
+        if b["start_index"] - end <= MAX_OFFSET_GAP:
+            # Chunk dipotong di batas paragraf/kalimat: di antaranya hanya whitespace
+            return first.page_content + "\n" + second.page_content
+        return None
+    overlap = text_overlap(first.page_content, second.page_content)
+    if overlap:
+        return first.page_content + second.page_content[overlap:]
+    if "chunk_id" in a and "chunk_id" in b and b["chunk_id"] == a["chunk_id"] + 1:
+        return first.page_content + "\n" + second.page_content
+    return None
+
+
+def merge_adjacent(ranked):
+    """
+    `ranked` = list (rank, Document). Chunk bersebelahan dari file yang sama digabung
+    jadi satu passage; ranking passage = ranking terbaik anggotanya.
+    """
+    by_source = {}
+    for rank, doc in ranked:
+        by_source.setdefault(_source(doc), []).append((rank, doc))
+
+    merged = []
+    for items in by_source.values():
+        items.sort(key=lambda item: _position(item[1]))
+        rank, current = items[0]
+        for next_rank, doc in items[1:]:
+            text = _merge_text(current, doc)
+            if text is None:
+                merged.append((rank, current))
+                rank, current = next_rank, doc
+            else:
+                metadata = current.metadata
+                if "end_index" in doc.metadata and metadata.get("page") == doc.metadata.get("page"):
+                    metadata = {**metadata, "end_index": max(metadata.get("end_index", 0), doc.metadata["end_index"])}
+                current = Document(page_content=text, metadata=metadata)
+                rank = min(rank, next_rank)
+        merged.append((rank, current))
+    merged.sort(key=lambda item: item[0])
+    return merged
+
+
+def _truncate(text, max_tokens):
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0]
+
+
+def pack_documents(docs, max_tokens=CONTEXT_TOKEN_BUDGET):
+    """
+    Dedupe -> gabung chunk bersebelahan -> ambil passage terbaik sampai `max_tokens`.
+    Passage yang tidak muat dilewati (passage berikutnya yang lebih pendek masih bisa masuk);
+    passage pertama dipotong kalau sendirian sudah melebihi budget.
+    """
+    passages = merge_adjacent(list(enumerate(dedupe_documents(docs))))
+    packed = []
+    used = 0
+    for _, doc in passages:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens <= max_tokens:
+            packed.append(doc)
+            used += tokens
+        elif not packed:
+            packed.append(Document(page_content=_truncate(doc.page_content, max_tokens), metadata=doc.metadata))
+            break
+    return packed
+
+
+class PackedContextRetriever(BaseRetriever):
+    """Bungkus retriever lain: hasilnya di-pack ke budget token sebelum masuk prompt."""
+
+    retriever: Any
+    max_tokens: int = CONTEXT_TOKEN_BUDGET
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        return pack_documents(self.retriever.invoke(query, config=config), self.max_tokens)
@@ -0,0 +1,182 @@
+"""
+Cache embedding di disk yang dipakai bersama oleh app1 - app4.
+
+Key cache = (nama model, SHA-256 dari teks yang sudah dinormalisasi), value
+disimpan sebagai float32 mentah (BLOB) di SQLite. Teks yang sama (boilerplate,
+dokumen yang overlap, pertanyaan yang diulang) tidak perlu di-embed lagi, jadi
+tidak makan waktu model atau kuota Gemini.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import metrics
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".rag_cache")
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+def normalize_text(text):
+    # Spasi/newline berlebih dari hasil parsing PDF tidak mengubah makna teks
+    return " ".join(text.split())
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrapper untuk backend embedding apa saja (Gemini, HuggingFace, dll).
+
+    Hanya teks yang belum ada di cache yang diteruskan ke backend. Entry yang
+    paling lama tidak dipakai dibuang (LRU) kalau jumlahnya melebihi `max_entries`.
+    """
+
+    def __init__(self, embeddings, model_name, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        # Beberapa backend (mis. Gemini) meng-embed query dan dokumen dengan task berbeda,
+        # jadi vektor query disimpan di namespace terpisah
+        self._query_model = f"{model_name}#query"
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # timeout + WAL supaya beberapa proses Streamlit bisa baca/tulis file yang sama
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model     TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim       INTEGER NOT NULL,
+                vector    BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_embedding_cache_lru ON embedding_cache (last_used);
+        """)
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embedding_cache").fetchone()
+        self._clock = row[0]
+
+    # --- Statistik ---
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    # --- Akses cache ---
+    def _lookup(self, model, keys):
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # SQLite membatasi jumlah parameter per query, jadi dicicil
+        for i in range(0, len(unique_keys), 500):
+            part = unique_keys[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? AND text_hash IN ({placeholders})",
+                [model, *part],
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, model, items, touched):
+        self._clock += 1
+        with self._conn:
+            if items:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (model, text_hash, dim, vector, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (model, key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), self._clock)
+                        for key, vector in items.items()
+                    ],
+                )
+            if touched:
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(self._clock, model, key) for key in touched],
+                )
+            if items:
+                self._evict()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+        if count <= self.max_entries:
+            return
+        # Buang sedikit lebih banyak dari kelebihannya supaya tidak evict di setiap insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embedding_cache WHERE rowid IN "
+            "(SELECT rowid FROM embedding_cache ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE model IN (?, ?)", (self.model_name, self._query_model)
+            )
+
+    # --- Interface Embeddings ---
+    def embed_documents(self, texts):
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            cached = self._lookup(self.model_name, keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        computed = {}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            metrics.increment("rag_embedding_cache_total", len(texts) - len(missing), kind="document", result="hit")
+            metrics.increment("rag_embedding_cache_total", len(missing), kind="document", result="miss")
+            self._store(self.model_name, computed, list(cached))
+
+        results = {**cached, **computed}
+        return [results[key] for key in keys]
+
+    def embed_query(self, text):
+        key = text_key(text)
+        with self._lock:
+            cached = self._lookup(self._query_model, [key])
+        if key in cached:
+            with self._lock:
+                self.hits += 1
+                metrics.increment("rag_embedding_cache_total", kind="query", result="hit")
+                self._store(self._query_model, {}, [key])
+            return cached[key]
+
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self.misses += 1
+            metrics.increment("rag_embedding_cache_total", kind="query", result="miss")
+            self._store(self._query_model, {key: vector}, [])
+        return vector
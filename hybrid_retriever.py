@@ -0,0 +1,167 @@
+"""
+Retriever hybrid: BM25 (kata kunci persis) + vector search (makna), digabung
+dengan Reciprocal Rank Fusion (RRF).
+
+Dense search dengan all-MiniLM-L6-v2 sering melewatkan istilah persis seperti
+ID CVE, nama keluarga malware, atau nomor port. Index BM25 lokal menangkap
+istilah-istilah itu tanpa perlu menaikkan k (k besar = prompt makin panjang
+dan Gemini makin lambat). Index di-update incremental setiap ada chunk baru.
+"""
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from metadata_filter import matches_filter
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+
+# Token: kata/angka, termasuk bentuk gabungan seperti "cve-2021-44228", "log4j", "192.168.1.1"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.:/][a-z0-9]+)*")
+
+# Pool kecil untuk menjalankan lookup BM25 dan vector secara bersamaan
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+def tokenize(text):
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        tokens.append(match)
+        # Bentuk gabungan juga dipecah supaya "CVE-2021-44228" tetap ketemu dengan query "44228"
+        parts = re.split(r"[-_.:/]", match)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def doc_key(doc):
+    """Kunci untuk menyamakan dokumen dari BM25 dan vector store (sumber + isi chunk)."""
+    source = doc.metadata.get("source_file") or doc.metadata.get("source") or ""
+    return hashlib.sha1(f"{source}\0{doc.page_content}".encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """
+    Inverted index BM25 (Okapi) in-memory yang bisa ditambah/dikurangi per chunk.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # term -> {doc_id: tf}
+        self._doc_len = {}
+        self._docs = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, ids, texts, metadatas):
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._docs:
+                    self._remove(doc_id)
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self._postings[term][doc_id] = tf
+                length = sum(counts.values())
+                self._doc_len[doc_id] = length
+                self._total_len += length
+                self._docs[doc_id] = Document(page_content=text, metadata=dict(metadata or {}))
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._docs:
+                    self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id)
+        for term in set(tokenize(doc.page_content)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+
+    def search(self, query, k=10, filter=None):
+        """Return list (Document, skor) terurut dari skor BM25 tertinggi (hanya chunk yang lolos `filter`)."""
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avgdl = self._total_len / n_docs
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avgdl)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            if filter:
+                scores = {
+                    doc_id: score for doc_id, score in scores.items()
+                    if matches_filter(self._docs[doc_id].metadata, filter)
+                }
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self._docs[doc_id], score) for doc_id, score in best]
+
+
+def build_bm25_index(batches):
+    """Bangun index dari isi vector store yang sudah ada: `batches` = iterable (ids, texts, metadatas)."""
+    index = BM25Index()
+    for ids, texts, metadatas in batches:
+        index.add(ids, texts, metadatas)
+    return index
+
+
+def reciprocal_rank_fusion(result_lists, k, rrf_k=60):
+    """Gabungkan beberapa ranking: skor = sum(1 / (rrf_k + rank)) per dokumen."""
+    scores = defaultdict(float)
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [docs[key] for key, _ in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Jalankan vector search dan BM25 bersamaan (masing-masing `fetch_k` kandidat),
+    lalu ambil `k` teratas hasil RRF. `search_kwargs["filter"]` (lihat `metadata_filter`)
+    berlaku untuk kedua sisi.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Any
+    bm25_index: Any
+    k: int = 5
+    fetch_k: int = 10
+    rrf_k: int = 60
+    search_kwargs: dict = {}
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        vector_future = _search_pool.submit(
+            self.vector_store.similarity_search, query, k=self.fetch_k, **self.search_kwargs
+        )
+        keyword_results = [
+            doc for doc, _ in self.bm25_index.search(query, k=self.fetch_k, filter=self.search_kwargs.get("filter"))
+        ]
+        return reciprocal_rank_fusion([vector_future.result(), keyword_results], k=self.k, rrf_k=self.rrf_k)
@@ -0,0 +1,124 @@
+"""
+Ledger ingest berbasis hash konten (SHA-256).
+
+Ledger menyimpan hash file PDF dan hash setiap chunk yang sudah masuk ke
+vector store. Dengan begitu upload ulang file yang sama tidak perlu di-parse,
+di-embed, dan di-insert lagi, dan file yang diedit cukup mengirim chunk yang
+berubah saja.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".rag_cache")
+DEFAULT_LEDGER_PATH = os.path.join(CACHE_DIR, "ingest_ledger.sqlite3")
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_row_id(source_file, chunk_hash):
+    """
+    ID baris di vector store yang stabil untuk pasangan (file, isi chunk).
+    Formatnya UUID (36 karakter) supaya muat di kolom `id` tabel TiDB.
+    """
+    digest = hashlib.sha256(f"{source_file}\0{chunk_hash}".encode("utf-8")).hexdigest()
+    return str(uuid.UUID(hex=digest[:32]))
+
+
+class IngestLedger:
+    """
+    Catatan file & chunk yang sudah di-ingest, disimpan di SQLite lokal.
+
+    `namespace` memisahkan ledger per tabel/collection vector store, jadi satu
+    file ledger bisa dipakai beberapa app sekaligus.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, namespace="default"):
+        self.path = path
+        self.namespace = namespace
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                namespace   TEXT NOT NULL,
+                source_file TEXT NOT NULL,
+                file_hash   TEXT NOT NULL,
+                chunks      INTEGER NOT NULL,
+                updated_at  TEXT NOT NULL,
+                PRIMARY KEY (namespace, source_file)
+            );
+            CREATE INDEX IF NOT EXISTS idx_ingested_files_hash
+                ON ingested_files (namespace, file_hash);
+            CREATE TABLE IF NOT EXISTS ingested_chunks (
+                namespace   TEXT NOT NULL,
+                source_file TEXT NOT NULL,
+                chunk_hash  TEXT NOT NULL,
+                row_id      TEXT NOT NULL,
+                PRIMARY KEY (namespace, source_file, chunk_hash)
+            );
+        """)
+        self._conn.commit()
+
+    def find_file(self, file_hash):
+        """Nama file yang isinya persis sama (hash sama), atau None kalau belum pernah di-ingest."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_file FROM ingested_files WHERE namespace = ? AND file_hash = ?",
+                (self.namespace, file_hash),
+            ).fetchone()
+        return row[0] if row else None
+
+    def known_chunks(self, source_file):
+        """Mapping {chunk_hash: row_id} versi file yang terakhir tercatat (kosong kalau file baru)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_hash, row_id FROM ingested_chunks WHERE namespace = ? AND source_file = ?",
+                (self.namespace, source_file),
+            ).fetchall()
+        return dict(rows)
+
+    def files(self):
+        """List (source_file, file_hash, updated_at) semua file di namespace ini."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT source_file, file_hash, updated_at FROM ingested_files WHERE namespace = ? ORDER BY source_file",
+                (self.namespace,),
+            ).fetchall()
+
+    def namespaces(self):
+        """Semua namespace yang punya file di ledger ini (mis. satu per tenant)."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT namespace FROM ingested_files ORDER BY namespace"
+            )]
+
+    def record_file(self, source_file, file_hash, chunk_rows, updated_at=None):
+        """
+        Simpan versi terbaru file beserta mapping {chunk_hash: row_id} dalam satu transaksi.
+        `updated_at` (ISO) mempertahankan waktu ingest lama, mis. saat index dibangun ulang.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM ingested_chunks WHERE namespace = ? AND source_file = ?",
+                (self.namespace, source_file),
+            )
+            self._conn.executemany(
+                "INSERT INTO ingested_chunks (namespace, source_file, chunk_hash, row_id) VALUES (?, ?, ?, ?)",
+                [(self.namespace, source_file, h, row_id) for h, row_id in chunk_rows.items()],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested_files (namespace, source_file, file_hash, chunks, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, source_file, file_hash, len(chunk_rows), updated_at or datetime.now().isoformat()),
+            )
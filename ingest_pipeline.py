@@ -0,0 +1,106 @@
+"""
+Pipeline ingest streaming: halaman -> chunk -> embedding -> insert, per batch.
+
+Sebelumnya setiap tahap menunggu tahap sebelumnya selesai untuk seluruh dokumen
+(semua halaman, lalu semua chunk, lalu semua vector), jadi memori puncak naik
+sebanding ukuran PDF. Di sini setiap tahap jalan di thread sendiri dan saling
+tersambung lewat antrian berukuran tetap (`INGEST_QUEUE_SIZE` batch), sehingga:
+- yang ada di memori hanya beberapa batch yang sedang "di jalan", berapa pun jumlah halamannya,
+- parsing (process pool), embedding, dan tulis ke database berjalan bersamaan,
+- tahap yang lambat otomatis menahan tahap sebelumnya (back-pressure), bukan menumpuk data.
+
+Exception di tahap mana pun menghentikan seluruh pipeline dan dilempar ulang ke pemanggil.
+"""
+import os
+import queue
+import threading
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))  # chunk per batch embed/insert
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))  # batch maksimal yang menunggu di antara dua tahap
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(channel, item, stop):
+    # put yang bisa dibatalkan: thread tidak menggantung kalau tahap berikutnya sudah berhenti
+    while not stop.is_set():
+        try:
+            channel.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _pump(items, stage, output, stop):
+    try:
+        for item in items:
+            if stop.is_set():
+                return
+            if stage is not None:
+                item = stage(item)
+                if item is None:
+                    continue
+            if not _put(output, item, stop):
+                return
+        _put(output, _DONE, stop)
+    except BaseException as e:
+        _put(output, _Failure(e), stop)
+
+
+def _drain(channel, stop):
+    while not stop.is_set():
+        try:
+            item = channel.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+def run_pipeline(source, *stages, queue_size=INGEST_QUEUE_SIZE):
+    """
+    Jalankan `source` (iterable) dan setiap `stage(item) -> item` di thread masing-masing,
+    disambung antrian berukuran `queue_size`. Stage yang return None membuang item tersebut.
+
+    Generator: yield hasil stage terakhir, di thread pemanggil (jadi tahap terakhir,
+    mis. insert ke database, ditulis langsung di loop pemanggil).
+    """
+    stop = threading.Event()
+    channel = queue.Queue(maxsize=queue_size)
+    threads = [threading.Thread(target=_pump, args=(source, None, channel, stop), daemon=True)]
+    for stage in stages:
+        upstream, channel = channel, queue.Queue(maxsize=queue_size)
+        threads.append(threading.Thread(
+            target=_pump, args=(_drain(upstream, stop), stage, channel, stop), daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+    try:
+        yield from _drain(channel, stop)
+    finally:
+        # Selesai, gagal, atau pemanggil berhenti di tengah: hentikan semua tahap
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def iter_chunk_batches(pages, text_splitter, batch_size=INGEST_BATCH_SIZE):
+    """Split halaman satu per satu (hasilnya sama dengan `split_documents(semua_halaman)`), yield list chunk per batch."""
+    batch = []
+    for page in pages:
+        batch.extend(text_splitter.split_documents([page]))
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
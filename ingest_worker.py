@@ -0,0 +1,158 @@
+"""
+Antrian ingest di background supaya proses PDF tidak membekukan session Streamlit.
+
+Fungsi ingest dijalankan di thread pool (satu pool per proses server). Selama
+berjalan, fungsi melaporkan progress per tahap (parse, split, embed, insert) ke
+objek `IngestJob`, dan UI cukup membaca status job tersebut di setiap rerun.
+Fungsi ingest TIDAK boleh memanggil `st.*` karena jalan di luar thread script.
+Tahap boleh berjalan tumpang-tindih (lihat `ingest_pipeline`); durasi tahap = rentang
+waktu dari laporan pertama sampai terakhir tahap itu. Durasi setiap tahap & job dicatat ke `metrics`.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+STAGES = ("parse", "split", "embed", "insert")
+STAGE_LABELS = {
+    "parse": "Membaca PDF",
+    "split": "Memecah teks",
+    "embed": "Membuat embedding",
+    "insert": "Menyimpan ke vector store",
+}
+
+DEFAULT_MAX_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+class IngestJob:
+    def __init__(self, filename):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"  # queued -> running -> done / failed
+        self.stage = None
+        self.stages = {stage: {"done": 0, "total": 0} for stage in STAGES}
+        self.message = ""
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.stage_seconds = {}
+        self._stage_times = {}  # stage -> [laporan pertama, laporan terakhir] (perf_counter)
+        self._lock = threading.Lock()
+
+    def report(self, stage, done=None, total=None, message=None):
+        """Dipanggil dari worker (boleh dari beberapa thread) untuk update progress tahap `stage`."""
+        now = time.perf_counter()
+        with self._lock:
+            if self.stage is not None and stage != self.stage and self.stage in self._stage_times:
+                # Tahap sebelumnya dianggap jalan sampai tahap baru dilaporkan
+                self._stage_times[self.stage][1] = max(self._stage_times[self.stage][1], now)
+            self._stage_times.setdefault(stage, [now, now])[1] = now
+            self.stage = stage
+            if total is not None:
+                self.stages[stage]["total"] = total
+            if done is not None:
+                self.stages[stage]["done"] = done
+            if message is not None:
+                self.message = message
+
+    def close(self):
+        """Tutup timing tahap terakhir, lalu catat durasi tahap & job ke metrics."""
+        now = time.perf_counter()
+        with self._lock:
+            if self.stage in self._stage_times:
+                self._stage_times[self.stage][1] = now
+            for stage, (started, ended) in self._stage_times.items():
+                self.stage_seconds[stage] = ended - started
+                metrics.observe("rag_ingest_stage_seconds", ended - started, stage=stage)
+        seconds = self.finished_at - self.created_at
+        metrics.observe("rag_ingest_job_seconds", seconds, status=self.status)
+        metrics.increment("rag_ingest_jobs_total", status=self.status)
+        metrics.log_event(
+            "ingest",
+            status=self.status,
+            filename=self.filename,
+            total_ms=round(seconds * 1000, 1),
+            stages_ms={stage: round(s * 1000, 1) for stage, s in self.stage_seconds.items()},
+            items={stage: info["total"] for stage, info in self.stages.items()},
+            error=self.error,
+        )
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def progress(self):
+        """Progress keseluruhan 0.0 - 1.0 (setiap tahap punya bobot sama)."""
+        if self.status == "done":
+            return 1.0
+        total = 0.0
+        for i, stage in enumerate(STAGES):
+            info = self.stages[stage]
+            if info["total"]:
+                total += min(info["done"] / info["total"], 1.0)
+            elif self.stage in STAGES and STAGES.index(self.stage) > i:
+                total += 1.0
+        return total / len(STAGES)
+
+    def describe(self):
+        if self.status == "queued":
+            return "Menunggu antrian..."
+        if self.stage is None:
+            return "Memulai..."
+        info = self.stages[self.stage]
+        label = STAGE_LABELS.get(self.stage, self.stage)
+        if info["total"]:
+            return f"{label} ({info['done']}/{info['total']})"
+        return f"{label}..."
+
+
+class IngestionQueue:
+    """
+    Thread pool untuk job ingest. Beberapa file diproses paralel sampai `max_workers`.
+
+    `fn(job, *args, **kwargs)` dijalankan di worker; nilai return-nya disimpan di
+    `job.result`, exception-nya di `job.error`.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_jobs=200):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename, fn, *args, **kwargs):
+        job = IngestJob(filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.traceback = traceback.format_exc()
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.close()
+
+    def _forget_old_jobs(self):
+        # Simpan paling banyak `max_jobs` job yang sudah selesai
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job.id]
+
+    def jobs(self, job_ids):
+        with self._lock:
+            return [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
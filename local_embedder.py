@@ -0,0 +1,102 @@
+"""
+Engine embedding lokal yang dioptimalkan untuk CPU (tanpa GPU).
+
+Pengganti `HuggingFaceEmbeddings` dengan setting default. Perbedaannya:
+- batch size bisa diatur (`EMBED_LOCAL_BATCH_SIZE`),
+- teks diurutkan per panjang lalu dibagi per batch (length bucketing), jadi satu batch
+  berisi teks yang panjangnya mirip dan padding yang ikut dihitung model minimal,
+- jumlah thread intra-op bisa diatur (`EMBED_THREADS`),
+- backend opsional: `torch-int8` (dynamic quantization layer Linear, tanpa dependency
+  tambahan), `onnx` / `onnx-int8` (ONNX Runtime, butuh `optimum[onnxruntime]`), `openvino`.
+
+Dipakai lewat `model_registry` (satu instance per model per proses).
+Lihat `python -m bench.embed_bench` untuk perbandingan chunk/detik antar backend.
+"""
+import os
+
+from langchain_core.embeddings import Embeddings
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8", "openvino")
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBED_LOCAL_BATCH_SIZE", "64"))
+DEFAULT_THREADS = int(os.getenv("EMBED_THREADS", "0")) or None  # None = default library (semua core)
+# File ONNX ter-kuantisasi yang disediakan repo model di Hugging Face (pilih sesuai instruksi CPU)
+ONNX_INT8_FILE = os.getenv("EMBED_ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx")
+
+
+def length_buckets(texts, batch_size):
+    """Indeks `texts` diurutkan per panjang lalu dipotong per `batch_size` (teks terpanjang dulu)."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class LocalEmbedder(Embeddings):
+    """
+    Model sentence-transformers di CPU dengan batching per panjang teks.
+
+    `progress(selesai, total)` opsional dipanggil setelah setiap batch.
+    """
+
+    def __init__(self, model_name, backend="torch", batch_size=DEFAULT_BATCH_SIZE, threads=DEFAULT_THREADS,
+                 bucketing=True):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend embedding tidak dikenal: {backend} (pilih {', '.join(BACKENDS)})")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.threads = threads
+        self.bucketing = bucketing
+        self.model = self._load()
+
+    def _load(self):
+        # Import berat (torch, transformers) hanya saat model benar-benar di-load
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+
+        if self.backend in ("torch", "torch-int8"):
+            model = SentenceTransformer(self.model_name, device="cpu")
+            if self.backend == "torch-int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            return model
+
+        model_kwargs = {}
+        if self.backend == "onnx-int8":
+            model_kwargs["file_name"] = ONNX_INT8_FILE
+        if self.threads and self.backend != "openvino":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = options
+        backend = "openvino" if self.backend == "openvino" else "onnx"
+        return SentenceTransformer(self.model_name, device="cpu", backend=backend, model_kwargs=model_kwargs)
+
+    def _encode(self, texts):
+        return self.model.encode(
+            texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False
+        )
+
+    def embed_documents(self, texts, progress=None):
+        texts = [text.replace("\n", " ") for text in texts]
+        if not texts:
+            return []
+        if self.bucketing:
+            batches = length_buckets(texts, self.batch_size)
+        else:
+            batches = [list(range(start, min(start + self.batch_size, len(texts))))
+                       for start in range(0, len(texts), self.batch_size)]
+
+        vectors = [None] * len(texts)
+        done = 0
+        for batch in batches:
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+            done += len(batch)
+            if progress:
+                progress(done, len(texts))
+        return vectors
+
+    def embed_query(self, text):
+        return self._encode([text.replace("\n", " ")])[0].tolist()
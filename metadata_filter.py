@@ -0,0 +1,90 @@
+"""
+Filter metadata chunk yang sama untuk semua jalur search.
+
+Bentuk filter (mirip filter Chroma / TiDBVectorStore):
+
+    {"source_file": {"$in": ["a.pdf", "b.pdf"]}, "upload_time": {"$gte": "2025-01-01"}}
+    {"source_file": "a.pdf"}  # singkatan untuk {"$eq": ...}
+
+Operator: $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte. Semua kondisi digabung AND.
+`filter_to_sql` menerjemahkannya ke WHERE di kolom JSON `meta` (TiDB), `matches_filter`
+mengevaluasinya di Python (index BM25 lokal), jadi hasil hybrid search tetap konsisten.
+"""
+import json
+import re
+
+OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+LIST_OPERATORS = {"$in": "IN", "$nin": "NOT IN"}
+
+_FIELD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _conditions(filter):
+    for field, condition in (filter or {}).items():
+        if not _FIELD_RE.fullmatch(field):
+            raise ValueError(f"Nama field filter tidak valid: {field}")
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op not in OPERATORS and op not in LIST_OPERATORS:
+                raise ValueError(f"Operator filter tidak dikenal: {op}")
+            if op in LIST_OPERATORS:
+                value = list(value)
+            yield field, op, value
+
+
+def filter_key(filter):
+    """String stabil untuk filter (kunci cache), "" kalau tanpa filter."""
+    return json.dumps(filter, sort_keys=True, default=str) if filter else ""
+
+
+def filter_to_sql(filter, column="meta"):
+    """Return (sql, params) untuk dipakai di WHERE; ("", {}) kalau tanpa filter."""
+    clauses, params = [], {}
+    for n, (field, op, value) in enumerate(_conditions(filter)):
+        sample = value[0] if op in LIST_OPERATORS and value else value
+        # Angka dibandingkan sebagai angka, selain itu sebagai string (ISO datetime urut secara leksikal)
+        if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            expression = f"JSON_EXTRACT({column}, '$.{field}')"
+        else:
+            expression = f"JSON_UNQUOTE(JSON_EXTRACT({column}, '$.{field}'))"
+        if op in LIST_OPERATORS:
+            if not value:
+                clauses.append("1 = 0" if op == "$in" else "1 = 1")
+                continue
+            names = [f"f{n}_{i}" for i in range(len(value))]
+            params.update({name: item for name, item in zip(names, value)})
+            placeholders = ", ".join(f":{name}" for name in names)
+            clauses.append(f"{expression} {LIST_OPERATORS[op]} ({placeholders})")
+        else:
+            params[f"f{n}"] = value
+            clauses.append(f"{expression} {OPERATORS[op]} :f{n}")
+    return " AND ".join(clauses), params
+
+
+def _compare(actual, op, value):
+    if actual is None:
+        return False  # sama seperti SQL: field yang tidak ada (NULL) tidak lolos kondisi apa pun
+    if op == "$in":
+        return actual in value
+    if op == "$nin":
+        return actual not in value
+    if op == "$eq":
+        return actual == value
+    if op == "$ne":
+        return actual != value
+    try:
+        if op == "$gt":
+            return actual > value
+        if op == "$gte":
+            return actual >= value
+        if op == "$lt":
+            return actual < value
+        return actual <= value
+    except TypeError:
+        return False
+
+
+def matches_filter(metadata, filter):
+    """True kalau metadata chunk memenuhi semua kondisi filter."""
+    return all(_compare((metadata or {}).get(field), op, value) for field, op, value in _conditions(filter))
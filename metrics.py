@@ -0,0 +1,342 @@
+"""
+Metrik latency & volume untuk ingest dan query (satu registry per proses server).
+
+Yang dicatat:
+- histogram latency per tahap ingest (parse, split, embed, insert) dan per tahap query
+  (retrieve, rerank, prompt, generate, time-to-first-token, total),
+- jumlah token prompt/jawaban dan jumlah dokumen hasil retrieval,
+- hit/miss cache embedding dan cache jawaban,
+- per tenant (label `tenant`, app4): jumlah query, token LLM, dan chunk yang di-ingest.
+
+Cara membaca:
+- `METRICS_PORT=9108` -> endpoint Prometheus di http://localhost:9108/metrics
+  (bind ke `METRICS_HOST`, default 127.0.0.1; set `0.0.0.0` supaya bisa di-scrape dari host lain),
+- `METRICS_LOG=.rag_cache/metrics.jsonl` -> setiap query & job ingest ditulis satu baris JSON
+  (default mati); file di-rotate ke `<METRICS_LOG>.1` setelah `METRICS_LOG_MAX_MB`,
+- `METRICS_PANEL=true` -> panel admin ringkasan p50/p95 di sidebar.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from batch_embedder import estimate_tokens
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".rag_cache")
+METRICS_LOG = os.getenv("METRICS_LOG", "")  # mis. .rag_cache/metrics.jsonl
+METRICS_LOG_MAX_MB = float(os.getenv("METRICS_LOG_MAX_MB", "50"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_PANEL = os.getenv("METRICS_PANEL", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50)
+
+RECENT_SAMPLES = 1024  # sampel terakhir per histogram, untuk p50/p95 di panel admin
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # bucket terakhir = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, p):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Histogram & counter in-memory (thread-safe) + log event JSONL."""
+
+    def __init__(self, log_path=METRICS_LOG, log_max_bytes=int(METRICS_LOG_MAX_MB * 1024 * 1024)):
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self._histograms = {}  # (name, label_key) -> Histogram
+        self._counters = defaultdict(float)  # (name, label_key) -> nilai
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        if amount:
+            with self._lock:
+                self._counters[(name, _label_key(labels))] += amount
+
+    def counter_value(self, name, **labels):
+        """Total counter `name` dari semua seri yang labelnya memuat `labels`."""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(
+                value for (counter, label_key), value in self._counters.items()
+                if counter == name and wanted <= set(label_key)
+            )
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def log_event(self, event, **fields):
+        """
+        Tulis satu baris JSON. Gagal menulis log tidak boleh mengganggu app.
+        Lewat `log_max_bytes` file lama di-rename ke `<log_path>.1` (satu cadangan, yang lebih lama dibuang).
+        """
+        if not self.log_path:
+            return
+        line = json.dumps({"ts": time.time(), "pid": os.getpid(), "event": event, **fields}, default=str)
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                if self.log_max_bytes and os.path.exists(self.log_path) \
+                        and os.path.getsize(self.log_path) >= self.log_max_bytes:
+                    os.replace(self.log_path, f"{self.log_path}.1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError:
+            pass
+
+    def render_prometheus(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        seen = set()
+        for (name, label_key), histogram in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(label_key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(label_key)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(label_key)} {histogram.count}")
+        for (name, label_key), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(label_key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Baris ringkasan untuk panel admin: histogram (count, rata-rata, p50, p95) lalu counter."""
+        with self._lock:
+            rows = [
+                {
+                    "metric": name,
+                    "labels": ", ".join(f"{k}={v}" for k, v in label_key),
+                    "count": histogram.count,
+                    "mean": round(histogram.sum / histogram.count, 4) if histogram.count else None,
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95),
+                }
+                for (name, label_key), histogram in sorted(self._histograms.items())
+            ]
+            rows.extend(
+                {"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in label_key), "count": value}
+                for (name, label_key), value in sorted(self._counters.items())
+            )
+        return rows
+
+
+REGISTRY = MetricsRegistry()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, registry=REGISTRY, host=METRICS_HOST):
+    """Jalankan endpoint `/metrics` (format teks Prometheus) di thread daemon, sekali per proses."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = registry.render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            _server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+class QueryMetrics(BaseCallbackHandler):
+    """
+    Callback LangChain untuk satu query: dipasang lewat `config={"callbacks": [tracker]}`
+    di `invoke`/`stream`, lalu `finish()` dipanggil setelah jawaban selesai.
+
+    Tahap: retrieve (retriever terluar), prompt (retriever selesai -> LLM mulai),
+    generate (LLM mulai -> selesai), first_token (LLM mulai -> token pertama), total.
+    LLM call tambahan yang diberi tag `stage:<nama>` (mis. `stage:rewrite` dari
+    `chat_memory.rewrite_query`) dicatat sebagai tahap `<nama>`, bukan sebagai generate.
+    Custom event `rag_stage` ({"stage", "seconds", ...}) dicatat sebagai tahap di dalam
+    retrieve (mis. `rerank` dari `reranker.RerankRetriever`), detailnya ikut ke log.
+    `tenant` menambah label `tenant` di counter query & token (pemakaian per tenant).
+    """
+
+    def __init__(self, registry=REGISTRY, tenant=None):
+        self.registry = registry
+        self.labels = {"tenant": tenant} if tenant else {}
+        self.started = time.perf_counter()
+        self.retrieve_start = self.retrieve_end = None
+        self.llm_start = self.llm_end = self.first_token = None
+        self.documents = 0
+        self.prompt_tokens = self.answer_tokens = None
+        self.extra_stages = {}  # tahap dari tag `stage:<nama>` -> [mulai, selesai]
+        self._retriever_runs = set()
+        self._tagged_runs = {}  # run_id LLM call ber-tag -> nama tahap
+        self.stage_details = {}  # tahap dari event `rag_stage` -> field tambahan (mis. jumlah kandidat)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._retriever_runs.add(run_id)
+        if parent_run_id not in self._retriever_runs and self.retrieve_start is None:
+            self.retrieve_start = time.perf_counter()
+
+    def on_retriever_end(self, documents, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id not in self._retriever_runs:
+            self.retrieve_end = time.perf_counter()
+            self.documents = len(documents)
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name != "rag_stage":
+            return
+        ended = time.perf_counter()
+        data = dict(data)
+        stage = data.pop("stage")
+        self.extra_stages[stage] = [ended - data.pop("seconds"), ended]
+        self.stage_details[stage] = data
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        stage = next((tag[len("stage:"):] for tag in tags or () if tag.startswith("stage:")), None)
+        if stage:
+            self._tagged_runs[run_id] = stage
+            self.extra_stages[stage] = [time.perf_counter(), None]
+            return
+        self.llm_start = time.perf_counter()
+        prompt = "\n".join(str(message.content) for batch in messages for message in batch)
+        self.prompt_tokens = estimate_tokens(prompt)
+
+    def on_llm_new_token(self, token, *, run_id=None, **kwargs):
+        if run_id not in self._tagged_runs and self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        if run_id in self._tagged_runs:
+            self.extra_stages[self._tagged_runs.pop(run_id)][1] = time.perf_counter()
+            return
+        self.llm_end = time.perf_counter()
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                if usage.get("input_tokens"):
+                    self.prompt_tokens = usage["input_tokens"]
+                if usage.get("output_tokens"):
+                    self.answer_tokens = usage["output_tokens"]
+                elif self.answer_tokens is None:
+                    self.answer_tokens = estimate_tokens(generation.text)
+
+    def stages(self):
+        stages = {}
+        if self.retrieve_start is not None and self.retrieve_end is not None:
+            stages["retrieve"] = self.retrieve_end - self.retrieve_start
+        if self.retrieve_end is not None and self.llm_start is not None:
+            stages["prompt"] = self.llm_start - self.retrieve_end
+        if self.llm_start is not None and self.llm_end is not None:
+            stages["generate"] = self.llm_end - self.llm_start
+        if self.llm_start is not None and self.first_token is not None:
+            stages["first_token"] = self.first_token - self.llm_start
+        for stage, (started, ended) in self.extra_stages.items():
+            if ended is not None:
+                stages[stage] = ended - started
+        return stages
+
+    def finish(self, cache_hit=False, error=None):
+        total = time.perf_counter() - self.started
+        stages = self.stages()
+        stages["total"] = total
+        status = "error" if error else ("cache_hit" if cache_hit else "ok")
+        for stage, seconds in stages.items():
+            self.registry.observe("rag_query_stage_seconds", seconds, stage=stage, status=status)
+        self.registry.increment("rag_queries_total", status=status, **self.labels)
+        if not cache_hit and not error:
+            self.registry.observe("rag_retrieved_documents", self.documents, buckets=COUNT_BUCKETS)
+            if self.prompt_tokens:
+                self.registry.observe("rag_prompt_tokens", self.prompt_tokens, buckets=TOKEN_BUCKETS)
+                self.registry.increment("rag_llm_tokens_total", self.prompt_tokens, kind="input", **self.labels)
+            if self.answer_tokens:
+                self.registry.increment("rag_llm_tokens_total", self.answer_tokens, kind="output", **self.labels)
+        self.registry.log_event(
+            "query",
+            status=status,
+            **self.labels,
+            stages_ms={stage: round(seconds * 1000, 1) for stage, seconds in stages.items()},
+            documents=self.documents,
+            prompt_tokens=self.prompt_tokens,
+            answer_tokens=self.answer_tokens,
+            **self.stage_details,
+            error=str(error) if error else None,
+        )
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    REGISTRY.observe(name, value, buckets=buckets, **labels)
+
+
+def increment(name, amount=1, **labels):
+    REGISTRY.increment(name, amount, **labels)
+
+
+def log_event(event, **fields):
+    REGISTRY.log_event(event, **fields)
@@ -0,0 +1,84 @@
+"""
+Registry model embedding lokal, satu instance per proses server.
+
+Model sentence-transformers cukup berat untuk di-load (import torch + baca bobot),
+jadi setiap model di-load tepat sekali lalu dipakai bersama oleh semua session,
+job ingest, dan app yang jalan di proses yang sama. Loading dimulai di background
+thread begitu embeddings dibuat (`EMBEDDING_PRELOAD`, default aktif), sehingga halaman
+sudah tampil sementara model masih di-load, dan upload pertama tidak menunggu dari nol.
+
+Model dijalankan lewat `local_embedder.LocalEmbedder` (batching per panjang teks,
+thread diatur). `EMBEDDING_BACKEND`: torch | torch-int8 | onnx | onnx-int8 | openvino
+(onnx/openvino butuh sentence-transformers >= 3.2 dan `optimum`). Model lain (mis.
+cross-encoder `reranker.CrossEncoderScorer`) di-load lewat `factory`.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+from local_embedder import LocalEmbedder
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_PRELOAD = os.getenv("EMBEDDING_PRELOAD", "true").lower() in ("1", "true", "yes")
+LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+_models = {}  # (factory, model_name, backend) -> Future
+_lock = threading.Lock()
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+
+def load_model(model_name, backend=EMBEDDING_BACKEND, factory=LocalEmbedder):
+    """Mulai load model (`factory(model_name, backend)`) di background kalau belum; return Future-nya."""
+    key = (factory, model_name, backend)
+    with _lock:
+        future = _models.get(key)
+        if future is None:
+            future = _models[key] = _loader.submit(factory, model_name, backend)
+        return future
+
+
+def get_model(model_name, backend=EMBEDDING_BACKEND, factory=LocalEmbedder):
+    """Model yang sudah di-load (menunggu kalau masih loading). Load yang gagal bisa dicoba lagi."""
+    future = load_model(model_name, backend, factory)
+    try:
+        return future.result()
+    except Exception:
+        with _lock:
+            if _models.get((factory, model_name, backend)) is future:
+                del _models[(factory, model_name, backend)]
+        raise
+
+
+class SharedEmbeddings(Embeddings):
+    """
+    Proxy ringan ke model di registry: membuat objek ini tidak memblokir,
+    model baru ditunggu saat embed pertama.
+    """
+
+    def __init__(self, model_name, backend=EMBEDDING_BACKEND, preload=EMBEDDING_PRELOAD):
+        self.model_name = model_name
+        self.backend = backend
+        if preload:
+            load_model(model_name, backend)
+
+    @property
+    def model(self):
+        return get_model(self.model_name, self.backend)
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+@lru_cache(maxsize=None)
+def get_local_embeddings(model_name=LOCAL_EMBEDDING_MODEL):
+    """Embedding lokal bersama (+ cache disk) untuk satu model, sekali per proses."""
+    # Cache disk dipisah per backend: vector int8/onnx/openvino tidak identik dengan torch float32
+    cache_name = model_name if EMBEDDING_BACKEND == "torch" else f"{model_name}@{EMBEDDING_BACKEND}"
+    return CachedEmbeddings(SharedEmbeddings(model_name), model_name=cache_name)
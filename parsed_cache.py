@@ -0,0 +1,191 @@
+"""
+Cache hasil parsing PDF (teks per halaman), terpisah dari embedding & vector store.
+
+Extract teks (`pdf_parser`) adalah tahap CPU paling lambat untuk PDF besar. Tanpa cache,
+setiap ganti setting chunking/embedding atau upload ulang file yang sama berarti parse
+ulang dari PDF. Di sini teks setiap halaman disimpan sekali per (hash isi file, versi
+parser), jadi:
+
+- upload ulang file yang sama (nama boleh beda) langsung mulai dari teks di cache,
+- eksperimen chunking/embedding dan `rebuild_index.py` tidak perlu membuka PDF sama sekali.
+
+Format per file (`PARSED_CACHE_DIR/<versi parser>/<hash file>/`):
+- `text.bin`: teks UTF-8 semua halaman disambung (dibaca lewat memory map, halaman
+  di-decode satu per satu, jadi PDF ribuan halaman tidak dimuat utuh ke memori),
+- `offsets.npy`: offset byte awal setiap halaman (int64, panjang = halaman + 1),
+- `meta.json`: jumlah halaman/karakter, versi parser, dan nama file yang pernah memakai isi ini.
+
+Versi parser (`pdf_parser.PARSER_VERSION`) ikut di path: upgrade pypdf atau perubahan cara
+extract otomatis membuat entry baru, bukan memakai teks lama. Entry ditulis ke direktori
+sementara lalu di-rename (atomic), jadi proses yang crash tidak meninggalkan entry setengah jadi.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from datetime import datetime
+
+import numpy as np
+from langchain_core.documents import Document
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".rag_cache")
+PARSED_CACHE = os.getenv("PARSED_CACHE", "true").lower() in ("1", "true", "yes")
+PARSED_CACHE_DIR = os.getenv("PARSED_CACHE_DIR", os.path.join(CACHE_DIR, "parsed"))
+
+_meta_lock = threading.Lock()
+
+
+def _version_dir(parser_version):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", parser_version)
+
+
+class CachedPages:
+    """Teks halaman satu file dari cache (memory-mapped)."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        text_path = os.path.join(path, "text.bin")
+        # np.memmap tidak bisa memetakan file kosong (PDF hasil scan tanpa teks)
+        self._text = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def page_text(self, page):
+        start, stop = int(self.offsets[page]), int(self.offsets[page + 1])
+        return bytes(self._text[start:stop]).decode("utf-8")
+
+    def documents(self, source_file):
+        """`Document` per halaman dengan metadata sama seperti `pdf_parser` (source, page, total_pages)."""
+        total_pages = len(self)
+        for page in range(total_pages):
+            yield Document(
+                page_content=self.page_text(page),
+                metadata={"source": source_file, "page": page, "total_pages": total_pages},
+            )
+
+
+class PageCacheWriter:
+    """
+    Menulis entry cache satu file halaman demi halaman (urut), lalu `commit()`.
+    Tanpa `commit()` (mis. parsing gagal di tengah) panggil `abort()`: tidak ada entry yang tersimpan.
+    """
+
+    def __init__(self, cache, file_hash, source_file):
+        self.cache = cache
+        self.file_hash = file_hash
+        self.source_file = source_file
+        self.final_path = cache.entry_path(file_hash)
+        self.tmp_path = f"{self.final_path}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.tmp_path)
+        self._text = open(os.path.join(self.tmp_path, "text.bin"), "wb")
+        self.offsets = [0]
+        self.characters = 0
+
+    def add(self, text):
+        data = text.encode("utf-8")
+        self._text.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.characters += len(text)
+
+    def commit(self):
+        self._text.close()
+        np.save(os.path.join(self.tmp_path, "offsets.npy"), np.asarray(self.offsets, dtype=np.int64))
+        meta = {
+            "file_hash": self.file_hash,
+            "parser_version": self.cache.parser_version,
+            "pages": len(self.offsets) - 1,
+            "characters": self.characters,
+            "bytes": self.offsets[-1],
+            "sources": [self.source_file],
+            "created_at": datetime.now().isoformat(),
+        }
+        with open(os.path.join(self.tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        try:
+            os.replace(self.tmp_path, self.final_path)
+        except OSError:
+            # Proses/job lain sudah menulis entry yang sama lebih dulu: isinya identik
+            shutil.rmtree(self.tmp_path, ignore_errors=True)
+            self.cache.add_source(self.file_hash, self.source_file)
+
+    def abort(self):
+        if not self._text.closed:
+            self._text.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class ParsedPageCache:
+    """Cache teks halaman per (hash file, versi parser) di disk, aman dipakai beberapa thread/proses."""
+
+    def __init__(self, parser_version, root=PARSED_CACHE_DIR):
+        self.parser_version = parser_version
+        self.root = os.path.join(root, _version_dir(parser_version))
+        os.makedirs(self.root, exist_ok=True)
+
+    def entry_path(self, file_hash):
+        if not re.fullmatch(r"[0-9a-f]{64}", file_hash):
+            raise ValueError(f"Hash file tidak valid: {file_hash}")
+        return os.path.join(self.root, file_hash)
+
+    def _read_meta(self, file_hash):
+        try:
+            with open(os.path.join(self.entry_path(file_hash), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def open(self, file_hash):
+        """`CachedPages` untuk file ini, atau None kalau belum ada di cache."""
+        meta = self._read_meta(file_hash)
+        if meta is None:
+            return None
+        return CachedPages(self.entry_path(file_hash), meta)
+
+    def writer(self, file_hash, source_file):
+        return PageCacheWriter(self, file_hash, source_file)
+
+    def add_source(self, file_hash, source_file):
+        """Catat nama file lain untuk isi yang sama (dipakai `rebuild_index.py` mencari file per nama)."""
+        with _meta_lock:
+            meta = self._read_meta(file_hash)
+            if meta is None or source_file in meta["sources"]:
+                return
+            meta["sources"].append(source_file)
+            path = os.path.join(self.entry_path(file_hash), "meta.json")
+            tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, path)
+
+    def entries(self):
+        """Metadata semua entry versi parser ini (urut waktu dibuat)."""
+        entries = []
+        for name in os.listdir(self.root):
+            if re.fullmatch(r"[0-9a-f]{64}", name):
+                meta = self._read_meta(name)
+                if meta is not None:
+                    entries.append(meta)
+        return sorted(entries, key=lambda meta: meta["created_at"])
+
+    def find_source(self, source_file):
+        """Hash file terbaru yang pernah diupload dengan nama `source_file`, atau None."""
+        matches = [meta["file_hash"] for meta in self.entries() if source_file in meta["sources"]]
+        return matches[-1] if matches else None
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_parsed_cache(parser_version, root=PARSED_CACHE_DIR):
+    """Satu `ParsedPageCache` per (versi parser, direktori) per proses."""
+    with _caches_lock:
+        key = (parser_version, root)
+        if key not in _caches:
+            _caches[key] = ParsedPageCache(parser_version, root)
+        return _caches[key]
@@ -0,0 +1,166 @@
+"""
+Parsing PDF paralel langsung dari bytes hasil upload.
+
+Pengganti `PyPDFLoader(tmp_path).load()`: tidak perlu tulis ke NamedTemporaryFile
+lalu baca ulang, dan halaman-halamannya di-extract oleh process pool (multi-core),
+bukan satu per satu di satu thread. Hasilnya tetap `Document` per halaman
+dengan metadata `source` dan `page` seperti PyPDFLoader, sebagai list (`parse_pdfs`)
+atau streaming per halaman (`iter_pdf_pages`, dipakai `ingest_pipeline`).
+
+Teks hasil extract disimpan di `parsed_cache` (per hash file + `PARSER_VERSION`): file yang
+isinya sudah pernah di-parse tidak dibuka lagi dengan pypdf. Matikan dengan `PARSED_CACHE=false`.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pypdf
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from ingest_ledger import sha256_bytes
+from parsed_cache import PARSED_CACHE, PARSED_CACHE_DIR, get_parsed_cache
+
+PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+MIN_PAGES_PER_TASK = 8
+# Naikkan EXTRACTOR_VERSION kalau cara extract teks (`_extract_pages`) berubah: entry cache lama tidak dipakai lagi
+EXTRACTOR_VERSION = 1
+PARSER_VERSION = f"pypdf-{pypdf.__version__}-v{EXTRACTOR_VERSION}"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """Process pool untuk parsing, dibuat sekali per proses server."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" karena proses Streamlit sudah punya banyak thread (fork tidak aman)
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _extract_pages(file_bytes, start, stop):
+    # Jalan di proses worker: setiap task buka reader sendiri dari bytes
+    reader = PdfReader(io.BytesIO(file_bytes))
+    return start, [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _page_ranges(total_pages, workers):
+    # Task cukup besar supaya bytes PDF tidak dikirim ke worker terlalu sering,
+    # tapi cukup banyak supaya semua core kebagian
+    size = max(MIN_PAGES_PER_TASK, -(-total_pages // (workers * 2)))
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+
+def iter_pdf_pages(files, progress=None, use_cache=PARSED_CACHE, cache_dir=PARSED_CACHE_DIR):
+    """
+    Parse beberapa PDF, yield `Document` per halaman (urut per file lalu per halaman)
+    begitu halamannya siap. `files` = list (nama_file, bytes).
+
+    File yang sudah ada di cache parsing dikeluarkan lebih dulu (tanpa pypdf), sisanya
+    di-parse lalu teksnya ditulis ke cache sambil dialirkan.
+    Task yang jalan di process pool dibatasi 2 x jumlah worker, jadi teks halaman yang
+    menumpuk di memori tidak tergantung panjang PDF.
+    `progress(halaman_selesai, total_halaman)` dipanggil dari thread pemanggil.
+    """
+    cache = get_parsed_cache(PARSER_VERSION, cache_dir) if use_cache else None
+    cached, to_parse = [], []
+    for file_name, file_bytes in files:
+        file_hash = sha256_bytes(file_bytes) if cache else None
+        entry = cache.open(file_hash) if cache else None
+        if entry is not None:
+            cache.add_source(file_hash, file_name)
+            cached.append((file_name, entry))
+        else:
+            to_parse.append((file_name, file_bytes, file_hash))
+
+    page_counts = [len(PdfReader(io.BytesIO(file_bytes)).pages) for _, file_bytes, _ in to_parse]
+    total_pages = sum(len(entry) for _, entry in cached) + sum(page_counts)
+    done = 0
+
+    for file_name, entry in cached:
+        yield from entry.documents(file_name)
+        done += len(entry)
+        if progress:
+            progress(done, total_pages)
+
+    writers = [cache.writer(file_hash, file_name) if cache else None for file_name, _, file_hash in to_parse]
+    try:
+        for page_texts, f, start in _parse_pages(to_parse, page_counts):
+            done += len(page_texts)
+            if progress:
+                progress(done, total_pages)
+            if writers[f] is not None:
+                for text in page_texts:
+                    writers[f].add(text)
+                if start + len(page_texts) == page_counts[f]:
+                    writers[f].commit()
+                    writers[f] = None
+            yield from _page_documents(to_parse[f][0], start, page_texts, page_counts[f])
+    finally:
+        # Parsing berhenti di tengah: entry cache yang belum lengkap dibuang
+        for writer in writers:
+            if writer is not None:
+                writer.abort()
+
+
+def _parse_pages(files, page_counts):
+    """Yield (teks_halaman, indeks_file, halaman_awal) urut per file lalu per halaman."""
+    if sum(page_counts) < MIN_PAGES_PER_TASK * 2:
+        # PDF kecil: overhead process pool lebih mahal daripada parsing-nya
+        for f, (_, file_bytes, _) in enumerate(files):
+            _, page_texts = _extract_pages(file_bytes, 0, page_counts[f])
+            yield page_texts, f, 0
+        return
+
+    pool = get_parse_pool()
+    tasks = [
+        (f, start, stop)
+        for f in range(len(files))
+        for start, stop in _page_ranges(page_counts[f], PARSE_WORKERS)
+    ]
+    pending = deque()
+
+    def take_oldest():
+        # Hasil diambil berurutan: task paling lama ditunggu dulu, sisanya tetap jalan di pool
+        f, future = pending.popleft()
+        start, page_texts = future.result()
+        return page_texts, f, start
+
+    try:
+        for f, start, stop in tasks:
+            pending.append((f, pool.submit(_extract_pages, files[f][1], start, stop)))
+            if len(pending) >= PARSE_WORKERS * 2:
+                yield take_oldest()
+        while pending:
+            yield take_oldest()
+    finally:
+        # Pemanggil berhenti di tengah (mis. pipeline gagal): task yang belum jalan dibatalkan
+        for _, future in pending:
+            future.cancel()
+
+
+def _page_documents(file_name, start, page_texts, total_pages):
+    for offset, text in enumerate(page_texts):
+        yield Document(
+            page_content=text,
+            metadata={"source": file_name, "page": start + offset, "total_pages": total_pages},
+        )
+
+
+def parse_pdfs(files, progress=None, use_cache=PARSED_CACHE, cache_dir=PARSED_CACHE_DIR):
+    """
+    Parse beberapa PDF sekaligus. `files` = list (nama_file, bytes).
+
+    Return list `Document` (satu per halaman, urut per file lalu per halaman).
+    Untuk PDF besar pakai `iter_pdf_pages` supaya tidak semua halaman ditahan di memori.
+    """
+    return list(iter_pdf_pages(files, progress=progress, use_cache=use_cache, cache_dir=cache_dir))
@@ -0,0 +1,231 @@
+"""
+Index vector ter-kuantisasi (int8 atau biner) untuk pencarian tahap pertama, lalu
+kandidat teratas di-rescore dengan vector float asli.
+
+Vector float32 384 dimensi = 1536 byte per chunk. Dengan kuantisasi, yang disimpan di
+RAM hanya kodenya: int8 = 384 byte (+4 byte skala), biner = 48 byte. Vector float
+ditulis ke file sementara di disk (memory-mapped, satu file anonim per proses di
+`QUANTIZED_DIR`, terhapus otomatis) dan hanya baris kandidat yang dibaca saat rescoring, jadi satu node bisa memuat beberapa kali lebih banyak chunk. Isi chunk
+(teks + metadata) tetap diambil dari vector store aslinya, hanya untuk k hasil akhir.
+
+Mode diatur lewat `QUANTIZED_INDEX` (none | int8 | binary); jumlah kandidat yang
+di-rescore = k x `QUANTIZED_RESCORE_FACTOR`. Lihat `python -m bench.quantization_bench`
+untuk memilih titik recall vs kecepatan.
+"""
+import os
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", ".rag_cache")
+QUANTIZED_INDEX = os.getenv("QUANTIZED_INDEX", "none").lower()
+RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "4"))
+QUANTIZED_DIR = os.getenv("QUANTIZED_DIR", os.path.join(CACHE_DIR, "quantized"))
+
+MODES = ("int8", "binary")
+BLOCK_SIZE = 2048  # baris per blok saat scan: hasil konversi int8 -> float32 tetap muat di cache CPU
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distance(codes, query_code):
+    """Jarak Hamming antara setiap baris `codes` (uint8 packed) dan `query_code`."""
+    xor = np.bitwise_xor(codes, query_code)
+    if hasattr(np, "bitwise_count") and xor.shape[1] % 8 == 0:
+        # numpy >= 2.0: popcount per 64 bit
+        return np.bitwise_count(np.ascontiguousarray(xor).view(np.uint64)).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(matrix):
+    """Kuantisasi skalar per vector: kode int8 + skala float32 (nilai asli ~= kode x skala)."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.round(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(matrix):
+    """Satu bit per dimensi (tanda nilai), dipadatkan 8 dimensi per byte."""
+    return np.packbits(matrix > 0, axis=1)
+
+
+class QuantizedIndex:
+    """
+    Index brute-force di atas kode int8/biner + rescoring float.
+
+    `float_dir` = direktori untuk file vector float (memory-mapped saat rescoring); None = simpan di RAM.
+    Aman dipakai dari beberapa thread (add/remove/search di bawah satu lock).
+    """
+
+    def __init__(self, dimension, mode="int8", rescore_factor=RESCORE_FACTOR, float_dir=None):
+        if mode not in MODES:
+            raise ValueError(f"Mode kuantisasi tidak dikenal: {mode} (pilih {', '.join(MODES)})")
+        self.dimension = dimension
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+        self.float_dir = float_dir
+        self.ids = []
+        self._positions = {}
+        self._alive = np.zeros(0, dtype=bool)
+        if mode == "int8":
+            self._codes = np.zeros((0, dimension), dtype=np.int8)
+        else:
+            self._codes = np.zeros((0, (dimension + 7) // 8), dtype=np.uint8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._floats = np.zeros((0, dimension), dtype=np.float32)
+        self._floats_mapped = 0
+        self._float_file = None
+        if float_dir:
+            # File anonim per proses (dibangun ulang dari vector store setiap start, terhapus saat proses
+            # selesai): dua proses yang membuka koleksi yang sama tidak saling menimpa file-nya
+            os.makedirs(float_dir, exist_ok=True)
+            self._float_file = tempfile.TemporaryFile(dir=float_dir, prefix="floats-", suffix=".f32")
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    def memory_bytes(self):
+        """Byte di RAM untuk kode (+ skala); vector float tidak dihitung kalau disimpan di disk."""
+        total = self._codes.nbytes + self._scales.nbytes
+        return total if self._float_file is not None else total + self._floats.nbytes
+
+    def add(self, ids, vectors):
+        if not len(ids):
+            return
+        matrix = normalize_rows(vectors)
+        with self._lock:
+            for row_id in ids:
+                if row_id in self._positions:
+                    self._alive[self._positions[row_id]] = False
+            start = len(self.ids)
+            if self.mode == "int8":
+                codes, scales = quantize_int8(matrix)
+                self._scales = np.concatenate([self._scales, scales])
+            else:
+                codes = quantize_binary(matrix)
+            self._codes = np.concatenate([self._codes, codes])
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for offset, row_id in enumerate(ids):
+                self._positions[row_id] = start + offset
+            self.ids.extend(ids)
+            if self._float_file is not None:
+                self._float_file.seek(0, os.SEEK_END)
+                self._float_file.write(matrix.tobytes())
+                self._float_file.flush()
+            else:
+                self._floats = np.concatenate([self._floats, matrix])
+
+    def remove(self, ids):
+        with self._lock:
+            for row_id in ids:
+                position = self._positions.pop(row_id, None)
+                if position is not None:
+                    self._alive[position] = False
+
+    def _float_rows(self, positions):
+        if self._float_file is None:
+            return self._floats[positions]
+        if self._floats_mapped != len(self.ids):
+            self._floats = np.memmap(self._float_file, dtype=np.float32, mode="r", shape=(len(self.ids), self.dimension))
+            self._floats_mapped = len(self.ids)
+        return np.asarray(self._floats[positions])
+
+    def _approx_scores(self, query):
+        scores = np.empty(len(self._codes), dtype=np.float32)
+        if self.mode == "int8":
+            for start in range(0, len(self._codes), BLOCK_SIZE):
+                block = self._codes[start:start + BLOCK_SIZE].astype(np.float32)
+                scores[start:start + BLOCK_SIZE] = (block @ query) * self._scales[start:start + BLOCK_SIZE]
+        else:
+            query_code = quantize_binary(query[None, :])[0]
+            for start in range(0, len(self._codes), BLOCK_SIZE * 16):
+                distance = hamming_distance(self._codes[start:start + BLOCK_SIZE * 16], query_code)
+                scores[start:start + BLOCK_SIZE * 16] = -distance
+        scores[~self._alive] = -np.inf
+        return scores
+
+    def search(self, query_vector, k=4, rescore_factor=None):
+        """Return list (id, skor cosine float) untuk k hasil teratas setelah rescoring."""
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        with self._lock:
+            alive = int(self._alive.sum())
+            if not alive:
+                return []
+            k = min(k, alive)
+            n_candidates = min(alive, k * (rescore_factor or self.rescore_factor))
+            scores = self._approx_scores(query)
+            candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+            exact = self._float_rows(candidates) @ query
+            best = np.argsort(-exact)[:k]
+            return [(self.ids[candidates[i]], float(exact[i])) for i in best]
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Adapter LangChain: search lewat `QuantizedIndex`, lalu teks + metadata k hasil akhir
+    diambil dengan `fetch_documents(ids) -> {id: Document}` dari vector store aslinya.
+
+    `write_vectors(ids, texts, vectors, metadatas)` menyimpan chunk baru ke vector store aslinya
+    sekaligus ke `index` (mis. `ChromaCorpus.add`); dipakai `add_texts` / `add_documents`.
+    """
+
+    def __init__(self, index, embedding, fetch_documents, write_vectors):
+        self.index = index
+        self.embedding = embedding
+        self.fetch_documents = fetch_documents
+        self.write_vectors = write_vectors
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        hits = self.index.search(self.embedding.embed_query(query), k=k)
+        documents = self.fetch_documents([row_id for row_id, _ in hits])
+        return [(documents[row_id], score) for row_id, score in hits if row_id in documents]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas else [None] * len(texts)  # chromadb menolak metadata {}
+        self.write_vectors(ids, texts, self.embedding.embed_documents(texts), metadatas)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, mode="int8", **kwargs):
+        """Store ter-kuantisasi mandiri di RAM (teks + metadata disimpan di dict), tanpa vector store lain."""
+        texts = list(texts)
+        vectors = embedding.embed_documents(texts) if texts else [embedding.embed_query("")]
+        index = QuantizedIndex(len(vectors[0]), mode=mode)
+        documents = {}
+
+        def write_vectors(row_ids, row_texts, row_vectors, row_metadatas):
+            for row_id, text, metadata in zip(row_ids, row_texts, row_metadatas):
+                documents[row_id] = Document(id=row_id, page_content=text, metadata=metadata or {})
+            index.add(row_ids, row_vectors)
+
+        def fetch_documents(row_ids):
+            return {row_id: documents[row_id] for row_id in row_ids if row_id in documents}
+
+        store = cls(index, embedding, fetch_documents, write_vectors)
+        if texts:
+            ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+            write_vectors(ids, texts, vectors, list(metadatas) if metadatas else [{} for _ in texts])
+        return store
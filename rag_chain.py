@@ -0,0 +1,126 @@
+"""
+Helper untuk membangun dan menjalankan retrieval chain (RAG) di semua app.
+
+LLM, prompt, dan chain dibuat sekali per proses server lalu dipakai ulang oleh
+semua session/rerun Streamlit, jadi client Gemini (beserta koneksi HTTP/TLS-nya)
+tidak dibuat ulang di setiap pesan.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from context_packer import CONTEXT_TOKEN_BUDGET, PackedContextRetriever
+from hybrid_retriever import HybridRetriever
+from reranker import RERANK, RERANK_CANDIDATES, RERANK_TOP_N, RerankRetriever, load_scorer
+
+# Mode streaming: token jawaban langsung ditampilkan begitu keluar dari Gemini
+STREAM_ANSWER = os.getenv("STREAM_ANSWER", "true").lower() in ("1", "true", "yes")
+
+
+def stream_answer(retrieval_chain, inputs, response, config=None):
+    """
+    Generator potongan jawaban dari `retrieval_chain.stream(...)`, siap dipakai `st.write_stream`.
+
+    `response` (dict) diisi selama streaming dengan bentuk yang sama seperti hasil
+    `invoke`: "context" berisi dokumen hasil retrieval (tersedia sebelum token pertama),
+    "answer" berisi jawaban lengkap setelah stream selesai. `config` diteruskan ke `stream`
+    (mis. callbacks `metrics.QueryMetrics`).
+    """
+    parts = []
+    for chunk in retrieval_chain.stream(inputs, config=config):
+        if "context" in chunk:
+            response["context"] = chunk["context"]
+        if "answer" in chunk:
+            parts.append(chunk["answer"])
+            yield chunk["answer"]
+    response["answer"] = "".join(parts)
+
+
+# --- CACHE CHAIN PER PROSES ---
+MAX_CACHED_CHAINS = 32
+
+_chain_cache = OrderedDict()
+_chain_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_llm(model, temperature):
+    """Client Gemini dipakai bareng semua session (koneksinya ikut dipakai ulang)."""
+    # Import ditunda sampai pertanyaan pertama, supaya halaman tampil lebih cepat saat cold start
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature)
+
+
+@lru_cache(maxsize=64)
+def get_prompt(template):
+    return ChatPromptTemplate.from_template(template)
+
+
+def build_retriever(vector_store, search_type="similarity", search_kwargs=None, bm25_index=None,
+                    context_tokens=CONTEXT_TOKEN_BUDGET, rerank=RERANK):
+    """
+    Retriever yang dipakai chain: vector search biasa, atau hybrid (BM25 + vector, digabung RRF)
+    kalau `bm25_index` diberikan. Dengan `rerank`, retriever mengambil `RERANK_CANDIDATES`
+    kandidat lalu cross-encoder memilih maksimal `min(RERANK_TOP_N, k)` yang terbaik.
+    Hasilnya di-dedupe, digabung, dan di-pack ke `context_tokens` token (0 = tempel apa adanya).
+    """
+    search_kwargs = search_kwargs or {"k": 5}
+    top_n = search_kwargs["k"]
+    if rerank:
+        load_scorer()  # model mulai di-load di background, ditunggu saat rerank pertama
+        search_kwargs = {**search_kwargs, "k": max(RERANK_CANDIDATES, top_n)}
+    if bm25_index is not None:
+        extra_kwargs = {name: value for name, value in search_kwargs.items() if name != "k"}
+        retriever = HybridRetriever(
+            vector_store=vector_store,
+            bm25_index=bm25_index,
+            k=search_kwargs["k"],
+            fetch_k=max(10, search_kwargs["k"] * 2),
+            search_kwargs=extra_kwargs,
+        )
+    else:
+        retriever = vector_store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+    if rerank:
+        retriever = RerankRetriever(retriever=retriever, top_n=min(RERANK_TOP_N, top_n))
+    if context_tokens:
+        retriever = PackedContextRetriever(retriever=retriever, max_tokens=context_tokens)
+    return retriever
+
+
+def get_retrieval_chain(vector_store, prompt_template, model="gemini-2.0-flash", temperature=0.3,
+                        search_type="similarity", search_kwargs=None, bm25_index=None,
+                        context_tokens=CONTEXT_TOKEN_BUDGET, rerank=RERANK, llm=None):
+    """
+    Ambil retrieval chain dari cache, atau buat baru kalau kombinasi
+    (vector store, model, temperature, prompt, konfigurasi retriever) belum pernah dipakai.
+    Konfigurasi retriever: lihat `build_retriever`. `llm` menggantikan client Gemini
+    (mis. LLM stub di `bench.loadtest`).
+    """
+    search_kwargs = search_kwargs or {"k": 5}
+    key = (
+        id(vector_store), id(bm25_index), id(llm), model, temperature, prompt_template, context_tokens, rerank,
+        search_type, json.dumps(search_kwargs, sort_keys=True, default=str),
+    )
+    with _chain_lock:
+        if key in _chain_cache:
+            _chain_cache.move_to_end(key)
+            return _chain_cache[key][1]
+
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+    from langchain_classic.chains.retrieval import create_retrieval_chain
+
+    retriever = build_retriever(vector_store, search_type, search_kwargs, bm25_index, context_tokens, rerank)
+    document_chain = create_stuff_documents_chain(llm or get_llm(model, temperature), get_prompt(prompt_template))
+    retrieval_chain = create_retrieval_chain(retriever, document_chain)
+
+    with _chain_lock:
+        # vector_store, bm25_index & llm ikut disimpan supaya id()-nya tidak dipakai ulang objek lain selama masih di cache
+        _chain_cache[key] = ((vector_store, bm25_index, llm), retrieval_chain)
+        while len(_chain_cache) > MAX_CACHED_CHAINS:
+            _chain_cache.popitem(last=False)
+    return retrieval_chain
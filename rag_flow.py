@@ -0,0 +1,200 @@
+"""
+Alur ingest & tanya-jawab tanpa UI: `process_pdf` dipakai app4 dan `bench/loadtest.py`,
+`ChatTurn` dipakai app1-4 dan load test.
+
+Supaya load test (dan metrics) mengukur persis langkah yang dijalankan app, langkah-langkahnya
+ada di sini; app hanya menambahkan tampilan Streamlit di sekitarnya:
+
+- `process_pdf`: satu job upload di `IngestionQueue` (hash file -> parse -> chunk ->
+  bandingkan dengan ledger -> embed -> insert -> hapus chunk lama),
+- `ChatTurn`: satu pesan chat (rewrite pertanyaan lanjutan -> cache jawaban -> retrieval +
+  generate -> simpan cache jawaban, metrics & riwayat).
+
+`store` adalah `tenancy.TenantStore`, atau pengganti dengan atribut yang sama
+(`bench.stubs.MemoryTenantStore`): `tenant`, `vector_store`, `writer.write/delete`, `row_id`, `tag`.
+"""
+from datetime import datetime
+
+from chat_memory import rewrite_query
+from chunker import build_text_splitter
+from ingest_ledger import sha256_bytes, sha256_text
+from ingest_pipeline import iter_chunk_batches, run_pipeline
+from metadata_filter import filter_key
+from metrics import REGISTRY
+from parsed_cache import PARSED_CACHE
+from pdf_parser import iter_pdf_pages
+from rag_chain import stream_answer
+from tidb_store import timing_summary
+
+
+def process_pdf(job, file_name, file_bytes, store, embeddings, ledger, answer_cache=None, bm25_index=None,
+                use_cache=PARSED_CACHE, metrics=REGISTRY):
+    # Jalan di background worker: progress lewat `job`, jangan panggil st.* di sini
+    # a. Hitung hash isi file. Kalau file yang sama persis sudah pernah masuk, skip.
+    job.report("parse")
+    file_hash = sha256_bytes(file_bytes)
+    existing_file = ledger.find_file(file_hash)
+    if existing_file is not None:
+        job.message = f"Sudah pernah diproses sebagai {existing_file}, tidak perlu di-embed ulang."
+        return None
+
+    # Pipeline streaming: halaman -> chunk -> embedding -> insert per batch, tiap tahap di thread
+    # sendiri dengan antrian terbatas (memori tetap kecil walau PDF ribuan halaman)
+    # b. Baca PDF langsung dari bytes upload, halaman di-extract paralel di process pool
+    #    dan dialirkan per halaman
+    pages = iter_pdf_pages(
+        [(file_name, file_bytes)], progress=lambda done, total: job.report("parse", done, total), use_cache=use_cache
+    )
+
+    # c. Pecah teks (Chunks)
+    # Dipotong per token di batas heading/paragraf/kalimat, dengan page + offset di metadata
+    text_splitter = build_text_splitter()
+    known_chunks = ledger.known_chunks(file_name)
+    chunk_rows = {}
+    counts = {"chunks": 0, "new": 0, "embedded": 0}
+
+    # d. Tambahkan metadata untuk tracking (chunk dengan isi kembar cukup disimpan sekali),
+    # e. lalu bandingkan dengan ledger: hanya chunk yang berubah yang di-embed & di-insert
+    def select_new(chunks):
+        new_splits = []
+        for doc in chunks:
+            chunk_id = counts["chunks"]
+            counts["chunks"] += 1
+            chunk_hash = sha256_text(doc.page_content)
+            if chunk_hash in chunk_rows:
+                continue
+            chunk_rows[chunk_hash] = store.row_id(file_name, chunk_hash)
+            doc.metadata["source_file"] = file_name
+            doc.metadata["chunk_id"] = chunk_id
+            doc.metadata["chunk_hash"] = chunk_hash
+            doc.metadata["upload_time"] = datetime.now().isoformat()
+            store.tag(doc.metadata)
+            if chunk_hash not in known_chunks:
+                new_splits.append(doc)
+        counts["new"] += len(new_splits)
+        job.report("split", counts["chunks"], counts["chunks"])
+        return new_splits or None
+
+    # f. Embedding per batch
+    def embed(new_splits):
+        texts = [doc.page_content for doc in new_splits]
+        vectors = embeddings.embed_documents(texts)
+        counts["embedded"] += len(texts)
+        job.report("embed", counts["embedded"], counts["new"])
+        return new_splits, texts, vectors
+
+    # g. Simpan ke vector store (multi-row INSERT per batch) sambil batch berikutnya di-parse & di-embed
+    insert_timings = []
+    inserted = 0
+    for new_splits, texts, vectors in run_pipeline(
+        iter_chunk_batches(pages, text_splitter), select_new, embed
+    ):
+        new_ids = [chunk_rows[doc.metadata["chunk_hash"]] for doc in new_splits]
+        metadatas = [doc.metadata for doc in new_splits]
+        insert_timings.extend(store.writer.write(ids=new_ids, texts=texts, embeddings=vectors, metadatas=metadatas))
+        if bm25_index is not None:
+            bm25_index.add(new_ids, texts, metadatas)
+        inserted += len(new_ids)
+        job.report("insert", inserted, counts["new"])
+
+    # Chunk versi lama yang sudah tidak ada di file terbaru dihapus setelah semua chunk baru masuk
+    stale_row_ids = [row_id for chunk_hash, row_id in known_chunks.items() if chunk_hash not in chunk_rows]
+    if stale_row_ids:
+        store.writer.delete(stale_row_ids)
+        if bm25_index is not None:
+            bm25_index.remove(stale_row_ids)
+    ledger.record_file(file_name, file_hash, chunk_rows)
+    metrics.increment("rag_ingested_chunks_total", inserted, tenant=store.tenant)
+
+    # Isi korpus berubah, jawaban lama di cache bisa jadi sudah tidak akurat
+    if answer_cache is not None and (inserted or stale_row_ids):
+        answer_cache.invalidate()
+
+    # h. Info untuk upload history (dipasang ke session setelah job selesai)
+    job.message = f"{inserted} chunk baru dari {counts['chunks']} chunk tersimpan ke database"
+    if insert_timings:
+        job.message += f" ({timing_summary(insert_timings)})"
+    return {
+        "filename": file_name,
+        "size": f"{len(file_bytes) / 1024:.2f} KB",
+        "chunks": counts["chunks"],
+        "new_chunks": inserted,
+        "tenant": store.tenant,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+class ChatTurn:
+    """
+    Satu pesan chat. Pertanyaan user sudah ditambahkan ke `memory` oleh pemanggil.
+
+        turn = ChatTurn(memory, question, embeddings, helper_llm, answer_cache, search_filter, tracker)
+        if turn.prepare() is None:                       # rewrite + cek cache jawaban
+            answer = "".join(turn.stream(retrieval_chain))   # atau turn.invoke(retrieval_chain)
+        else:
+            answer = turn.cached["answer"]
+        turn.finish(answer)                              # cache jawaban, metrics, riwayat
+
+    `helper_llm` dipakai untuk rewrite & ringkasan riwayat. `embeddings` hanya dipakai untuk
+    kunci cache jawaban (boleh None tanpa `answer_cache`). `tracker` (`metrics.QueryMetrics`)
+    opsional, `finish` mencatatnya (kalau gagal di tengah, pemanggil memanggil `tracker.finish(error=...)`).
+    """
+
+    def __init__(self, memory, question, embeddings, helper_llm, answer_cache=None, search_filter=None,
+                 tracker=None):
+        self.memory = memory
+        self.question = question
+        self.embeddings = embeddings
+        self.helper_llm = helper_llm
+        self.answer_cache = answer_cache
+        self.search_filter = search_filter
+        self.tracker = tracker
+        self.config = {"callbacks": [tracker]} if tracker is not None else {}
+        self.scope = filter_key(search_filter)
+        self.search_query = question
+        self.query_vector = None
+        self.cache_generation = None
+        self.cached = None
+        self.response = {}
+
+    def prepare(self):
+        """Rewrite pertanyaan lanjutan, lalu cek cache jawaban. Return entry cache (atau None)."""
+        # Pertanyaan lanjutan ("cara mencegahnya?") ditulis ulang jadi pertanyaan mandiri dari riwayat chat
+        self.search_query = rewrite_query(self.helper_llm, self.memory, self.question, config=self.config)
+        if self.answer_cache is not None:
+            self.cache_generation = self.answer_cache.generation
+            self.query_vector = self.embeddings.embed_query(self.search_query)
+            # Cakupan dokumen ikut jadi bagian kunci cache jawaban
+            self.cached = self.answer_cache.lookup(self.query_vector, scope=self.scope)
+        return self.cached
+
+    def stream(self, retrieval_chain):
+        """Generator potongan jawaban (untuk `st.write_stream`); dokumen hasil retrieval masuk ke `response`."""
+        return stream_answer(retrieval_chain, {"input": self.search_query}, self.response, config=self.config)
+
+    def invoke(self, retrieval_chain):
+        self.response = retrieval_chain.invoke({"input": self.search_query}, config=self.config)
+        return self.response["answer"]
+
+    @property
+    def sources(self):
+        """Nama file sumber jawaban (urut kemunculan di konteks)."""
+        if self.cached is not None:
+            return self.cached["sources"]
+        sources = []
+        for doc in self.response.get("context", []):
+            source_file = doc.metadata.get("source_file", "Unknown")
+            if source_file not in sources:
+                sources.append(source_file)
+        return sources
+
+    def finish(self, answer):
+        if self.cached is None and self.answer_cache is not None:
+            self.answer_cache.store(
+                self.search_query, self.query_vector, answer, self.sources, self.cache_generation, scope=self.scope
+            )
+        if self.tracker is not None:
+            self.tracker.finish(cache_hit=self.cached is not None)
+        self.memory.append(("assistant", answer))
+        # Pesan lama yang tergeser diringkas (memori per session tetap terbatas)
+        self.memory.compact(self.helper_llm)
@@ -0,0 +1,226 @@
+"""
+Bangun ulang index vector dari cache parsing (`parsed_cache`), tanpa membuka PDF sama sekali.
+
+Dipakai setelah setting chunking (`CHUNKER`, `CHUNK_TOKENS`, ...) atau model/backend
+embedding berubah: semua chunk dipotong ulang dari teks halaman di cache, di-embed ulang,
+di-upsert, lalu chunk versi lama yang sudah tidak ada dihapus.
+
+    python rebuild_index.py chroma --collection app2_documents   # koleksi Chroma app1-3
+    python rebuild_index.py tidb                                  # semua tenant app4 (dari ledger ingest)
+    python rebuild_index.py tidb --tenant tim_soc
+
+File yang teksnya tidak ada di cache (di-ingest sebelum cache ada, atau versi parser sudah
+berubah) dilewati dan dilaporkan; upload ulang file itu sekali untuk mengisi cache.
+Setelah rebuild, restart app supaya index BM25 & cache jawaban di memori dibangun ulang.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+from chunker import build_text_splitter
+from ingest_ledger import IngestLedger, chunk_row_id, sha256_text
+from ingest_pipeline import iter_chunk_batches, run_pipeline
+from parsed_cache import get_parsed_cache
+from pdf_parser import PARSER_VERSION
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def build_embeddings(kind):
+    """Embedding yang sama dengan app-nya: Google (app1) atau model lokal (app2-4)."""
+    if kind == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        from batch_embedder import BatchEmbedder, get_rate_limiter
+        from embedding_cache import CachedEmbeddings
+
+        model = "models/embedding-001"
+        return CachedEmbeddings(
+            BatchEmbedder(GoogleGenerativeAIEmbeddings(model=model), limiter=get_rate_limiter(model)),
+            model_name=model,
+        )
+    from model_registry import LOCAL_EMBEDDING_MODEL, get_local_embeddings
+
+    return get_local_embeddings(LOCAL_EMBEDDING_MODEL)
+
+
+def rebuild_chroma(args, cache):
+    from chroma_store import ChromaCorpus
+
+    kind = args.embeddings or ("google" if args.collection == "app1_documents" else "local")
+    embeddings = build_embeddings(kind)
+    corpus = ChromaCorpus(args.collection, embeddings)
+
+    # ID chunk yang sekarang ada di koleksi, per file sumber
+    old_ids = defaultdict(set)
+    for ids, _, metadatas in corpus.iter_documents(include=("metadatas",)):
+        for row_id, metadata in zip(ids, metadatas):
+            old_ids[(metadata or {}).get("source")].add(row_id)
+    if args.all:
+        sources = sorted({source for meta in cache.entries() for source in meta["sources"]})
+    else:
+        sources = sorted(source for source in old_ids if source)
+
+    summary = {"files": 0, "chunks": 0, "deleted": 0, "skipped": []}
+    for source in sources:
+        file_hash = cache.find_source(source)
+        entry = cache.open(file_hash) if file_hash else None
+        if entry is None:
+            summary["skipped"].append(source)
+            continue
+        started = time.perf_counter()
+        splitter = build_text_splitter()
+        new_ids = set()
+
+        def select(chunks):
+            batch = {}
+            for doc in chunks:
+                row_id = chunk_row_id(source, sha256_text(doc.page_content))
+                if row_id not in new_ids:
+                    new_ids.add(row_id)
+                    batch[row_id] = doc
+            return (list(batch), list(batch.values())) if batch else None
+
+        def embed(batch):
+            ids, docs = batch
+            texts = [doc.page_content for doc in docs]
+            return ids, texts, embeddings.embed_documents(texts), [doc.metadata for doc in docs]
+
+        for ids, texts, vectors, metadatas in run_pipeline(
+            iter_chunk_batches(entry.documents(source), splitter), select, embed
+        ):
+            corpus.add(ids, texts, vectors, metadatas)
+        stale = sorted(old_ids.get(source, set()) - new_ids)
+        corpus.delete(stale)
+        summary["files"] += 1
+        summary["chunks"] += len(new_ids)
+        summary["deleted"] += len(stale)
+        log(f"{source}: {len(entry)} halaman -> {len(new_ids)} chunk, {len(stale)} chunk lama dihapus "
+            f"({time.perf_counter() - started:.1f} detik)")
+    return summary
+
+
+def tidb_connection_string():
+    # Sama seperti `init_tidb_connection` di app4
+    host = os.getenv("TIDB_HOST")
+    user = os.getenv("TIDB_USER")
+    password = os.getenv("TIDB_PASSWORD")
+    if not all([host, user, password]):
+        raise SystemExit("TIDB_HOST, TIDB_USER, TIDB_PASSWORD belum di-set (atau pakai --tidb-url)")
+    return (
+        f"mysql+pymysql://{user}:{password}@{host}:{os.getenv('TIDB_PORT', '4000')}/{os.getenv('TIDB_DATABASE', 'test')}"
+        "?ssl_ca=/etc/ssl/cert.pem&ssl_verify_cert=true&ssl_verify_identity=true"
+    )
+
+
+def rebuild_tidb(args, cache):
+    from tenancy import TENANT_DEFAULT, TENANT_MODE, TenantStore, normalize_tenant, tenant_for_namespace
+    from tidb_store import VECTOR_INDEX, BulkWriter
+
+    embeddings = build_embeddings("local")
+    base_writer = BulkWriter(args.tidb_url or tidb_connection_string(), args.table,
+                             tenant_column=TENANT_MODE == "column")
+    if VECTOR_INDEX:
+        base_writer.ensure_vector_index()
+    if TENANT_MODE == "column":
+        base_writer.ensure_tenant_column(default_tenant=TENANT_DEFAULT)
+
+    # Tenant & file diambil dari ledger ingest app4 (namespace per tenant)
+    tenants = [tenant_for_namespace(args.table, namespace) for namespace in IngestLedger().namespaces()]
+    tenants = [tenant for tenant in tenants if tenant is not None]
+    if args.tenant:
+        tenants = [tenant for tenant in tenants if tenant == normalize_tenant(args.tenant)]
+
+    summary = {"files": 0, "chunks": 0, "deleted": 0, "skipped": []}
+    for tenant in tenants:
+        store = TenantStore(base_writer, embeddings, tenant)
+        ledger = IngestLedger(namespace=store.namespace)
+        for source_file, file_hash, updated_at in ledger.files():
+            entry = cache.open(file_hash)
+            if entry is None:
+                summary["skipped"].append(f"{tenant}/{source_file}")
+                continue
+            started = time.perf_counter()
+            splitter = build_text_splitter()
+            known_chunks = ledger.known_chunks(source_file)
+            chunk_rows = {}
+            counts = {"chunks": 0}
+
+            # Metadata sama seperti `process_pdf` di app4; upload_time dipertahankan dari ledger
+            def select(chunks):
+                batch = []
+                for doc in chunks:
+                    chunk_id = counts["chunks"]
+                    counts["chunks"] += 1
+                    chunk_hash = sha256_text(doc.page_content)
+                    if chunk_hash in chunk_rows:
+                        continue
+                    chunk_rows[chunk_hash] = store.row_id(source_file, chunk_hash)
+                    doc.metadata["source_file"] = source_file
+                    doc.metadata["chunk_id"] = chunk_id
+                    doc.metadata["chunk_hash"] = chunk_hash
+                    doc.metadata["upload_time"] = updated_at
+                    store.tag(doc.metadata)
+                    batch.append(doc)
+                return batch or None
+
+            def embed(docs):
+                texts = [doc.page_content for doc in docs]
+                return docs, texts, embeddings.embed_documents(texts)
+
+            for docs, texts, vectors in run_pipeline(
+                iter_chunk_batches(entry.documents(source_file), splitter), select, embed
+            ):
+                store.writer.write(
+                    ids=[chunk_rows[doc.metadata["chunk_hash"]] for doc in docs],
+                    texts=texts, embeddings=vectors, metadatas=[doc.metadata for doc in docs],
+                )
+            stale = [row_id for chunk_hash, row_id in known_chunks.items() if chunk_hash not in chunk_rows]
+            store.writer.delete(stale)
+            ledger.record_file(source_file, file_hash, chunk_rows, updated_at=updated_at)
+            summary["files"] += 1
+            summary["chunks"] += len(chunk_rows)
+            summary["deleted"] += len(stale)
+            log(f"[{tenant}] {source_file}: {len(entry)} halaman -> {len(chunk_rows)} chunk, "
+                f"{len(stale)} chunk lama dihapus ({time.perf_counter() - started:.1f} detik)")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bangun ulang index vector dari cache parsing PDF (tanpa parse ulang).")
+    targets = parser.add_subparsers(dest="target", required=True)
+
+    chroma = targets.add_parser("chroma", help="Koleksi Chroma persistent (app1-3)")
+    chroma.add_argument("--collection", required=True, help="mis. app1_documents, app2_documents, app3_documents")
+    chroma.add_argument("--embeddings", choices=("local", "google"),
+                        help="Default: google untuk app1_documents, local untuk yang lain")
+    chroma.add_argument("--all", action="store_true",
+                        help="Index semua file di cache, bukan hanya file yang sudah ada di koleksi")
+
+    tidb = targets.add_parser("tidb", help="Tabel vector TiDB app4 (semua tenant di ledger ingest)")
+    tidb.add_argument("--table", default=os.getenv("TIDB_TABLE", "rag_documents"))
+    tidb.add_argument("--tenant", help="Hanya tenant ini")
+    tidb.add_argument("--tidb-url", help="SQLAlchemy URL (default: dari TIDB_HOST/TIDB_USER/... di .env)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    cache = get_parsed_cache(PARSER_VERSION)
+    started = time.perf_counter()
+    summary = rebuild_chroma(args, cache) if args.target == "chroma" else rebuild_tidb(args, cache)
+    log(f"Selesai: {summary['files']} file, {summary['chunks']} chunk, {summary['deleted']} chunk lama dihapus "
+        f"dalam {time.perf_counter() - started:.1f} detik")
+    if summary["skipped"]:
+        log(f"Tidak ada di cache parsing (upload ulang sekali): {', '.join(summary['skipped'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Rerank hasil retrieval dengan cross-encoder lokal (CPU) sebelum masuk prompt.
+
+Vector search (dan BM25) memberi ranking kasar: top-5 cosine sering berisi chunk yang
+hanya mirip topiknya. Cross-encoder membaca pasangan (pertanyaan, chunk) sekaligus,
+jadi skornya jauh lebih tepat, tapi terlalu mahal untuk seluruh korpus. Alurnya:
+
+1. retriever mengambil `RERANK_CANDIDATES` kandidat (over-fetch),
+2. kandidat diberi skor per batch, urut ranking tahap pertama; begitu skor kandidat
+   terdalam yang baru dinilai sudah jelas di bawah skor terbaik (selisih > `RERANK_MARGIN`),
+   kandidat yang lebih dalam tidak dinilai lagi (kedalaman kandidat menyusut otomatis),
+3. yang dikirim ke LLM hanya kandidat terbaik yang skornya masih dekat skor teratas,
+   maksimal `RERANK_TOP_N`: kalau satu-dua chunk jelas paling relevan, hanya itu yang dikirim.
+
+Prompt yang lebih pendek = generate lebih cepat; tahap `rerank` dicatat terpisah di
+`metrics.QueryMetrics` (event `rag_stage`), jadi efeknya terlihat di metrics/benchmark.
+Aktifkan dengan `RERANK=true`. Model di-load sekali per proses lewat `model_registry`.
+"""
+import math
+import os
+import time
+from typing import Any
+
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from local_embedder import length_buckets
+from model_registry import get_model, load_model
+
+RERANK = os.getenv("RERANK", "false").lower() in ("1", "true", "yes")
+# Multilingual (dokumen & pertanyaan umumnya bahasa Indonesia); cross-encoder/ms-marco-MiniLM-L-6-v2 lebih cepat untuk teks Inggris
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch").lower()  # torch | torch-int8 | onnx | openvino
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+RERANK_MARGIN = float(os.getenv("RERANK_MARGIN", "0.3"))  # selisih skor (0-1) yang dianggap "jelas terpisah"
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+
+BACKENDS = ("torch", "torch-int8", "onnx", "openvino")
+
+
+class CrossEncoderScorer:
+    """Cross-encoder sentence-transformers di CPU; `score` mengembalikan relevansi 0-1 (sigmoid logit)."""
+
+    def __init__(self, model_name, backend="torch", batch_size=RERANK_BATCH_SIZE):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend rerank tidak dikenal: {backend} (pilih {', '.join(BACKENDS)})")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.model = self._load()
+
+    def _load(self):
+        # Import berat (torch, transformers) hanya saat model benar-benar di-load
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        if self.backend in ("torch", "torch-int8"):
+            model = CrossEncoder(self.model_name, device="cpu")
+            if self.backend == "torch-int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            return model
+        return CrossEncoder(self.model_name, device="cpu", backend=self.backend)
+
+    def score(self, query, texts):
+        if not texts:
+            return []
+        import torch
+
+        scores = [0.0] * len(texts)
+        # Pasangan dengan panjang mirip satu batch (padding minimal), seperti LocalEmbedder
+        for batch in length_buckets(texts, self.batch_size):
+            # Logit mentah lalu sigmoid sendiri: skala skor tidak bergantung activation bawaan model
+            logits = self.model.predict(
+                [(query, texts[i]) for i in batch], batch_size=len(batch),
+                activation_fn=torch.nn.Identity(), show_progress_bar=False,
+            )
+            for i, logit in zip(batch, logits):
+                scores[i] = 1 / (1 + math.exp(-float(logit)))
+        return scores
+
+
+def get_scorer(model_name=RERANK_MODEL, backend=RERANK_BACKEND):
+    return get_model(model_name, backend, factory=CrossEncoderScorer)
+
+
+def load_scorer(model_name=RERANK_MODEL, backend=RERANK_BACKEND):
+    """Mulai load cross-encoder di background (tidak memblokir)."""
+    return load_model(model_name, backend, factory=CrossEncoderScorer)
+
+
+def rerank(score, query, docs, top_n=RERANK_TOP_N, margin=RERANK_MARGIN, batch_size=RERANK_BATCH_SIZE):
+    """
+    `score(query, texts) -> [float]`. Return (list (skor, Document) terbaik, jumlah kandidat yang dinilai).
+
+    Batch pertama = 2 x `top_n` kandidat teratas, lalu `batch_size` kandidat per batch.
+    Berhenti kalau `top_n` kandidat terakhir yang dinilai semuanya < skor terbaik - `margin`.
+    """
+    if not docs:
+        return [], 0
+    texts = [doc.page_content for doc in docs]
+    scores = []
+    depth = min(len(docs), max(2 * top_n, 1))
+    while True:
+        scores.extend(score(query, texts[len(scores):depth]))
+        if depth >= len(docs):
+            break
+        best = max(scores)
+        if max(scores[-top_n:]) < best - margin:
+            break  # skor sudah jelas turun: kandidat yang lebih dalam kecil kemungkinan menyusul
+        depth = min(len(docs), depth + batch_size)
+
+    ranked = sorted(zip(scores, range(len(scores))), key=lambda item: -item[0])
+    best = ranked[0][0]
+    kept = [(s, docs[i]) for s, i in ranked[:top_n] if s >= best - margin]
+    return kept, len(scores)
+
+
+class RerankRetriever(BaseRetriever):
+    """
+    Bungkus retriever lain (yang mengambil `RERANK_CANDIDATES` kandidat): kandidat di-rerank
+    cross-encoder dan hanya yang terbaik diteruskan. Skor disimpan di metadata `rerank_score`.
+    """
+
+    retriever: Any
+    model_name: str = RERANK_MODEL
+    backend: str = RERANK_BACKEND
+    top_n: int = RERANK_TOP_N
+    margin: float = RERANK_MARGIN
+    batch_size: int = RERANK_BATCH_SIZE
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        candidates = self.retriever.invoke(query, config=config)
+        started = time.perf_counter()
+        scorer = get_scorer(self.model_name, self.backend)
+        kept, scored = rerank(scorer.score, query, candidates, self.top_n, self.margin, self.batch_size)
+        if run_manager:
+            # Dicatat `metrics.QueryMetrics` sebagai tahap `rerank`
+            dispatch_custom_event(
+                "rag_stage",
+                {"stage": "rerank", "seconds": time.perf_counter() - started,
+                 "candidates": len(candidates), "scored": scored, "kept": len(kept)},
+                config={"callbacks": run_manager.get_child()},
+            )
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": round(s, 4)})
+            for s, doc in kept
+        ]
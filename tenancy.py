@@ -0,0 +1,145 @@
+"""
+Namespace per tenant (tim/workspace) untuk vector store TiDB di app4.
+
+Tanpa tenant, semua upload masuk ke satu tabel dan setiap query mencari di seluruh
+tabel: dokumen tim lain ikut terambil, dan biaya search naik mengikuti korpus semua tim.
+Setiap chunk kini membawa `meta.tenant`, dan semua akses (search, BM25, daftar file,
+ledger ingest, cache jawaban) dibatasi ke satu tenant. Dua mode (`TENANT_MODE`):
+
+- `column` (default): satu tabel bersama dengan kolom generated `tenant` ber-index.
+  Search tetap lewat vector index HNSW dengan tenant sebagai filter (strategi `TIDB_FILTER_MODE`);
+  tenant kecil (`TIDB_TENANT_PREFILTER_ROWS`) di-scan persis lewat index `tenant`, jadi
+  biayanya sebanding korpus tenant sendiri. Cocok untuk banyak tenant.
+- `table`: satu tabel per tenant (`<TIDB_TABLE>__<tenant>`), masing-masing dengan vector
+  index HNSW sendiri. Isolasi fisik dan KNN lewat index, cocok untuk tenant besar.
+
+Tenant `TENANT_DEFAULT` memakai tabel, ID baris, dan namespace ledger yang sama seperti
+sebelum multi-tenant, jadi data lama otomatis menjadi milik tenant default (di mode
+`column`, `meta.tenant` baris lama diisi sekali saat kolom `tenant` dibuat).
+
+Tenant hanya memisahkan data, bukan kontrol akses: tanpa login Streamlit siapa pun bisa
+memilih workspace mana pun. Dengan login (`st.user`), tenant diturunkan dari email
+(`TENANT_FROM_LOGIN`: `domain` = satu tenant per domain email, `email` = per user).
+"""
+import os
+import re
+
+from ingest_ledger import chunk_row_id
+from tidb_store import BulkWriter, TiDBVectorSearch, iter_documents, list_sources, list_tables, table_usage
+
+TENANT_MODE = os.getenv("TENANT_MODE", "column").lower()  # column | table
+TENANT_FROM_LOGIN = os.getenv("TENANT_FROM_LOGIN", "domain").lower()  # domain | email
+
+TENANT_MODES = ("column", "table")
+MAX_TENANT_LENGTH = 32  # nama tabel TiDB maksimal 64 karakter: <TIDB_TABLE>__<tenant>
+TABLE_SEPARATOR = "__"
+
+
+def normalize_tenant(name):
+    """Nama tenant yang aman untuk nama tabel & label metrics: huruf kecil, angka, underscore."""
+    tenant = re.sub(r"[^a-z0-9_]+", "_", str(name or "").strip().lower()).strip("_")[:MAX_TENANT_LENGTH]
+    if not tenant:
+        raise ValueError(f"Nama tenant tidak valid: {name!r}")
+    return tenant
+
+
+# Dinormalisasi seperti tenant dari login/sidebar, supaya perbandingan `tenant == TENANT_DEFAULT` tetap cocok
+TENANT_DEFAULT = normalize_tenant(os.getenv("TENANT_DEFAULT", "default"))
+
+
+def tenant_from_email(email, source=TENANT_FROM_LOGIN):
+    """Tenant untuk user yang login: domain email (satu tenant per organisasi) atau email lengkap."""
+    if source not in ("domain", "email"):
+        raise ValueError(f"TENANT_FROM_LOGIN tidak dikenal: {source} (pilih domain | email)")
+    return normalize_tenant(email.rsplit("@", 1)[-1] if source == "domain" else email)
+
+
+def tenant_table(base_table, tenant, mode=TENANT_MODE):
+    """Tabel vector milik tenant: tabel bersama (`column`) atau `<base>__<tenant>` (`table`)."""
+    if mode == "table" and tenant != TENANT_DEFAULT:
+        return f"{base_table}{TABLE_SEPARATOR}{tenant}"
+    return base_table
+
+
+def tenant_for_namespace(base_table, namespace):
+    """Kebalikan `TenantStore.namespace`: tenant pemilik namespace ledger, None kalau bukan milik `base_table`."""
+    if namespace == base_table:
+        return TENANT_DEFAULT
+    prefix = f"{base_table}:"
+    return namespace[len(prefix):] if namespace.startswith(prefix) else None
+
+
+class TenantStore:
+    """
+    Akses vector store untuk satu tenant: writer, vector search, dan kueri pendukung.
+
+    Dibuat dari `BulkWriter` tabel dasar (`TIDB_TABLE`); di mode `table` writer tenant
+    memakai pool koneksi (engine) yang sama. Murah dibuat, tapi sebaiknya di-cache per tenant
+    supaya status tabel/index writer-nya tidak dicek ulang.
+    """
+
+    def __init__(self, base_writer, embeddings, tenant, mode=TENANT_MODE):
+        if mode not in TENANT_MODES:
+            raise ValueError(f"TENANT_MODE tidak dikenal: {mode} (pilih {' | '.join(TENANT_MODES)})")
+        self.tenant = normalize_tenant(tenant)
+        self.mode = mode
+        self.base_table = base_writer.table_name
+        self.table_name = tenant_table(self.base_table, self.tenant, mode)
+        if self.table_name == self.base_table:
+            self.writer = base_writer
+        else:
+            self.writer = BulkWriter(
+                None, self.table_name, batch_size=base_writer.batch_size,
+                max_retries=base_writer.max_retries, engine=base_writer.engine,
+            )
+        # Di tabel bersama baris difilter per tenant; tabel per tenant seluruhnya milik tenant itu
+        self.row_tenant = self.tenant if mode == "column" else None
+        self.vector_store = TiDBVectorSearch(
+            base_writer.engine, self.table_name, embeddings, tenant=self.row_tenant, writer=self.writer
+        )
+
+    @property
+    def engine(self):
+        return self.writer.engine
+
+    @property
+    def namespace(self):
+        """Namespace ledger ingest (tenant default = namespace lama, yaitu nama tabel)."""
+        if self.tenant == TENANT_DEFAULT:
+            return self.table_name
+        return f"{self.base_table}:{self.tenant}"
+
+    def row_id(self, source_file, chunk_hash):
+        # File bernama sama di tenant lain tidak boleh menimpa baris ini di tabel bersama
+        if self.tenant != TENANT_DEFAULT:
+            source_file = f"{self.tenant}/{source_file}"
+        return chunk_row_id(source_file, chunk_hash)
+
+    def tag(self, metadata):
+        """Tandai metadata chunk dengan tenant (dibaca kolom generated `tenant`)."""
+        metadata["tenant"] = self.tenant
+        return metadata
+
+    def documents(self):
+        return iter_documents(self.engine, self.table_name, tenant=self.row_tenant)
+
+    def sources(self):
+        return list_sources(self.engine, self.table_name, tenant=self.row_tenant)
+
+    def usage(self):
+        """{"chunks", "files", "characters", "last_update"} milik tenant ini."""
+        rows = table_usage(self.engine, self.table_name, tenant=self.row_tenant)
+        usage = rows[0] if rows else {"chunks": 0, "files": 0, "characters": 0, "last_update": None}
+        return {**usage, "tenant": self.tenant}
+
+
+def usage_by_tenant(base_writer, mode=TENANT_MODE):
+    """Pemakaian semua tenant (panel admin): GROUP BY kolom `tenant`, atau satu baris per tabel tenant."""
+    if mode == "column":
+        return table_usage(base_writer.engine, base_writer.table_name, group_by_tenant=True)
+    rows = []
+    prefix = f"{base_writer.table_name}{TABLE_SEPARATOR}"
+    for table_name in [base_writer.table_name] + list_tables(base_writer.engine, prefix):
+        tenant = table_name[len(prefix):] if table_name.startswith(prefix) else TENANT_DEFAULT
+        rows.extend({**row, "tenant": tenant} for row in table_usage(base_writer.engine, table_name))
+    return sorted(rows, key=lambda row: -row["chunks"])
@@ -0,0 +1,52 @@
+import json
+import math
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _cosine_distance(left, right):
+    a, b = json.loads(left), json.loads(right)
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1.0 - dot / norm if norm else 1.0
+
+
+@pytest.fixture
+def sqlite_engine():
+    """
+    SQLite in-memory yang menjalankan SQL `tidb_store` apa adanya: VEC_COSINE_DISTANCE &
+    JSON_UNQUOTE didaftarkan sebagai fungsi, JSON_EXTRACT dan kolom generated sudah ada di SQLite.
+    """
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def register_functions(dbapi_connection, _):
+        dbapi_connection.create_function("VEC_COSINE_DISTANCE", 2, _cosine_distance, deterministic=True)
+        dbapi_connection.create_function("JSON_UNQUOTE", 1, lambda value: value, deterministic=True)
+
+    return engine
+
+
+def create_vector_table(engine, table_name):
+    """Skema sama seperti `BulkWriter.ensure_table` + kolom `tenant` dari `ensure_tenant_column`."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE `{table_name}` (id VARCHAR(36) PRIMARY KEY, embedding TEXT, document TEXT, meta TEXT, "
+            "tenant VARCHAR(64) GENERATED ALWAYS AS (JSON_EXTRACT(meta, '$.tenant')) VIRTUAL)"
+        ))
+
+
+def insert_rows(engine, table_name, rows):
+    """`rows` = list (id, vektor, teks, metadata)."""
+    with engine.begin() as conn:
+        for row_id, vector, document, meta in rows:
+            conn.execute(
+                text(f"INSERT INTO `{table_name}` (id, embedding, document, meta) VALUES (:id, :embedding, :document, :meta)"),
+                {"id": row_id, "embedding": json.dumps(vector), "document": document, "meta": json.dumps(meta)},
+            )
@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import text
+
+from conftest import create_vector_table, insert_rows
+from metadata_filter import filter_key, filter_to_sql, matches_filter
+
+ROWS = [
+    {"source_file": "a.pdf", "page": 1, "upload_time": "2025-01-10T08:00:00"},
+    {"source_file": "b.pdf", "page": 5, "upload_time": "2025-03-01T12:30:00"},
+    {"source_file": "c.pdf", "page": 12, "upload_time": "2024-12-31T23:59:59"},
+    {"source_file": "a.pdf", "page": 40},
+]
+
+
+def test_no_filter():
+    assert filter_to_sql(None) == ("", {})
+    assert filter_to_sql({}) == ("", {})
+    assert filter_key(None) == ""
+
+
+def test_shorthand_is_eq_on_unquoted_string():
+    sql, params = filter_to_sql({"source_file": "a.pdf"})
+    assert sql == "JSON_UNQUOTE(JSON_EXTRACT(meta, '$.source_file')) = :f0"
+    assert params == {"f0": "a.pdf"}
+
+
+def test_in_and_nin():
+    sql, params = filter_to_sql({"source_file": {"$in": ["a.pdf", "b.pdf"]}, "page": {"$nin": [1, 2]}})
+    assert sql == (
+        "JSON_UNQUOTE(JSON_EXTRACT(meta, '$.source_file')) IN (:f0_0, :f0_1) "
+        "AND JSON_EXTRACT(meta, '$.page') NOT IN (:f1_0, :f1_1)"
+    )
+    assert params == {"f0_0": "a.pdf", "f0_1": "b.pdf", "f1_0": 1, "f1_1": 2}
+
+
+def test_empty_lists():
+    # $in [] tidak cocok dengan apa pun, $nin [] cocok dengan semua
+    assert filter_to_sql({"source_file": {"$in": []}}) == ("1 = 0", {})
+    assert filter_to_sql({"source_file": {"$nin": []}}) == ("1 = 1", {})
+
+
+def test_numbers_compare_as_numbers_strings_as_strings():
+    sql, _ = filter_to_sql({"page": {"$gte": 5}})
+    assert sql == "JSON_EXTRACT(meta, '$.page') >= :f0"
+    sql, _ = filter_to_sql({"page": {"$gte": 2.5}})
+    assert sql == "JSON_EXTRACT(meta, '$.page') >= :f0"
+    sql, _ = filter_to_sql({"upload_time": {"$gte": "2025-01-01"}})
+    assert sql == "JSON_UNQUOTE(JSON_EXTRACT(meta, '$.upload_time')) >= :f0"
+    # bool bukan angka
+    sql, _ = filter_to_sql({"draft": True})
+    assert sql == "JSON_UNQUOTE(JSON_EXTRACT(meta, '$.draft')) = :f0"
+
+
+def test_invalid_field_and_operator():
+    with pytest.raises(ValueError):
+        filter_to_sql({"page; DROP TABLE x": 1})
+    with pytest.raises(ValueError):
+        filter_to_sql({"page": {"$regex": "1"}})
+
+
+@pytest.mark.parametrize("filter", [
+    {"source_file": "a.pdf"},
+    {"source_file": {"$ne": "a.pdf"}},
+    {"source_file": {"$in": ["a.pdf", "c.pdf"]}},
+    {"source_file": {"$nin": ["a.pdf"]}},
+    {"source_file": {"$in": []}},
+    {"source_file": {"$nin": []}},
+    {"page": {"$gt": 4}},
+    {"page": {"$lte": 12, "$gte": 5}},
+    {"page": {"$in": [1, 40]}},
+    {"page": {"$nin": [1, 40]}},
+    {"upload_time": {"$gte": "2025-01-01"}},
+    {"upload_time": {"$lt": "2025-01-01"}, "source_file": "c.pdf"},
+])
+def test_sql_matches_python(sqlite_engine, filter):
+    """WHERE hasil `filter_to_sql` memilih baris yang sama dengan `matches_filter` (index BM25)."""
+    create_vector_table(sqlite_engine, "docs")
+    insert_rows(sqlite_engine, "docs", [(str(n), [1.0, 0.0], "", meta) for n, meta in enumerate(ROWS)])
+    where, params = filter_to_sql(filter)
+    with sqlite_engine.connect() as conn:
+        selected = {row[0] for row in conn.execute(text(f"SELECT id FROM docs WHERE {where}"), params)}
+    assert selected == {str(n) for n, meta in enumerate(ROWS) if matches_filter(meta, filter)}
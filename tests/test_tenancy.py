@@ -0,0 +1,125 @@
+"""
+Isolasi antar tenant: search tenant A tidak pernah mengembalikan chunk tenant B, di semua jalur
+`TiDBVectorSearch` (pre-filter tenant kecil, KNN + post-filter, fallback auto) dan di kedua
+`TENANT_MODE`. SQL-nya dijalankan apa adanya di SQLite (lihat `conftest.sqlite_engine`).
+"""
+import math
+
+import pytest
+from langchain_core.documents import Document
+
+from conftest import create_vector_table, insert_rows
+from tenancy import TENANT_DEFAULT, TenantStore
+from tidb_store import BulkWriter
+
+QUERY = [1.0, 0.0]
+K = 3
+
+
+def _vector(degrees):
+    return [math.cos(math.radians(degrees)), math.sin(math.radians(degrees))]
+
+
+def _add_documents(engine, store, count, degrees, source_file):
+    rows = []
+    for n in range(count):
+        text = f"{store.tenant} chunk {n}"
+        metadata = store.tag({"source_file": source_file, "chunk_id": n})
+        rows.append((store.row_id(source_file, text), _vector(degrees + n * 0.1), text, metadata))
+    insert_rows(engine, store.table_name, rows)
+
+
+def _stores(engine, mode):
+    base_writer = BulkWriter(None, "docs", engine=engine, tenant_column=mode == "column")
+    tenant_a = TenantStore(base_writer, None, "tim_a", mode=mode)
+    tenant_b = TenantStore(base_writer, None, "tim_b", mode=mode)
+    for table_name in {tenant_a.table_name, tenant_b.table_name}:
+        create_vector_table(engine, table_name)
+    # Chunk tenant B jauh lebih dekat ke query: kandidat KNN global semuanya milik B
+    _add_documents(engine, tenant_b, 20, 1, "rahasia_b.pdf")
+    _add_documents(engine, tenant_a, 5, 60, "laporan_a.pdf")
+    return tenant_a, tenant_b
+
+
+@pytest.mark.parametrize("filter_mode, prefilter_rows", [
+    ("auto", 10_000),  # tenant kecil: scan persis WHERE tenant = ...
+    ("auto", 0),       # KNN + post-filter, kandidat kosong -> fallback scan persis
+    ("post", 0),       # KNN + post-filter tanpa fallback
+    ("pre", 0),
+])
+def test_column_mode_never_returns_other_tenant(sqlite_engine, filter_mode, prefilter_rows):
+    tenant_a, _ = _stores(sqlite_engine, "column")
+    search = tenant_a.vector_store
+    search.filter_mode = filter_mode
+    search.tenant_prefilter_rows = prefilter_rows
+    search.post_filter_multiplier = 2
+
+    results = search.similarity_search_by_vector(QUERY, k=K)
+
+    assert all(doc.metadata["tenant"] == "tim_a" for doc in results)
+    if filter_mode == "post":
+        assert results == []  # 6 kandidat terdekat semuanya milik tim_b, tidak ada yang bocor
+    else:
+        assert len(results) == K
+
+
+def test_column_mode_with_user_filter(sqlite_engine):
+    tenant_a, _ = _stores(sqlite_engine, "column")
+    tenant_a.vector_store.tenant_prefilter_rows = 0
+
+    # Filter cakupan dokumen berisi file milik tenant lain tetap tidak membuka akses ke file itu
+    results = tenant_a.vector_store.similarity_search_by_vector(
+        QUERY, k=K, filter={"source_file": {"$in": ["rahasia_b.pdf", "laporan_a.pdf"]}}
+    )
+    assert [doc.metadata["source_file"] for doc in results] == ["laporan_a.pdf"] * K
+    assert tenant_a.vector_store.similarity_search_by_vector(
+        QUERY, k=K, filter={"source_file": "rahasia_b.pdf"}
+    ) == []
+
+
+def test_column_mode_listing_and_usage_are_scoped(sqlite_engine):
+    tenant_a, tenant_b = _stores(sqlite_engine, "column")
+    assert tenant_a.sources() == ["laporan_a.pdf"]
+    assert tenant_b.sources() == ["rahasia_b.pdf"]
+    assert tenant_a.vector_store.tenant_rows() == 5
+
+
+def test_table_mode_uses_separate_tables(sqlite_engine):
+    tenant_a, tenant_b = _stores(sqlite_engine, "table")
+    assert tenant_a.table_name == "docs__tim_a"
+    assert tenant_b.table_name == "docs__tim_b"
+    assert tenant_a.vector_store.tenant is None  # seluruh tabel milik tenant, tanpa filter tambahan
+
+    results = tenant_a.vector_store.similarity_search_by_vector(QUERY, k=K)
+    assert len(results) == K
+    assert all(doc.metadata["tenant"] == "tim_a" for doc in results)
+
+
+def test_default_tenant_keeps_base_table_and_row_ids(sqlite_engine):
+    base_writer = BulkWriter(None, "docs", engine=sqlite_engine, tenant_column=False)
+    default = TenantStore(base_writer, None, TENANT_DEFAULT, mode="table")
+    other = TenantStore(base_writer, None, "tim_a", mode="table")
+    assert default.table_name == "docs"
+    assert default.namespace == "docs"
+    assert default.row_id("a.pdf", "hash") != other.row_id("a.pdf", "hash")
+
+
+class _FixedEmbeddings:
+    def embed_documents(self, texts):
+        return [_vector(2) for _ in texts]
+
+
+def test_add_texts_is_tagged_with_tenant(sqlite_engine, monkeypatch):
+    tenant_a, tenant_b = _stores(sqlite_engine, "column")
+    search = tenant_a.vector_store
+    search.embedding = _FixedEmbeddings()
+    # ON DUPLICATE KEY UPDATE tidak ada di SQLite: baris yang dikirim writer di-insert biasa
+    monkeypatch.setattr(search.writer, "write", lambda ids, texts, embeddings, metadatas: insert_rows(
+        sqlite_engine, search.table_name, list(zip(ids, embeddings, texts, metadatas))
+    ))
+
+    ids = search.as_retriever().add_documents([Document(page_content="catatan baru", metadata={"tenant": "tim_b"})])
+
+    assert len(ids) == 1 and len(ids[0]) == 36
+    assert tenant_a.vector_store.tenant_rows() == 6
+    assert all(doc.id != ids[0] for doc in tenant_b.vector_store.similarity_search_by_vector(QUERY, k=50))
@@ -0,0 +1,474 @@
+"""
+Helper TiDB: connection pool yang di-tuning, bulk writer, dan vector search ber-filter untuk tabel vector.
+
+Ingest ke TiDB Cloud didominasi round trip jaringan (TLS), jadi chunk dikirim
+sebagai multi-row INSERT per batch dalam satu transaksi. ID chunk bersifat
+deterministik (lihat `ingest_ledger.chunk_row_id`) dan INSERT memakai
+`ON DUPLICATE KEY UPDATE`, sehingga batch yang gagal aman untuk di-retry.
+
+Skema tabel mengikuti tabel yang dibuat `TiDBVectorStore` (tidb-vector):
+id, embedding, document, meta, create_time, update_time.
+
+Search memakai vector index HNSW (replika TiFlash) pada kolom embedding kalau
+`TIDB_VECTOR_INDEX` aktif, dan filter metadata (`metadata_filter`) didorong ke SQL:
+- `post`: KNN lewat index dulu (k x `TIDB_POST_FILTER_MULTIPLIER` kandidat), lalu difilter,
+- `pre`: WHERE dulu lalu jarak dihitung persis (index tidak dipakai, cocok untuk filter sempit),
+- `auto` (default): `post`, dan kalau hasil setelah filter kurang dari k, ulang dengan `pre`.
+
+Multi-tenant (lihat `tenancy`): dengan `tenant_column=True` tabel diberi kolom generated
+`tenant` (dari `meta.tenant`) ber-index, dan `TiDBVectorSearch(tenant=...)` menambahkan
+`tenant = :tenant` ke filter lalu mengikuti strategi yang sama (KNN lewat index + fallback `auto`).
+Hanya tenant kecil (maksimal `TIDB_TENANT_PREFILTER_ROWS` chunk) yang langsung di-scan persis
+lewat index `idx_tenant`: lebih murah daripada KNN global yang kandidatnya hampir semua milik tenant lain.
+"""
+import json
+import os
+import re
+import time
+import uuid
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError, OperationalError, ProgrammingError
+
+from metadata_filter import filter_to_sql
+
+# Konfigurasi pool koneksi, dipakai TiDBVectorStore maupun BulkWriter
+ENGINE_ARGS = {
+    "pool_size": int(os.getenv("TIDB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("TIDB_POOL_MAX_OVERFLOW", "10")),
+    "pool_pre_ping": True,  # buang koneksi yang sudah diputus server sebelum dipakai
+    # TiDB Cloud menutup koneksi idle, jadi koneksi di-recycle sebelum itu
+    "pool_recycle": int(os.getenv("TIDB_POOL_RECYCLE", "300")),
+}
+DEFAULT_BATCH_SIZE = int(os.getenv("TIDB_INSERT_BATCH_SIZE", "200"))
+
+# Vector index HNSW (butuh replika TiFlash) & strategi filter metadata
+VECTOR_INDEX = os.getenv("TIDB_VECTOR_INDEX", "true").lower() in ("1", "true", "yes")
+TIFLASH_REPLICAS = int(os.getenv("TIDB_TIFLASH_REPLICAS", "1"))
+FILTER_MODE = os.getenv("TIDB_FILTER_MODE", "auto").lower()  # auto | pre | post
+POST_FILTER_MULTIPLIER = int(os.getenv("TIDB_POST_FILTER_MULTIPLIER", "8"))
+TENANT_PREFILTER_ROWS = int(os.getenv("TIDB_TENANT_PREFILTER_ROWS", "5000"))
+TENANT_ROWS_TTL = 300  # detik sebelum jumlah chunk tenant dihitung ulang
+VECTOR_INDEX_NAME = "idx_embedding_cosine"
+TENANT_INDEX_NAME = "idx_tenant"
+TENANT_COLUMN = "tenant VARCHAR(64) AS (JSON_UNQUOTE(JSON_EXTRACT(meta, '$.tenant'))) VIRTUAL"
+
+
+def _quote_table(table_name):
+    if not re.fullmatch(r"[A-Za-z0-9_]+", table_name):
+        raise ValueError(f"Nama tabel tidak valid: {table_name}")
+    return f"`{table_name}`"
+
+
+def _vector_literal(vector):
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+def _is_missing_table(error):
+    return getattr(error.orig, "args", (None,))[0] == 1146  # ER_NO_SUCH_TABLE
+
+
+class BulkWriter:
+    """
+    Menulis chunk (id, teks, embedding, metadata) ke tabel vector TiDB secara batch.
+
+    Setiap batch = satu multi-row INSERT dalam satu transaksi, di-retry dengan
+    backoff kalau koneksi putus. Aman dipakai beberapa job ingest sekaligus
+    (satu writer per proses, koneksi diambil dari pool per batch).
+    """
+
+    def __init__(self, connection_string, table_name, batch_size=DEFAULT_BATCH_SIZE, max_retries=3,
+                 engine=None, tenant_column=False):
+        self.table_name = table_name
+        self.table = _quote_table(table_name)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.engine = engine or create_engine(connection_string, **ENGINE_ARGS)
+        self.tenant_column = tenant_column
+        self._table_ready = False
+        self._tenant_column_ready = False
+        self.vector_index_ready = False
+        self.vector_index_error = None
+
+    def ensure_table(self, dimension):
+        if self._table_ready:
+            return
+        # Vector index HNSW dipasang terpisah lewat `ensure_vector_index` (ADD VECTOR INDEX)
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id VARCHAR(36) PRIMARY KEY,
+                    embedding VECTOR({int(dimension)}) NOT NULL,
+                    document TEXT,
+                    meta JSON,
+                    create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """))
+        self._table_ready = True
+        if self.tenant_column:
+            self.ensure_tenant_column()
+        if VECTOR_INDEX:
+            self.ensure_vector_index()
+
+    def ensure_tenant_column(self, default_tenant=None, batch_size=5000):
+        """
+        Tambah kolom generated `tenant` (dari `meta.tenant`) + index kalau belum ada.
+
+        Idempotent. Kalau `default_tenant` diisi, baris lama yang belum punya `meta.tenant`
+        (data sebelum multi-tenant) diisi `default_tenant`, per `batch_size` baris supaya
+        transaksinya tidak terlalu besar. Backfill ini jalan di setiap panggilan (bukan hanya
+        saat kolom dibuat), jadi backfill yang terputus (timeout, restart) dilanjutkan saat start
+        berikutnya; kalau sudah tuntas cukup satu lookup `tenant IS NULL` lewat index.
+        Return False kalau tabel belum ada (dipanggil lagi dari `ensure_table`).
+        """
+        if not self._tenant_column_ready:
+            try:
+                with self.engine.begin() as conn:
+                    columns = conn.execute(text(f"SHOW COLUMNS FROM {self.table}")).fetchall()
+                    if not any(row[0] == "tenant" for row in columns):
+                        conn.execute(text(f"ALTER TABLE {self.table} ADD COLUMN {TENANT_COLUMN}"))
+                    indexes = conn.execute(text(f"SHOW INDEX FROM {self.table}")).fetchall()
+                    if not any(row._mapping["Key_name"] == TENANT_INDEX_NAME for row in indexes):
+                        conn.execute(text(f"ALTER TABLE {self.table} ADD INDEX {TENANT_INDEX_NAME} (tenant)"))
+            except ProgrammingError as e:
+                if _is_missing_table(e):
+                    return False
+                raise
+            self._tenant_column_ready = True
+        if default_tenant:
+            statement = text(
+                f"UPDATE {self.table} SET meta = JSON_SET(COALESCE(meta, JSON_OBJECT()), '$.tenant', :tenant) "
+                f"WHERE tenant IS NULL LIMIT {int(batch_size)}"
+            )
+            while True:
+                with self.engine.begin() as conn:
+                    if not conn.execute(statement, {"tenant": default_tenant}).rowcount:
+                        break
+        return True
+
+    def ensure_vector_index(self, replicas=TIFLASH_REPLICAS):
+        """
+        Pasang replika TiFlash + vector index HNSW (cosine) di kolom embedding kalau belum ada.
+
+        Idempotent, dipanggil saat start dan saat tabel baru dibuat. Index dibangun TiFlash
+        di background; selama itu query tetap jalan (scan penuh). Gagal (mis. cluster tanpa
+        TiFlash) tidak menghentikan app: pesan error disimpan di `vector_index_error`.
+        Return True kalau index sudah terpasang.
+        """
+        if self.vector_index_ready:
+            return True
+        try:
+            with self.engine.begin() as conn:
+                rows = conn.execute(text(f"SHOW INDEX FROM {self.table}")).fetchall()
+                if not any(row._mapping["Key_name"] == VECTOR_INDEX_NAME for row in rows):
+                    conn.execute(text(f"ALTER TABLE {self.table} SET TIFLASH REPLICA {int(replicas)}"))
+                    conn.execute(text(
+                        f"ALTER TABLE {self.table} ADD VECTOR INDEX {VECTOR_INDEX_NAME} "
+                        "((VEC_COSINE_DISTANCE(embedding))) USING HNSW"
+                    ))
+        except ProgrammingError as e:
+            if _is_missing_table(e):
+                return False  # tabel dibuat saat upload pertama, index dipasang setelahnya
+            self.vector_index_error = str(e.orig)
+            return False
+        except DBAPIError as e:
+            self.vector_index_error = str(e.orig)
+            return False
+        self.vector_index_ready = True
+        self.vector_index_error = None
+        return True
+
+    def _run_with_retry(self, statement, params):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(statement, params)
+                return attempt + 1
+            except OperationalError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(min(8.0, 0.5 * (2 ** attempt)))
+
+    def write(self, ids, texts, embeddings, metadatas, progress=None):
+        """
+        Upsert semua baris, `batch_size` baris per round trip.
+        `progress(baris_selesai, total)` dipanggil setelah setiap batch.
+
+        Return list timing per batch: {"rows", "seconds", "attempts"}.
+        """
+        timings = []
+        if not ids:
+            return timings
+        self.ensure_table(len(embeddings[0]))
+        total = len(ids)
+
+        for start in range(0, total, self.batch_size):
+            stop = min(start + self.batch_size, total)
+            values, params = [], {}
+            for n, i in enumerate(range(start, stop)):
+                values.append(f"(:id{n}, :embedding{n}, :document{n}, :meta{n})")
+                params[f"id{n}"] = ids[i]
+                params[f"embedding{n}"] = _vector_literal(embeddings[i])
+                params[f"document{n}"] = texts[i]
+                params[f"meta{n}"] = json.dumps(metadatas[i], default=str)
+            statement = text(
+                f"INSERT INTO {self.table} (id, embedding, document, meta) VALUES {', '.join(values)} "
+                "ON DUPLICATE KEY UPDATE embedding = VALUES(embedding), document = VALUES(document), "
+                "meta = VALUES(meta)"
+            )
+
+            started = time.perf_counter()
+            attempts = self._run_with_retry(statement, params)
+            timings.append({
+                "rows": stop - start,
+                "seconds": time.perf_counter() - started,
+                "attempts": attempts,
+            })
+            if progress:
+                progress(stop, total)
+        return timings
+
+    def delete(self, ids):
+        for start in range(0, len(ids), self.batch_size):
+            part = ids[start:start + self.batch_size]
+            params = {f"id{n}": row_id for n, row_id in enumerate(part)}
+            placeholders = ", ".join(f":id{n}" for n in range(len(part)))
+            self._run_with_retry(text(f"DELETE FROM {self.table} WHERE id IN ({placeholders})"), params)
+
+
+def iter_documents(engine, table_name, batch_size=1000, tenant=None):
+    """
+    Baca seluruh chunk di tabel vector per batch (keyset pagination by id):
+    yield (ids, texts, metadatas). Dipakai untuk membangun index lokal (mis. BM25).
+    Tabel yang belum dibuat (belum pernah ada upload) dianggap kosong.
+    `tenant` membatasi ke chunk milik satu tenant (tabel dengan kolom `tenant`).
+    """
+    table = _quote_table(table_name)
+    tenant_clause = " AND tenant = :tenant" if tenant is not None else ""
+    last_id = ""
+    while True:
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    text(f"SELECT id, document, meta FROM {table} WHERE id > :last_id{tenant_clause} "
+                         "ORDER BY id LIMIT :limit"),
+                    {"last_id": last_id, "limit": batch_size, "tenant": tenant},
+                ).fetchall()
+        except ProgrammingError as e:
+            if _is_missing_table(e):
+                return
+            raise
+        if not rows:
+            return
+        yield (
+            [row[0] for row in rows],
+            [row[1] or "" for row in rows],
+            [json.loads(row[2]) if isinstance(row[2], str) else (row[2] or {}) for row in rows],
+        )
+        last_id = rows[-1][0]
+
+
+class TiDBVectorSearch(VectorStore):
+    """
+    Vector store di atas tabel vector TiDB: KNN cosine lewat SQL, dengan
+    filter metadata di-push ke query (lihat docstring modul untuk `filter_mode`).
+    Data ditulis lewat `BulkWriter` (`writer`, atau dibuat dari `engine` saat `add_texts` pertama).
+
+    Filter dipakai lewat `search_kwargs={"k": 5, "filter": {...}}` di retriever.
+    Dengan `tenant`, setiap search dibatasi ke chunk tenant itu, apa pun filter yang dikirim
+    retriever; tenant dengan maksimal `tenant_prefilter_rows` chunk di-scan persis (pre-filter).
+    """
+
+    def __init__(self, engine, table_name, embedding, filter_mode=FILTER_MODE,
+                 post_filter_multiplier=POST_FILTER_MULTIPLIER, tenant=None,
+                 tenant_prefilter_rows=TENANT_PREFILTER_ROWS, writer=None):
+        if filter_mode not in ("auto", "pre", "post"):
+            raise ValueError(f"TIDB_FILTER_MODE tidak dikenal: {filter_mode} (pilih auto, pre, post)")
+        self.engine = engine
+        self.table_name = table_name
+        self.table = _quote_table(table_name)
+        self.embedding = embedding
+        self.filter_mode = filter_mode
+        self.post_filter_multiplier = post_filter_multiplier
+        self.tenant = tenant
+        self.tenant_prefilter_rows = tenant_prefilter_rows
+        self._tenant_rows = None  # (jumlah chunk, waktu dihitung)
+        self.writer = writer
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def _search(self, query_vector, k, where="", params=None, candidates=None):
+        distance = "VEC_COSINE_DISTANCE(embedding, :query_vector)"
+        if candidates:
+            # Subquery KNN murni (tanpa WHERE) supaya TiDB bisa memakai vector index, lalu difilter
+            columns = "id, document, meta, tenant" if self.tenant is not None else "id, document, meta"
+            statement = (
+                f"SELECT id, document, meta, distance FROM ("
+                f"SELECT {columns}, {distance} AS distance FROM {self.table} "
+                f"ORDER BY distance LIMIT :candidates) AS knn "
+                f"WHERE {where} ORDER BY distance LIMIT :k"
+            )
+        else:
+            statement = (
+                f"SELECT id, document, meta, {distance} AS distance FROM {self.table}"
+                f"{' WHERE ' + where if where else ''} ORDER BY distance LIMIT :k"
+            )
+        params = {**(params or {}), "query_vector": query_vector, "k": k, "candidates": candidates}
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(statement), params).fetchall()
+        except ProgrammingError as e:
+            if _is_missing_table(e):
+                return []
+            raise
+        return [
+            (
+                Document(
+                    id=row[0],
+                    page_content=row[1] or "",
+                    metadata=json.loads(row[2]) if isinstance(row[2], str) else (row[2] or {}),
+                ),
+                1.0 - float(row[3]),  # skor = cosine similarity
+            )
+            for row in rows
+        ]
+
+    def tenant_rows(self):
+        """Jumlah chunk milik `tenant` (COUNT lewat index `idx_tenant`, di-cache `TENANT_ROWS_TTL` detik)."""
+        now = time.monotonic()
+        if self._tenant_rows is None or now - self._tenant_rows[1] > TENANT_ROWS_TTL:
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(
+                        text(f"SELECT COUNT(*) FROM {self.table} WHERE tenant = :tenant"), {"tenant": self.tenant}
+                    ).scalar()
+            except ProgrammingError as e:
+                if not _is_missing_table(e):
+                    raise
+                rows = 0
+            self._tenant_rows = (int(rows or 0), now)
+        return self._tenant_rows[0]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        query_vector = _vector_literal(embedding)
+        where, params = filter_to_sql(filter)
+        if self.tenant is not None:
+            params["tenant"] = self.tenant
+            where = f"tenant = :tenant{' AND ' + where if where else ''}"
+            if self.tenant_rows() <= self.tenant_prefilter_rows:
+                # Tenant kecil: kandidat KNN global hampir semua milik tenant lain, scan persis lebih murah
+                return self._search(query_vector, k, where, params)
+        if not where:
+            return self._search(query_vector, k)
+        if self.filter_mode == "pre":
+            return self._search(query_vector, k, where, params)
+        results = self._search(query_vector, k, where, params, candidates=k * self.post_filter_multiplier)
+        if len(results) < k and self.filter_mode == "auto":
+            # Dokumen yang dipilih tidak masuk kandidat KNN global: hitung persis di dalam filter
+            results = self._search(query_vector, k, where, params)
+        return results
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embed lalu upsert lewat `BulkWriter.write`; chunk ditandai `tenant` kalau search dibatasi tenant."""
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]  # kolom id VARCHAR(36)
+        metadatas = [dict(metadata or {}) for metadata in metadatas] if metadatas else [{} for _ in texts]
+        if self.tenant is not None:
+            for metadata in metadatas:
+                metadata["tenant"] = self.tenant
+        if self.writer is None:
+            self.writer = BulkWriter(None, self.table_name, engine=self.engine, tenant_column=self.tenant is not None)
+        self.writer.write(ids, texts, self.embedding.embed_documents(texts), metadatas)
+        self._tenant_rows = None
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, connection_string=None, table_name=None,
+                   engine=None, **kwargs):
+        """Buat (kalau belum ada) tabel `table_name` lalu isi dengan `texts`. `kwargs` diteruskan ke konstruktor."""
+        if not table_name:
+            raise ValueError("table_name wajib diisi")
+        writer = BulkWriter(connection_string, table_name, engine=engine, tenant_column=kwargs.get("tenant") is not None)
+        store = cls(writer.engine, table_name, embedding, writer=writer, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+def list_sources(engine, table_name, tenant=None):
+    """Nama file sumber (metadata `source_file`) yang ada di tabel, untuk pilihan cakupan dokumen."""
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT DISTINCT JSON_UNQUOTE(JSON_EXTRACT(meta, '$.source_file')) AS source_file "
+                f"FROM {_quote_table(table_name)}{' WHERE tenant = :tenant' if tenant is not None else ''} "
+                "ORDER BY source_file"
+            ), {"tenant": tenant}).fetchall()
+    except ProgrammingError as e:
+        if _is_missing_table(e):
+            return []
+        raise
+    return [row[0] for row in rows if row[0]]
+
+
+def table_usage(engine, table_name, group_by_tenant=False, tenant=None):
+    """
+    Pemakaian tabel vector: list {"tenant", "chunks", "files", "characters", "last_update"}.
+    `group_by_tenant` memecah per nilai kolom `tenant`; `tenant` membatasi ke satu tenant.
+    Tabel yang belum dibuat dianggap kosong (list kosong).
+    """
+    tenant_expr = "tenant" if group_by_tenant else ":tenant"
+    statement = (
+        f"SELECT {tenant_expr} AS tenant, COUNT(*) AS chunks, "
+        "COUNT(DISTINCT JSON_UNQUOTE(JSON_EXTRACT(meta, '$.source_file'))) AS files, "
+        "COALESCE(SUM(CHAR_LENGTH(document)), 0) AS characters, MAX(update_time) AS last_update "
+        f"FROM {_quote_table(table_name)}"
+        f"{' WHERE tenant = :tenant' if tenant is not None else ''}"
+        f"{' GROUP BY tenant ORDER BY chunks DESC' if group_by_tenant else ''}"
+    )
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(statement), {"tenant": tenant}).fetchall()
+    except ProgrammingError as e:
+        if _is_missing_table(e):
+            return []
+        raise
+    return [
+        {"tenant": row[0], "chunks": int(row[1]), "files": int(row[2]),
+         "characters": int(row[3]), "last_update": row[4]}
+        for row in rows if row[1]
+    ]
+
+
+def list_tables(engine, prefix):
+    """Nama tabel di database aktif yang diawali `prefix` (tabel per tenant)."""
+    pattern = prefix.replace("\\", "\\\\").replace("_", "\\_").replace("%", "\\%") + "%"
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT TABLE_NAME FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE :pattern ORDER BY TABLE_NAME"
+        ), {"pattern": pattern}).fetchall()
+    return [row[0] for row in rows]
+
+
+def timing_summary(timings):
+    if not timings:
+        return ""
+    seconds = sum(t["seconds"] for t in timings)
+    return (f"{len(timings)} batch insert, total {seconds:.2f} detik "
+            f"(rata-rata {seconds / len(timings) * 1000:.0f} ms/batch)")